@@ -0,0 +1,78 @@
+"""Бенчмарк пакетной обработки событий камер в зависимости от размера пакета
+
+Приложение работает на временной базе без фоновых задач (harness).
+
+Запуск: python -m benchmarks.bench_batch --events 2000 --sizes 1 10 100 1000
+"""
+
+import argparse
+import time
+
+from benchmarks import harness
+from parking_app.app import db
+from parking_app.config import PROFILES
+from parking_app.models import Client, ClientParking, Parking, PaymentIntent
+
+
+def run(app, events_count: int, batch_size: int) -> float:
+    """Заезд и выезд events_count клиентов пакетами, событий в секунду"""
+    with app.app_context():
+        parking = Parking(
+            address="Бенчмарк пакетов",
+            opened=True,
+            count_places=events_count,
+            count_available_places=events_count,
+        )
+        clients = [
+            Client(name="Бенч", surname=str(i), credit_card="4000000000000002")
+            for i in range(events_count)
+        ]
+        db.session.add(parking)
+        db.session.add_all(clients)
+        db.session.commit()
+        parking_id = parking.id
+        client_ids = [c.id for c in clients]
+
+    events = [
+        {"action": action, "client_id": client_id, "parking_id": parking_id}
+        for action in ("enter", "exit")
+        for client_id in client_ids
+    ]
+
+    http = app.test_client()
+    started = time.perf_counter()
+    for offset in range(0, len(events), batch_size):
+        end = offset + batch_size
+        response = http.post("/client_parkings/batch", json=events[offset:end])
+        assert response.status_code == 200
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        db.session.query(PaymentIntent).filter(
+            PaymentIntent.client_id.in_(client_ids)
+        ).delete()
+        db.session.query(ClientParking).filter_by(parking_id=parking_id).delete()
+        db.session.query(Client).filter(Client.id.in_(client_ids)).delete()
+        db.session.query(Parking).filter_by(id=parking_id).delete()
+        db.session.commit()
+
+    return len(events) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument(
+        "--profile", choices=sorted(PROFILES), default="high-throughput"
+    )
+    args = parser.parse_args()
+
+    with harness.temporary_app(args.profile) as app:
+        print(f"{'пакет':>8}{'событий/с':>12}")
+        for batch_size in args.sizes:
+            print(f"{batch_size:>8}{run(app, args.events, batch_size):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""Бенчмарк всех маршрутов приложения на наборах данных разного размера
+
+Для каждого размера создается временная база, наполняется генератором
+datagen (benchmarks.harness.seed_dataset), и каждый маршрут из app.url_map
+вызывается requests раз через тестовый клиент. Результат - p50/p99,
+среднее и запросы в секунду по маршрутам, а также медиана времени
+create_app на наполненной базе (startup_ms), записанные в JSON. С --baseline
+результаты сравниваются с прошлым прогоном, и при регрессии больше
+--threshold скрипт завершается с кодом 1.
+
+Маршрут без сценария в SCENARIOS - ошибка: новый маршрут должен получить
+свой сценарий.
+
+Запуск:
+    python -m benchmarks.bench_endpoints --sizes 10000 100000 1000000 \\
+        --output bench.json --baseline previous.json
+"""
+
+import argparse
+import json
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+from collections import deque
+from datetime import datetime
+from itertools import count
+from random import Random
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+from flask import Flask
+from sqlalchemy import select
+
+from benchmarks import harness
+from parking_app.app import db
+from parking_app.config import PROFILES
+from parking_app.models import Client, Parking
+
+# Клиентов в одном пакетном запросе: заезд и выезд каждого
+BATCH_CLIENTS = 10
+# Клиентов в одном файле загрузки
+IMPORT_CLIENTS = 100
+
+
+class Context:
+    """Данные, которые сценарии берут из наполненной базы"""
+
+    def __init__(self, app: Flask, seed: int):
+        self.rnd = Random(seed)
+        self.plates = count()
+        with app.app_context():
+            self.client_ids = list(db.session.scalars(select(Client.id)))
+            self.surnames = list(db.session.scalars(select(Client.surname).distinct()))
+            gate_clients = db.session.execute(
+                select(Client.id, Client.car_number).where(
+                    Client.credit_card.is_not(None), Client.car_number.is_not(None)
+                )
+            ).all()
+            parking = Parking(
+                address="Бенчмарк ворот",
+                opened=True,
+                count_places=len(gate_clients),
+                count_available_places=len(gate_clients),
+            )
+            db.session.add(parking)
+            db.session.commit()
+            self.parking_id = parking.id
+        # Клиенты с картой и номером: свободные и стоящие на парковке
+        self.free: deque = deque(tuple(row) for row in gate_clients)
+        self.parked: deque = deque()
+        self.parked_by_plate: deque = deque()
+
+    def random_client_id(self) -> int:
+        return self.rnd.choice(self.client_ids)
+
+
+def get_metrics(http, ctx: Context):
+    return http.get("/metrics")
+
+
+def get_clients(http, ctx: Context):
+    after_id = ctx.rnd.randrange(len(ctx.client_ids))
+    return http.get(f"/clients?after_id={after_id}&limit=100")
+
+
+def search_clients(http, ctx: Context):
+    # Начало фамилии случайного клиента: ответы не повторяются из кэша
+    surname = ctx.rnd.choice(ctx.surnames)
+    return http.get("/clients/search", query_string={"q": surname[:4]})
+
+
+def get_client(http, ctx: Context):
+    return http.get(f"/clients/{ctx.random_client_id()}")
+
+
+def create_client(http, ctx: Context):
+    return http.post(
+        "/clients",
+        data={
+            "name": "Бенч",
+            "surname": "Маршрутов",
+            "credit_card": "4000000000000002",
+            "car_number": f"Б{next(ctx.plates):08d}",
+        },
+    )
+
+
+def import_clients(http, ctx: Context):
+    body = "name,surname,credit_card,car_number\n" + "".join(
+        f"Бенч,Импортов,4000000000000002,И{next(ctx.plates):08d}\n"
+        for _ in range(IMPORT_CLIENTS)
+    )
+    return http.post("/clients/import", data=body.encode(), content_type="text/csv")
+
+
+def create_parking(http, ctx: Context):
+    return http.post("/parkings", data={"address": "Бенчмарк", "count_places": 10})
+
+
+def get_availability(http, ctx: Context):
+    return http.get(f"/parkings/{ctx.parking_id}/availability")
+
+
+def get_stats(http, ctx: Context):
+    return http.get(f"/parkings/{ctx.parking_id}/stats")
+
+
+def get_events(http, ctx: Context):
+    # Время до первого сообщения потока
+    response = http.get(f"/parkings/{ctx.parking_id}/events", buffered=False)
+    next(iter(response.response))
+    response.close()
+    return response
+
+
+def enter_parking(http, ctx: Context):
+    client_id, car_number = ctx.free.popleft()
+    response = http.post(
+        "/client_parkings", data={"client_id": client_id, "parking_id": ctx.parking_id}
+    )
+    ctx.parked.append((client_id, car_number))
+    return response
+
+
+def exit_parking(http, ctx: Context):
+    client_id, car_number = ctx.parked.popleft()
+    response = http.delete(
+        "/client_parkings", data={"client_id": client_id, "parking_id": ctx.parking_id}
+    )
+    ctx.free.append((client_id, car_number))
+    return response
+
+
+def enter_parking_by_plate(http, ctx: Context):
+    client_id, car_number = ctx.free.popleft()
+    response = http.post(
+        "/client_parkings/by_plate",
+        data={"car_number": car_number, "parking_id": ctx.parking_id},
+    )
+    ctx.parked_by_plate.append((client_id, car_number))
+    return response
+
+
+def exit_parking_by_plate(http, ctx: Context):
+    client_id, car_number = ctx.parked_by_plate.popleft()
+    response = http.delete(
+        "/client_parkings/by_plate",
+        data={"car_number": car_number, "parking_id": ctx.parking_id},
+    )
+    ctx.free.append((client_id, car_number))
+    return response
+
+
+def batch_parking(http, ctx: Context):
+    clients = [ctx.free.popleft() for _ in range(BATCH_CLIENTS)]
+    events = [
+        {"action": action, "client_id": client_id, "parking_id": ctx.parking_id}
+        for action in ("enter", "exit")
+        for client_id, _ in clients
+    ]
+    response = http.post("/client_parkings/batch", json=events)
+    ctx.free.extend(clients)
+    return response
+
+
+Scenario = Tuple[Callable[[Any, Context], Any], Set[int]]
+
+# Сценарии по (endpoint, метод) в порядке выполнения: заезды раньше выездов
+SCENARIOS: Dict[Tuple[str, str], Scenario] = {
+    ("get_clients_handler", "GET"): (get_clients, {200}),
+    ("search_clients_handler", "GET"): (search_clients, {200}),
+    ("get_client_handler", "GET"): (get_client, {200}),
+    ("create_client_handler", "POST"): (create_client, {201}),
+    ("import_clients_handler", "POST"): (import_clients, {200}),
+    ("create_parking_handler", "POST"): (create_parking, {201}),
+    ("get_parking_availability_handler", "GET"): (get_availability, {200}),
+    ("get_parking_stats_handler", "GET"): (get_stats, {200}),
+    ("parking_events_handler", "GET"): (get_events, {200}),
+    ("enter_parking_handler", "POST"): (enter_parking, {201}),
+    ("exit_parking_handler", "DELETE"): (exit_parking, {200}),
+    ("enter_parking_by_plate_handler", "POST"): (enter_parking_by_plate, {201}),
+    ("exit_parking_by_plate_handler", "DELETE"): (exit_parking_by_plate, {200}),
+    ("batch_parking_handler", "POST"): (batch_parking, {200}),
+    # Последним: к этому времени в реестре метрики всех маршрутов
+    ("metrics_handler", "GET"): (get_metrics, {200}),
+}
+
+
+def app_routes(app: Flask) -> List[Tuple[str, str, str]]:
+    """Маршруты приложения: (endpoint, метод, правило)"""
+    routes = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == "static":
+            continue
+        for method in sorted((rule.methods or set()) - {"HEAD", "OPTIONS"}):
+            routes.append((rule.endpoint, method, rule.rule))
+    return routes
+
+
+def run_dataset(
+    profile: str, size: int, requests: int, warmup: int, seed: int
+) -> Dict[str, Any]:
+    with harness.temporary_app(profile) as app:
+        started = time.perf_counter()
+        with app.app_context():
+            seeded = harness.seed_dataset(size, seed=seed)
+            db.session.remove()
+        seed_seconds = time.perf_counter() - started
+        startup_ms = harness.measure_startup(profile, app)
+        print(f"{size:>9} {'create_app':<48}{startup_ms:>9.3f}", flush=True)
+
+        missing = [
+            f"{method} {rule}"
+            for endpoint, method, rule in app_routes(app)
+            if (endpoint, method) not in SCENARIOS
+        ]
+        if missing:
+            raise SystemExit(f"Нет сценариев для маршрутов: {', '.join(missing)}")
+
+        rules = {(e, m): f"{m} {r}" for e, m, r in app_routes(app)}
+        ctx = Context(app, seed)
+        http = app.test_client()
+        routes = {}
+        for key, (scenario, expected) in SCENARIOS.items():
+            for _ in range(warmup):
+                scenario(http, ctx)
+            latencies = []
+            errors = 0
+            run_started = time.perf_counter()
+            for _ in range(requests):
+                request_started = time.perf_counter()
+                response = scenario(http, ctx)
+                latencies.append(time.perf_counter() - request_started)
+                if response.status_code not in expected:
+                    errors += 1
+            elapsed = time.perf_counter() - run_started
+            routes[rules[key]] = {
+                **harness.latency_stats(latencies, elapsed),
+                "requests": requests,
+                "errors": errors,
+            }
+            print(
+                f"{size:>9} {rules[key]:<48}"
+                f"{routes[rules[key]]['p50_ms']:>9.3f}"
+                f"{routes[rules[key]]['p99_ms']:>9.3f}"
+                f"{routes[rules[key]]['rps']:>9.0f}{errors:>6}",
+                flush=True,
+            )
+
+    return {
+        "seed_seconds": seed_seconds,
+        "startup_ms": startup_ms,
+        "rows": seeded,
+        "routes": routes,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10000, 100000, 1000000]
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--profile",
+        choices=sorted(PROFILES),
+        default="high-throughput",
+        help="профиль настроек; memory - база в памяти без файлового ввода-вывода",
+    )
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "profile": args.profile,
+            "requests": args.requests,
+        },
+        "datasets": {},
+    }
+    print(
+        f"{'строк':>9} {'маршрут':<48}{'p50, мс':>9}{'p99, мс':>9}{'запр/с':>9}{'ошиб.':>6}"
+    )
+    for size in args.sizes:
+        results["datasets"][str(size)] = run_dataset(
+            args.profile, size, args.requests, args.warmup, args.seed
+        )
+    harness.write_results(args.output, results)
+    print(f"Результаты записаны в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = harness.compare_results(baseline, results, args.threshold)
+        for line in regressions:
+            print(f"РЕГРЕССИЯ {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
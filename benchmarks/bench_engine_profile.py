@@ -0,0 +1,119 @@
+"""Бенчмарк профилей движка: смешанная нагрузка GET/POST из нескольких потоков
+
+Сравниваются профили default и high-throughput, для каждого создается
+отдельная база во временном каталоге, фоновые задачи не запускаются.
+Профиль memory не участвует: его единственное общее соединение
+(StaticPool) не рассчитано на параллельные запросы из потоков.
+Каждый поток по очереди заезжает и выезжает своим клиентом, а в
+остальных запросах читает случайных клиентов через GET /clients/<id>.
+
+Запуск: python -m benchmarks.bench_engine_profile --threads 16 --seconds 5
+"""
+
+import argparse
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+
+from parking_app.app import create_app, db
+from parking_app.config import PROFILES
+from parking_app.models import Client, Parking
+
+# Профили с файловой базой и пулом соединений
+BENCH_PROFILES = ("default", "high-throughput")
+
+
+def run(profile: type, threads: int, seconds: float, write_ratio: float) -> Dict:
+    """Нагрузка на приложение с профилем profile, запросов в секунду"""
+    with tempfile.TemporaryDirectory() as tmp:
+
+        class BenchProfile(profile):  # type: ignore
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{Path(tmp) / 'bench.db'}"
+            SCHEMA_AUTO_MIGRATE = True
+            START_BACKGROUND_JOBS = False
+
+        app = create_app(BenchProfile)
+        with app.app_context():
+            parking = Parking(
+                address="Бенчмарк профилей",
+                opened=True,
+                count_places=threads,
+                count_available_places=threads,
+            )
+            clients = [
+                Client(name="Бенч", surname=str(i), credit_card="4000000000000002")
+                for i in range(max(threads, 1000))
+            ]
+            db.session.add(parking)
+            db.session.add_all(clients)
+            db.session.commit()
+            parking_id = parking.id
+            client_ids = [c.id for c in clients]
+
+        deadline = time.perf_counter() + seconds
+        counters = {"reads": 0, "writes": 0, "errors": 0}
+        lock = threading.Lock()
+
+        def worker(own_client_id: int) -> None:
+            http = app.test_client()
+            rnd = random.Random(own_client_id)
+            data = {"client_id": own_client_id, "parking_id": parking_id}
+            parked = False
+            reads = writes = errors = 0
+            while time.perf_counter() < deadline:
+                if rnd.random() < write_ratio:
+                    if parked:
+                        response = http.delete("/client_parkings", data=data)
+                    else:
+                        response = http.post("/client_parkings", data=data)
+                    parked = not parked
+                    writes += 1
+                else:
+                    response = http.get(f"/clients/{rnd.choice(client_ids)}")
+                    reads += 1
+                if response.status_code >= 500:
+                    errors += 1
+            with lock:
+                counters["reads"] += reads
+                counters["writes"] += writes
+                counters["errors"] += errors
+
+        started = time.perf_counter()
+        pool = [
+            threading.Thread(target=worker, args=(client_id,))
+            for client_id in client_ids[:threads]
+        ]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        with app.app_context():
+            db.engine.dispose()
+
+    total = counters["reads"] + counters["writes"]
+    return {"rps": total / elapsed, **counters}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(f"{'профиль':<18}{'запр/с':>10}{'чтений':>10}{'записей':>10}{'ошибок':>8}")
+    for name in BENCH_PROFILES:
+        stats = run(PROFILES[name], args.threads, args.seconds, args.write_ratio)
+        print(
+            f"{name:<18}{stats['rps']:>10.0f}{stats['reads']:>10}"
+            f"{stats['writes']:>10}{stats['errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Бенчмарк выезда с парковки: ORM-путь (до) против UPDATE ... RETURNING (после)
+
+Приложение работает на временной базе без фоновых задач (harness).
+Прежний путь повторяет обработчик до перехода на RETURNING: платеж в
+очередь и почасовые итоги, которые выезд пишет теперь, он не пишет.
+
+Запуск: python -m benchmarks.bench_exit --sessions 2000
+"""
+
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from flask import jsonify, request
+from sqlalchemy import event
+
+from benchmarks import harness
+from parking_app.app import db
+from parking_app.config import PROFILES
+from parking_app.models import Client, ClientParking, Parking, PaymentIntent
+
+LEGACY_URL = "/bench/legacy_exit"
+
+
+def legacy_exit_handler():
+    """Выезд с парковки в прежнем виде: пять обращений к БД через identity map"""
+    client_id = request.form.get("client_id", type=int)
+    parking_id = request.form.get("parking_id", type=int)
+
+    client_parking = (
+        db.session.query(ClientParking)
+        .filter(
+            ClientParking.client_id == client_id,
+            ClientParking.parking_id == parking_id,
+            ClientParking.time_out.is_(None),
+        )
+        .first()
+    )
+    if not client_parking:
+        return jsonify({"error": "Активная запись о парковке не найдена"}), 404
+
+    client = db.session.get(Client, client_id)
+    if not client.credit_card:
+        return jsonify({"error": "У клиента не привязана карта для оплаты"}), 400
+
+    client_parking.time_out = datetime.now()
+    parking = db.session.get(Parking, parking_id)
+    parking.count_available_places += 1
+
+    parking_hours = (
+        client_parking.time_out - client_parking.time_in
+    ).total_seconds() / 3600
+    cost = max(1, round(parking_hours * 50))
+    db.session.commit()
+
+    return jsonify({"cost": cost, "client_parking": client_parking.to_json()}), 200
+
+
+def seed_sessions(count: int) -> Tuple[int, List[int]]:
+    """Создает парковку и count клиентов, стоящих на ней"""
+    parking = Parking(
+        address="Бенчмарк выезда",
+        opened=True,
+        count_places=count,
+        count_available_places=0,
+    )
+    clients = [
+        Client(name="Бенч", surname=str(i), credit_card="4000000000000002")
+        for i in range(count)
+    ]
+    db.session.add(parking)
+    db.session.add_all(clients)
+    db.session.flush()
+
+    time_in = datetime.now() - timedelta(hours=2)
+    db.session.add_all(
+        ClientParking(client_id=c.id, parking_id=parking.id, time_in=time_in)
+        for c in clients
+    )
+    db.session.commit()
+    return parking.id, [c.id for c in clients]
+
+
+def cleanup(parking_id: int, client_ids: List[int]) -> None:
+    """Удаляет данные, созданные бенчмарком"""
+    db.session.query(PaymentIntent).filter(
+        PaymentIntent.client_id.in_(client_ids)
+    ).delete()
+    db.session.query(ClientParking).filter(
+        ClientParking.parking_id == parking_id
+    ).delete()
+    db.session.query(Client).filter(Client.id.in_(client_ids)).delete()
+    db.session.query(Parking).filter(Parking.id == parking_id).delete()
+    db.session.commit()
+
+
+def run(app, url: str, sessions: int) -> Dict[str, float]:
+    """Прогоняет sessions выездов через url и возвращает статистику"""
+    statements = 0
+
+    def count_statement(*args):
+        nonlocal statements
+        statements += 1
+
+    with app.app_context():
+        parking_id, client_ids = seed_sessions(sessions)
+
+    http = app.test_client()
+    latencies = []
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", count_statement)
+    try:
+        for client_id in client_ids:
+            started = time.perf_counter()
+            response = http.delete(
+                url, data={"client_id": client_id, "parking_id": parking_id}
+            )
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.get_json()
+    finally:
+        with app.app_context():
+            event.remove(db.engine, "before_cursor_execute", count_statement)
+            cleanup(parking_id, client_ids)
+
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "statements_per_exit": statements / sessions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument(
+        "--profile", choices=sorted(PROFILES), default="high-throughput"
+    )
+    args = parser.parse_args()
+
+    with harness.temporary_app(args.profile) as app:
+        app.add_url_rule(LEGACY_URL, view_func=legacy_exit_handler, methods=["DELETE"])
+
+        print(f"{'путь':<12}{'p50, мс':>10}{'p99, мс':>10}{'ср., мс':>10}{'SQL':>6}")
+        for name, url in (("orm", LEGACY_URL), ("returning", "/client_parkings")):
+            stats = run(app, url, args.sessions)
+            print(
+                f"{name:<12}{stats['p50_ms']:>10.3f}{stats['p99_ms']:>10.3f}"
+                f"{stats['mean_ms']:>10.3f}{stats['statements_per_exit']:>6.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Бенчмарк пересчета истории: по одной сессии на Python против NumPy
+
+База наполняется datagen, затем закрытые сессии пересчитываются двумя
+способами по одному набору тарифов:
+- rows: строки Core с datetime и Tariff.price для каждой сессии;
+- rebill: parking_app.tariffs.rebill (колонки порциями, price_sessions).
+
+Запуск: python -m benchmarks.bench_rebill --clients 100000 --sessions-per-client 10
+"""
+
+import argparse
+import time
+
+from sqlalchemy import select
+
+from benchmarks import harness
+from parking_app.app import db
+from parking_app.models import ClientParking
+from parking_app.tariffs import TariffBook, rebill, to_rubles
+
+# Дневной и ночной тариф на каждой второй парковке, остальные по умолчанию
+NIGHT_AND_DAY = {"hourly_rates": [10] * 6 + [60] * 16 + [10] * 2, "cap": 700}
+
+
+def rebill_rows(book: TariffBook) -> float:
+    """Пересчет по одной сессии, возвращает общую сумму в рублях"""
+    total = 0
+    rows = db.session.execute(
+        select(
+            ClientParking.parking_id, ClientParking.time_in, ClientParking.time_out
+        ).where(ClientParking.time_out.is_not(None))
+    )
+    for parking_id, time_in, time_out in rows:
+        total += book.for_parking(parking_id).price(time_in, time_out)
+    return to_rubles(total)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=100000)
+    parser.add_argument("--sessions-per-client", type=int, default=10)
+    args = parser.parse_args()
+
+    with harness.temporary_app() as app, app.app_context():
+        counts = harness.seed_dataset(args.clients, args.sessions_per_client)
+        book = TariffBook.from_config(
+            {
+                "default": {"rate": 50, "minimum": 1},
+                **{
+                    parking_id: NIGHT_AND_DAY
+                    for parking_id in range(2, counts["parkings"] + 1, 2)
+                },
+            }
+        )
+        sessions = counts["client_parkings"]
+
+        started = time.perf_counter()
+        rows_total = rebill_rows(book)
+        rows_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        summary = rebill(book)
+        rebill_seconds = time.perf_counter() - started
+        db.session.remove()
+
+    print(f"сессий: {sessions}")
+    print(f"{'способ':<10}{'секунд':>10}{'сессий/с':>14}{'сумма':>16}")
+    for name, seconds, total in (
+        ("rows", rows_seconds, rows_total),
+        ("rebill", rebill_seconds, summary["cost"]),
+    ):
+        print(f"{name:<10}{seconds:>10.2f}{sessions / seconds:>14.0f}{total:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Микробенчмарк сериализации: to_json с обходом колонок против собранных функций
+
+На одних и тех же строках client_parking измеряется путь до готового
+JSON, как его проходят обработчики:
+- reflection: прежний to_json (обход __table__.columns и getattr) и JSON
+  Flask, который форматирует даты через default-хук;
+- compiled: собранный to_json объекта ORM и JSON Flask;
+- row: собранный сериализатор строки Core-запроса (без объектов ORM) с
+  собственным форматированием дат и serializers.dumps.
+
+Запуск: python -m benchmarks.bench_serializers --rows 100000
+"""
+
+import argparse
+import timeit
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import select
+
+from parking_app import models
+from parking_app.serializers import dumps
+
+
+def reflection_to_json(obj):
+    return {c.name: getattr(obj, c.name) for c in obj.__table__.columns}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    flask_dumps = Flask(__name__).json.dumps
+    time_in = datetime(2024, 1, 1, 8)
+    objects = [
+        models.ClientParking(
+            id=i,
+            client_id=i,
+            parking_id=i % 100,
+            time_in=time_in,
+            time_out=time_in + timedelta(hours=3),
+        )
+        for i in range(args.rows)
+    ]
+    # Строки Core того же вида, что возвращает select(*table.columns)
+    table = models.ClientParking.__table__
+    columns = select(*table.columns).selected_columns.keys()
+    rows = [tuple(getattr(obj, name) for name in columns) for obj in objects]
+
+    cases = {
+        "reflection": lambda: flask_dumps([reflection_to_json(o) for o in objects]),
+        "compiled": lambda: flask_dumps(
+            [models.client_parking_to_json(o) for o in objects]
+        ),
+        "row": lambda: dumps([models.client_parking_row_to_json(r) for r in rows]),
+    }
+    print(f"{'способ':<12}{'мкс/строку':>12}")
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=1, repeat=args.repeat))
+        print(f"{name:<12}{best / args.rows * 1e6:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
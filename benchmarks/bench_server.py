@@ -0,0 +1,180 @@
+"""Пропускная способность многопроцессного сервера по числу воркеров
+
+Для каждого числа воркеров запускается PreforkServer (parking_app.server)
+на файловой базе в режиме WAL (профиль high-throughput), наполненной
+datagen. Нагрузку дают --connections процессов: каждый шлет запросы
+подряд, по новому соединению на запрос (сервер wsgiref закрывает
+соединение после ответа). Сценарии:
+
+- read: GET /clients/<id> случайного клиента;
+- write: заезд и выезд по id клиента, у каждого процесса нагрузки свои
+  клиенты.
+
+Процессы нагрузки делят процессор с воркерами: если ядер меньше, чем
+воркеров и процессов нагрузки вместе, рост упирается в процессор, а не
+в сервер.
+
+Запуск:
+    python -m benchmarks.bench_server --workers 1 2 4 8 --duration 10 \\
+        --output server.json
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import signal
+import time
+from random import Random
+from typing import Any, Dict, List, Sequence, Tuple
+
+from sqlalchemy import select
+
+from benchmarks import harness
+from parking_app.app import db
+from parking_app.models import Client, Parking
+from parking_app.server import PreforkServer
+
+Address = Tuple[str, int]
+
+
+def send(address: Address, method: str, path: str, body: str = "") -> int:
+    """Один запрос по новому соединению, возвращает код ответа"""
+    connection = http.client.HTTPConnection(*address, timeout=30)
+    try:
+        headers = {"Content-Type": "application/json"} if body else {}
+        connection.request(method, path, body=body or None, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def load(
+    address: Address,
+    scenario: str,
+    duration: float,
+    client_ids: Sequence[int],
+    parking_id: int,
+    seed: int,
+) -> Tuple[List[float], int]:
+    """Процесс нагрузки: задержки успешных запросов и число ошибок"""
+    rnd = Random(seed)
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    index = 0
+    while time.perf_counter() < deadline:
+        if scenario == "read":
+            requests = [("GET", f"/clients/{rnd.choice(client_ids)}", "")]
+        else:
+            client_id = client_ids[index % len(client_ids)]
+            index += 1
+            body = f'{{"client_id": {client_id}, "parking_id": {parking_id}}}'
+            requests = [
+                ("POST", "/client_parkings", body),
+                ("DELETE", "/client_parkings", body),
+            ]
+        for method, path, body in requests:
+            started = time.perf_counter()
+            status = send(address, method, path, body)
+            if status < 400:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+    return latencies, errors
+
+
+def measure(
+    app, workers: int, scenario: str, args, client_ids: List[int], parking_id: int
+) -> Dict[str, Any]:
+    """Запуск сервера с workers воркерами и нагрузка сценарием scenario"""
+    server = PreforkServer(app, port=0, workers=workers, max_requests=0, run_jobs=False)
+    server.bind()
+    context = multiprocessing.get_context("fork")
+    master = context.Process(target=server.run)
+    master.start()
+    try:
+        # Первые запросы ждут запуска воркеров
+        for _ in range(workers * 2):
+            send(server.address, "GET", "/metrics")
+        # Клиенты делятся между процессами нагрузки, чтобы заезды не пересекались
+        step = args.connections
+        tasks = [
+            (
+                server.address,
+                scenario,
+                args.duration,
+                client_ids[index::step],
+                parking_id,
+                index,
+            )
+            for index in range(step)
+        ]
+        started = time.perf_counter()
+        with context.Pool(args.connections) as pool:
+            results = pool.starmap(load, tasks)
+        elapsed = time.perf_counter() - started
+    finally:
+        os.kill(master.pid, signal.SIGTERM)  # type: ignore[arg-type]
+        master.join()
+
+    latencies = [value for values, _ in results for value in values]
+    return {
+        **harness.latency_stats(latencies, elapsed),
+        "errors": sum(errors for _, errors in results),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--scenarios", nargs="+", default=["read", "write"])
+    parser.add_argument("--clients", type=int, default=100000)
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--output", help="Файл для результатов в JSON")
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {
+        "clients": args.clients,
+        "connections": args.connections,
+        "cpus": os.cpu_count(),
+        "runs": {},
+    }
+    with harness.temporary_app("high-throughput") as app:
+        with app.app_context():
+            harness.seed_dataset(args.clients)
+            # Выезд без карты - отказ, клиент остался бы на парковке
+            client_ids = list(
+                db.session.scalars(
+                    select(Client.id).where(Client.credit_card.is_not(None))
+                )
+            )
+            parking_id = db.session.execute(select(Parking.id).limit(1)).scalar_one()
+            db.session.remove()
+            db.engine.dispose()
+
+        print(
+            f"{'воркеров':>8} {'сценарий':>8} {'rps':>9} {'p50, мс':>9} "
+            f"{'p99, мс':>9} {'ошибок':>7}"
+        )
+        for workers in args.workers:
+            for scenario in args.scenarios:
+                stats = measure(app, workers, scenario, args, client_ids, parking_id)
+                results["runs"][f"{workers}/{scenario}"] = stats
+                print(
+                    f"{workers:>8} {scenario:>8} {stats['rps']:>9.0f} "
+                    f"{stats['p50_ms']:>9.2f} {stats['p99_ms']:>9.2f} "
+                    f"{stats['errors']:>7}"
+                )
+
+    if args.output:
+        harness.write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
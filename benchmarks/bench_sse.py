@@ -0,0 +1,248 @@
+"""Нагрузочный тест рассылки SSE: тысячи подписчиков одной парковки
+
+Два режима:
+
+- в процессе (по умолчанию): каждый подписчик - отдельный поток, читающий
+  тот же генератор, что отдает GET /parkings/<id>/events. Писатель
+  вызывает publish напрямую с заданной частотой; измеряется время
+  publish (его платит коммит заезда или выезда), задержка доставки и
+  число склеенных изменений. HTTP, коммит и опрос общих счетчиков в
+  этот замер не входят;
+- --http: PreforkServer (parking_app.server) с --workers воркерами на
+  временной базе, подписчики - HTTP-соединения к /parkings/<id>/events,
+  изменения - заезды разных клиентов через POST /client_parkings.
+  Задержка считается от отправки запроса заезда и включает коммит, а для
+  подписчиков других воркеров - опрос общих счетчиков (SSE_POLL_INTERVAL).
+  Каждое соединение занимает поток воркера со стеком 256 КБ.
+
+Замер на одном ядре, 5000 подписчиков и 50 изменений по 20 мс. Все
+подписчики подключаются и получают последнее значение, промежуточные
+склеиваются:
+
+    режим               заезд/publish p50   доставка p50 / p99
+    в процессе          0.01 мс             44 / 235 мс
+    --http, 2 воркера   50 мс               265 / 964 мс
+    --http, 4 воркера   102 мс              363 / 1029 мс
+
+Через HTTP цель 5000 подписчиков достигается по числу соединений, но не
+по задержке: на одном ядре потоки соединений делят его с заездами, и
+p99 доставки около секунды.
+
+Запуск:
+    python -m benchmarks.bench_sse --subscribers 5000 --updates 50
+    python -m benchmarks.bench_sse --http --workers 2 --subscribers 5000
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import resource
+import signal
+import statistics
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from benchmarks import harness
+from benchmarks.harness import percentile
+from parking_app.app import db
+from parking_app.events import AvailabilityHub
+from parking_app.models import Client, Parking
+from parking_app.server import PreforkServer
+
+PARKING_ID = 1
+
+
+class Results:
+    """Замеры прогона: время изменения, задержки доставки, сообщений на подписчика"""
+
+    def __init__(self, subscribers: int) -> None:
+        self.change_times: List[float] = []
+        self.latencies: List[float] = []
+        self.received = [0] * subscribers
+        self.lock = threading.Lock()
+
+    def add(self, index: int, latencies: List[float]) -> None:
+        with self.lock:
+            self.latencies.extend(latencies)
+            self.received[index] = len(latencies)
+
+
+def run_in_process(args) -> Results:
+    """Подписчики читают генератор рассылки, писатель вызывает publish"""
+    hub = AvailabilityHub()
+    published_at: Dict[int, float] = {}
+    results = Results(args.subscribers)
+    ready = threading.Barrier(args.subscribers + 1)
+
+    def subscriber(index: int) -> None:
+        # Значение счетчика - номер изменения, по нему считается задержка
+        stream = hub.subscribe(PARKING_ID, 0, keepalive=1)
+        next(stream)
+        ready.wait()
+        local = []
+        for message in stream:
+            if message.startswith(":"):
+                continue
+            data = json.loads(message.rsplit("data: ", 1)[1])
+            number = data["count_available_places"]
+            local.append(time.perf_counter() - published_at[number])
+            if number == args.updates:
+                break
+        stream.close()
+        results.add(index, local)
+
+    threads = [
+        threading.Thread(target=subscriber, args=(i,)) for i in range(args.subscribers)
+    ]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+
+    for number in range(1, args.updates + 1):
+        published_at[number] = time.perf_counter()
+        hub.publish(PARKING_ID, number)
+        results.change_times.append(time.perf_counter() - published_at[number])
+        time.sleep(args.interval)
+
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def seed_parking(updates: int) -> Tuple[int, List[int]]:
+    """Парковка на updates мест и updates клиентов: каждый заезд - новое значение"""
+    parking = Parking(
+        address="Бенчмарк SSE",
+        opened=True,
+        count_places=updates,
+        count_available_places=updates,
+    )
+    clients = [Client(name="Бенч", surname=f"SSE{i}") for i in range(updates)]
+    db.session.add(parking)
+    db.session.add_all(clients)
+    db.session.commit()
+    ids = parking.id, [client.id for client in clients]
+    db.session.remove()
+    db.engine.dispose()
+    return ids
+
+
+def run_http(args) -> Results:
+    """Подписчики - HTTP-соединения к PreforkServer, изменения - заезды"""
+    results = Results(args.subscribers)
+    sent_at: Dict[int, float] = {}
+    ready = threading.Barrier(args.subscribers + 1)
+
+    with harness.temporary_app("high-throughput") as app:
+        with app.app_context():
+            parking_id, client_ids = seed_parking(args.updates)
+        server = PreforkServer(
+            app, port=0, workers=args.workers, max_requests=0, run_jobs=False
+        )
+        server.bind()
+        master = multiprocessing.get_context("fork").Process(target=server.run)
+        master.start()
+
+        def request(method: str, path: str, body: str = "") -> int:
+            connection = http.client.HTTPConnection(*server.address, timeout=60)
+            try:
+                headers = {"Content-Type": "application/json"} if body else {}
+                connection.request(method, path, body=body or None, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                return response.status
+            finally:
+                connection.close()
+
+        def subscriber(index: int) -> None:
+            # Номер изменения - сколько клиентов уже заехало
+            connection = http.client.HTTPConnection(*server.address, timeout=60)
+            connection.request("GET", f"/parkings/{parking_id}/events")
+            response = connection.getresponse()
+            local: List[float] = []
+            waiting = True
+            for line in iter(response.readline, b""):
+                if not line.startswith(b"data:"):
+                    continue
+                data = json.loads(line.partition(b":")[2])
+                number = args.updates - data["count_available_places"]
+                if waiting:
+                    waiting = False
+                    ready.wait()
+                    continue
+                local.append(time.perf_counter() - sent_at[number])
+                if number == args.updates:
+                    break
+            connection.close()
+            results.add(index, local)
+
+        try:
+            # Первые запросы ждут запуска воркеров
+            for _ in range(args.workers * 2):
+                request("GET", "/metrics")
+            threads = [
+                threading.Thread(target=subscriber, args=(i,))
+                for i in range(args.subscribers)
+            ]
+            for thread in threads:
+                thread.start()
+            ready.wait()
+
+            for number, client_id in enumerate(client_ids, 1):
+                body = json.dumps({"client_id": client_id, "parking_id": parking_id})
+                sent_at[number] = time.perf_counter()
+                status = request("POST", "/client_parkings", body)
+                results.change_times.append(time.perf_counter() - sent_at[number])
+                if status != 201:
+                    raise RuntimeError(f"заезд {number}: код {status}")
+                time.sleep(args.interval)
+
+            for thread in threads:
+                thread.join()
+        finally:
+            os.kill(master.pid, signal.SIGTERM)  # type: ignore[arg-type]
+            master.join()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--updates", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.02)
+    parser.add_argument("--http", action="store_true", help="Замер через HTTP")
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    threading.stack_size(256 * 1024)
+    results = run_http(args) if args.http else run_in_process(args)
+
+    delivered = sum(results.received)
+    expected = args.subscribers * args.updates
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    change = "запрос заезда" if args.http else "publish"
+    print(f"подписчиков:              {args.subscribers}")
+    print(f"изменений:                {args.updates}")
+    print(
+        f"{change + ' p50/max, мс:':<25} "
+        f"{statistics.median(results.change_times) * 1000:.3f}"
+        f" / {max(results.change_times) * 1000:.3f}"
+    )
+    print(
+        f"доставка p50/p99, мс:     {percentile(results.latencies, 0.5) * 1000:.3f}"
+        f" / {percentile(results.latencies, 0.99) * 1000:.3f}"
+    )
+    print(
+        f"доставлено сообщений:     {delivered} из {expected}"
+        f" (склеено {expected - delivered})"
+    )
+    print(f"пиковая память, МБ:       {rss_mb:.0f}")
+
+
+if __name__ == "__main__":
+    main()
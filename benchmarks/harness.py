@@ -0,0 +1,112 @@
+"""Общие части бенчмарков: временное приложение, наполнение БД и статистика"""
+
+import json
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+from flask import Flask
+
+import datagen
+from parking_app.app import create_app, db
+
+
+@contextmanager
+def temporary_app(profile: Union[str, object] = "high-throughput", **settings: Any):
+    """Приложение с профилем profile на временной базе
+
+    Для профиля memory база в памяти, для остальных - файл во временном
+    каталоге. Фоновые задачи не запускаются, чтобы не влиять на замеры;
+    схема новой базы создается миграциями при запуске.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        config = {
+            "START_BACKGROUND_JOBS": False,
+            "SCHEMA_AUTO_MIGRATE": True,
+            **settings,
+        }
+        if profile != "memory":
+            config.setdefault(
+                "SQLALCHEMY_DATABASE_URI", f"sqlite:///{Path(tmp) / 'bench.db'}"
+            )
+        app = create_app(profile, config)
+        try:
+            yield app
+        finally:
+            with app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+
+
+def seed_dataset(
+    clients: int, sessions_per_client: int = 1, seed: int = 0
+) -> Dict[str, int]:
+    """Наполнение БД: clients клиентов, парковки и история заездов
+
+    Строки строит datagen.DataGenerator и пишет порциями через executemany.
+    """
+    return datagen.populate(clients, sessions_per_client=sessions_per_client, seed=seed)
+
+
+def measure_startup(
+    profile: Union[str, object], app: Flask, repeats: int = 10
+) -> float:
+    """Медиана времени create_app в миллисекундах на базе приложения app
+
+    На наполненной файловой базе запуск сводится к проверке версии схемы и
+    загрузке кэшей; для профиля memory каждый запуск создает схему заново.
+    """
+    config = {
+        "START_BACKGROUND_JOBS": False,
+        "SQLALCHEMY_DATABASE_URI": app.config["SQLALCHEMY_DATABASE_URI"],
+    }
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        started_app = create_app(profile, config)
+        timings.append(time.perf_counter() - started)
+        with started_app.app_context():
+            db.engine.dispose()
+    return statistics.median(timings) * 1000
+
+
+def percentile(values: List[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def latency_stats(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """p50/p99/среднее в миллисекундах и запросы в секунду"""
+    return {
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "rps": len(latencies) / elapsed,
+    }
+
+
+def write_results(path: str, results: Dict[str, Any]) -> None:
+    Path(path).write_text(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+def compare_results(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float
+) -> List[str]:
+    """Регрессии current относительно baseline: p50/p99 выросли больше threshold"""
+    regressions = []
+    for size, dataset in current["datasets"].items():
+        base_routes = baseline.get("datasets", {}).get(size, {}).get("routes", {})
+        for route, stats in dataset["routes"].items():
+            base = base_routes.get(route)
+            if base is None:
+                continue
+            for metric in ("p50_ms", "p99_ms"):
+                if stats[metric] > base[metric] * (1 + threshold):
+                    regressions.append(
+                        f"{size} {route} {metric}: "
+                        f"{base[metric]:.3f} -> {stats[metric]:.3f}"
+                    )
+    return regressions
@@ -1,36 +1,139 @@
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from itertools import count
 
 import pytest
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
 
 from parking_app.app import create_app
+from parking_app.availability import reconcile_availability
 from parking_app.models import Client, ClientParking, Parking, db
 
+# Номера автомобилей уникальны: фикстуры одного теста получают разные номера
+plate_numbers = count(1)
+
+# Управление транзакциями не входит в бюджет запросов
+TRANSACTION_STATEMENTS = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+
+class BoundSession(Session):
+    """Сессия приложения, работающая в транзакции соединения теста"""
+
+    def get_bind(self, *args, **kwargs):
+        return self.bind
+
 
 @pytest.fixture(scope="session")
 def app():
-    """Создание приложения для тестирования"""
-    app = create_app()
-    app.config["TESTING"] = True
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///test.db"
-    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    """Создание приложения для тестирования на базе в памяти"""
+    app = create_app("memory", {"TESTING": True})
 
     with app.app_context():
-        db.create_all()
         yield app
         db.drop_all()
 
 
 @pytest.fixture
-def client(app):
+def file_app(tmp_path):
+    """Приложение на файловой базе для тестов параллельных запросов
+
+    В памяти все потоки делят одно соединение, и конкуренцию писателей
+    на нем не проверить.
+    """
+    app = create_app(
+        "default",
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'parking.db'}",
+            "START_BACKGROUND_JOBS": False,
+        },
+    )
+
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app, db_session):
     """Тестовый клиент для запросов"""
     return app.test_client()
 
 
 @pytest.fixture
 def db_session(app):
-    """Сессия базы данных"""
+    """Сессия базы данных, изменения которой откатываются после теста
+
+    Тест и обработчики запросов работают внутри транзакции отдельного
+    соединения; commit фиксирует только SAVEPOINT.
+    """
     with app.app_context():
-        yield db
+        connection = db.engine.connect()
+        transaction = connection.begin()
+        # Настройки фабрики сессий меняются только на время теста
+        factory = db.session.session_factory
+        app_class, app_options = factory.class_, dict(factory.kw)
+        db.session.remove()
+        factory.class_ = BoundSession
+        db.session.configure(bind=connection, join_transaction_mode="create_savepoint")
+        try:
+            yield db
+        finally:
+            db.session.remove()
+            factory.class_, factory.kw = app_class, app_options
+            transaction.rollback()
+            connection.close()
+            # Кэши в памяти не должны пережить откаченные строки
+            app.extensions["plate_cache"].clear()
+            app.extensions["response_cache"].clear()
+            reconcile_availability()
+
+
+class QueryCounter:
+    """Слушатель before_cursor_execute, запоминающий SQL-запросы приложения"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(TRANSACTION_STATEMENTS):
+            self.statements.append(statement)
+
+
+@pytest.fixture
+def query_budget(app, db_session):
+    """Контекстный менеджер: тест падает, если SQL-запросов больше limit
+
+    Сессия перед блоком закрывается, как в начале нового запроса к
+    приложению, чтобы объекты из нее не экономили запросы.
+    """
+
+    @contextmanager
+    def budget(limit):
+        counter = QueryCounter()
+        db_session.session.remove()
+        event.listen(db.engine, "before_cursor_execute", counter)
+        try:
+            yield counter
+        finally:
+            event.remove(db.engine, "before_cursor_execute", counter)
+        if len(counter.statements) > limit:
+            pytest.fail(
+                f"SQL-запросов {len(counter.statements)}, бюджет {limit}:\n"
+                + "\n".join(counter.statements)
+            )
+
+    return budget
+
+
+@pytest.fixture
+def large_dataset(db_session):
+    """Несколько тысяч клиентов с историей заездов из datagen"""
+    from datagen import populate
+
+    return populate(3000, parkings=3, sessions_per_client=2, seed=18)
 
 
 @pytest.fixture
@@ -40,7 +143,7 @@ def sample_client(db_session):
         name="Иван",
         surname="Иванов",
         credit_card="1234567812345678",
-        car_number="А123БВ777",
+        car_number=f"А{next(plate_numbers):03d}БВ777",
     )
     db_session.session.add(client)
     db_session.session.commit()
@@ -103,7 +206,10 @@ def sample_client_parking(db_session, sample_client, sample_parking):
 def client_without_card(db_session):
     """Клиент без привязанной карты"""
     client = Client(
-        name="Петр", surname="Петров", credit_card=None, car_number="В456ГД777"
+        name="Петр",
+        surname="Петров",
+        credit_card=None,
+        car_number=f"В{next(plate_numbers):03d}ГД777",
     )
     db_session.session.add(client)
     db_session.session.commit()
@@ -0,0 +1,319 @@
+"""Быстрая генерация больших наборов данных для парковок
+
+В отличие от фабрик из factories.py, Faker вызывается только при
+построении пулов имен, фамилий, адресов и номеров карт, а строки
+собираются выбором из пулов и пишутся в БД порциями через executemany.
+Номера автомобилей не случайны, а получаются из порядкового номера
+биекцией, поэтому уникальны без проверок.
+
+История заездов: у клиента в среднем sessions_per_client сессий в разные
+дни окна days; время заезда распределено по часам с утренним и вечерним
+пиками, длительность - логнормальная с медианой около двух часов. Все
+сессии закрыты, поэтому свободные места парковок не меняются. Строки
+пишутся в обход сервисов, поэтому почасовые итоги загрузки генератор
+считает сам, пока выдает сессии: разбиение по часам каждого окна из пула
+вычислено заранее, и на сессию остается несколько сложений. Итоги
+вставляются так же порциями; сессии ссылаются только на новые парковки,
+поэтому итоги существующих не меняются. Версия таблицы клиентов
+поднимается явно (parking_app.versions.bump_version).
+
+Запуск (база из профиля приложения, фоновые задачи не запускаются):
+    python datagen.py --clients 1000000 --sessions-per-client 10
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+from math import gcd
+from random import Random
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from faker import Faker
+
+from parking_app import models
+from parking_app.app import create_app, db
+from parking_app.models import Client, ClientParking, Parking
+from parking_app.versions import bump_version
+
+Row = Tuple[Any, ...]
+# Итоги часов: (id парковки, префикс даты, час) -> заезды, выезды, секунды
+HourlyTotals = Dict[Tuple[int, str, int], List[int]]
+
+# Буквы, разрешенные в российских номерах
+PLATE_LETTERS = "АВЕКМНОРСТУХ"
+PLATE_REGIONS = (77, 97, 99, 177, 197, 199, 777, 797, 799, 50, 90, 150, 190, 750)
+# Номеров на регион: буква, три цифры, две буквы
+PLATES_PER_REGION = len(PLATE_LETTERS) ** 3 * 1000
+
+# Относительная частота заездов по часам суток, с полуночи
+HOURLY_WEIGHTS = tuple(
+    map(int, "1 1 1 1 1 2 4 9 14 12 8 7 8 8 7 7 8 11 13 10 7 5 3 2".split())
+)
+DAY_SECONDS = 24 * 60 * 60
+
+# Колонки строк, которые выдает генератор, по таблицам
+CLIENT_COLUMNS = ("name", "surname", "credit_card", "car_number")
+PARKING_COLUMNS = ("address", "opened", "count_places", "count_available_places")
+SESSION_COLUMNS = ("client_id", "parking_id", "time_in", "time_out")
+STATS_COLUMNS = ("parking_id", "bucket", "entries", "exits", "occupied_seconds")
+
+# Размер порции executemany
+BATCH_SIZE = 50000
+
+
+class DataGenerator:
+    """Генератор строк client, parking и client_parking
+
+    Строки - кортежи значений в порядке *_COLUMNS. Пулы строятся один раз
+    в конструкторе; при одном seed результат воспроизводим.
+    """
+
+    def __init__(self, seed: int = 0, pool_size: int = 1000, card_share=0.8):
+        self.rnd = Random(seed)
+        fake = Faker("ru_RU")
+        fake.seed_instance(seed)
+        self.names = [fake.first_name() for _ in range(pool_size)]
+        self.surnames = [fake.last_name() for _ in range(pool_size)]
+        self.addresses = [fake.street_address() for _ in range(pool_size)]
+        cards = [fake.credit_card_number() for _ in range(pool_size)]
+        # Доля None в пуле карт задает долю клиентов без карты
+        without_card = round(pool_size * (1 - card_share) / card_share)
+        self.cards: List[Optional[str]] = cards + [None] * without_card
+        self.windows = self._windows(pool_size * 10)
+
+    def _windows(self, size: int) -> List[Tuple[str, str, Tuple[Row, ...]]]:
+        """Пул окон (время заезда, время выезда, итоги по часам) в пределах суток
+
+        Время уже в формате хранения DateTime в SQLite, чтобы строка
+        сессии собиралась сложением строк без объектов datetime. Итоги -
+        кортежи (час, заездов, выездов, секунд стоянки), как их считает
+        parking_app.stats.
+        """
+        rnd = self.rnd
+        windows = []
+        for hour in rnd.choices(range(24), weights=HOURLY_WEIGHTS, k=size):
+            start = hour * 3600 + rnd.randrange(3600)
+            # Медиана exp(8.9) ~ 2 часа, не меньше пяти минут
+            duration = max(300, int(rnd.lognormvariate(8.9, 0.9)))
+            # Выезд в тот же день: сессии клиента не пересекаются
+            finish = min(start + duration, DAY_SECONDS - 1)
+            windows.append(
+                (time_of_day(start), time_of_day(finish), hourly(start, finish))
+            )
+        return windows
+
+    def plate(self, index: int) -> str:
+        """Уникальный номер автомобиля для порядкового номера index"""
+        region, number = divmod(index, PLATES_PER_REGION)
+        letters, digits = divmod(number, 1000)
+        first, rest = divmod(letters, len(PLATE_LETTERS) ** 2)
+        second, third = divmod(rest, len(PLATE_LETTERS))
+        return (
+            f"{PLATE_LETTERS[first]}{digits:03d}{PLATE_LETTERS[second]}"
+            f"{PLATE_LETTERS[third]}{PLATE_REGIONS[region]}"
+        )
+
+    def clients(self, count: int, start: int = 0) -> Iterable[Row]:
+        """Строки клиентов с уникальными номерами автомобилей
+
+        Номера берутся из перестановки всего пространства номеров, поэтому
+        соседние клиенты получают непохожие номера. start - порядковый
+        номер первого клиента, чтобы повторные вызовы не давали дублей.
+        """
+        space = PLATES_PER_REGION * len(PLATE_REGIONS)
+        if start + count > space:
+            raise ValueError(f"Номеров автомобилей не больше {space}")
+        # Перестановка одна для всех seed: номера разных вызовов с разными
+        # start не пересекаются
+        rnd = Random(space)
+        step = rnd.randrange(space // 3, space)
+        while gcd(step, space) != 1:
+            step += 1
+        offset = rnd.randrange(space)
+        names = self.rnd.choices(self.names, k=count)
+        surnames = self.rnd.choices(self.surnames, k=count)
+        cards = self.rnd.choices(self.cards, k=count)
+        plate = self.plate
+        for index, name, surname, card in zip(
+            range(start, start + count), names, surnames, cards
+        ):
+            yield name, surname, card, plate((index * step + offset) % space)
+
+    def parkings(self, count: int) -> Iterable[Row]:
+        """Строки парковок, как у ParkingFactory: 90% открыты, 10-100 мест"""
+        rnd = self.rnd
+        for _ in range(count):
+            opened = rnd.random() < 0.9
+            places = rnd.randint(10, 100)
+            available = places if opened else 0
+            yield rnd.choice(self.addresses), opened, places, available
+
+    def sessions(
+        self,
+        client_ids: Iterable[int],
+        parking_ids: Sequence[int],
+        sessions_per_client: int = 10,
+        days: int = 365,
+        end: Optional[datetime] = None,
+        totals: Optional[HourlyTotals] = None,
+    ) -> Iterable[Row]:
+        """Закрытые сессии парковки: у клиента не больше одной в день
+
+        Если передан totals, в него прибавляются итоги часов выданных сессий.
+        """
+        rnd = self.rnd
+        sessions_per_client = min(sessions_per_client, days // 2)
+        first_day = (end or datetime.now()).date() - timedelta(days=days)
+        day_prefixes = [
+            f"{first_day + timedelta(days=day):%Y-%m-%d} " for day in range(days)
+        ]
+        day_range = range(days)
+        windows = self.windows
+        for client_id in client_ids:
+            count = rnd.randint(0, 2 * sessions_per_client)
+            for day, (start, finish, hours), parking_id in zip(
+                rnd.sample(day_range, count),
+                rnd.choices(windows, k=count),
+                rnd.choices(parking_ids, k=count),
+            ):
+                prefix = day_prefixes[day]
+                yield client_id, parking_id, prefix + start, prefix + finish
+                if totals is not None:
+                    for hour, entries, exits, seconds in hours:
+                        bucket = totals.setdefault(
+                            (parking_id, prefix, hour), [0, 0, 0]
+                        )
+                        bucket[0] += entries
+                        bucket[1] += exits
+                        bucket[2] += seconds
+
+
+def hourly(start: int, finish: int) -> Tuple[Row, ...]:
+    """Итоги часов сессии внутри суток: (час, заездов, выездов, секунд)"""
+    first, last = start // 3600, finish // 3600
+    rows = []
+    for hour in range(first, last + 1):
+        seconds = min((hour + 1) * 3600, finish) - max(hour * 3600, start)
+        rows.append((hour, int(hour == first), int(hour == last), seconds))
+    return tuple(rows)
+
+
+def stats_rows(totals: HourlyTotals) -> Iterable[Row]:
+    """Строки parking_hourly_stats из итогов, накопленных sessions"""
+    for (parking_id, prefix, hour), (entries, exits, seconds) in totals.items():
+        yield parking_id, f"{prefix}{hour:02d}:00:00.000000", entries, exits, seconds
+
+
+def time_of_day(seconds: int) -> str:
+    """Время суток в формате, в котором SQLAlchemy хранит DateTime в SQLite"""
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours:02d}:{rest // 60:02d}:{rest % 60:02d}.000000"
+
+
+def insert_rows(
+    model, columns: Sequence[str], rows: Iterable[Row], batch_size=BATCH_SIZE
+) -> int:
+    """Вставка кортежей порциями через executemany драйвера и один коммит
+
+    Обработка параметров SQLAlchemy (словари, преобразование DateTime)
+    стоит дороже самой вставки, поэтому строки уходят в sqlite3 как есть:
+    значения уже должны быть в формате хранения. Возвращает число строк.
+    """
+    table = model.__table__
+    statement = (
+        f"INSERT INTO {table.name} ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' for _ in columns)})"
+    )
+    connection = db.session.connection()
+    count = 0
+    batch: List[Row] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            connection.exec_driver_sql(statement, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        connection.exec_driver_sql(statement, batch)
+        count += len(batch)
+    db.session.commit()
+    return count
+
+
+def populate(
+    clients: int,
+    parkings: Optional[int] = None,
+    sessions_per_client: int = 10,
+    days: int = 365,
+    seed: int = 0,
+) -> Dict[str, int]:
+    """Наполнение текущей БД приложения, возвращает число строк по таблицам
+
+    Вызывается в контексте приложения. По умолчанию одна парковка на
+    тысячу клиентов. Идентификаторы новых строк продолжают существующие.
+    """
+    generator = DataGenerator(seed)
+    parkings = max(1, clients // 1000) if parkings is None else parkings
+
+    first_client = (db.session.query(db.func.max(Client.id)).scalar() or 0) + 1
+    first_parking = (db.session.query(db.func.max(Parking.id)).scalar() or 0) + 1
+    counts = {
+        "clients": insert_rows(
+            Client, CLIENT_COLUMNS, generator.clients(clients, first_client - 1)
+        ),
+        "parkings": insert_rows(Parking, PARKING_COLUMNS, generator.parkings(parkings)),
+    }
+    totals: HourlyTotals = {}
+    counts["client_parkings"] = insert_rows(
+        ClientParking,
+        SESSION_COLUMNS,
+        generator.sessions(
+            range(first_client, first_client + clients),
+            range(first_parking, first_parking + parkings),
+            sessions_per_client,
+            days,
+            totals=totals,
+        ),
+    )
+    counts["parking_hourly_stats"] = insert_rows(
+        models.ParkingHourlyStats, STATS_COLUMNS, stats_rows(totals)
+    )
+    bump_version("client")
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--clients", type=int, default=100000)
+    parser.add_argument("--parkings", type=int)
+    parser.add_argument("--sessions-per-client", type=int, default=10)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", default="high-throughput")
+    args = parser.parse_args()
+
+    # Фоновые задачи (очередь платежей, сверки) спорили бы с загрузкой за
+    # блокировку записи
+    app = create_app(
+        args.profile, {"SCHEMA_AUTO_MIGRATE": True, "START_BACKGROUND_JOBS": False}
+    )
+    with app.app_context():
+        started = time.perf_counter()
+        counts = populate(
+            args.clients,
+            args.parkings,
+            args.sessions_per_client,
+            args.days,
+            args.seed,
+        )
+        elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    for table, rows in counts.items():
+        print(f"{table:<16}{rows:>12}")
+    print(f"{total} строк за {elapsed:.1f} с ({total / elapsed:.0f} строк/с)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,43 @@
+"""Запуск приложения
+
+    python main.py [--workers 8] [--port 8000]  - многопроцессный сервер
+    python main.py --dev                        - сервер разработки Flask
+
+Профиль настроек - переменная окружения PARKING_PROFILE.
+"""
+
+import argparse
+import logging
+import os
+
 from parking_app.app import create_app
+from parking_app.server import serve
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, help="По умолчанию SERVER_WORKERS")
+    parser.add_argument(
+        "--max-requests", type=int, help="По умолчанию SERVER_MAX_REQUESTS"
+    )
+    parser.add_argument(
+        "--dev", action="store_true", help="Один процесс, отладчик и перезагрузка"
+    )
+    args = parser.parse_args()
+    profile = os.environ.get("PARKING_PROFILE", "default")
+
+    if args.dev:
+        create_app(profile).run(args.host, args.port, debug=True)
+        return
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s [%(process)d] %(message)s"
+    )
+    serve(profile, args.host, args.port, args.workers, args.max_requests)
 
-app = create_app()
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    main()
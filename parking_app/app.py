@@ -1,40 +1,210 @@
-from flask import Flask, jsonify, request
+from datetime import datetime, timedelta
+from typing import Any, Mapping, Optional, Union
+
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+
+from .config import PROFILES
+from .serializers import dumps
 
 db = SQLAlchemy()
 
+# Размер страницы по умолчанию и максимальный для постраничной выдачи
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Сколько строк за раз читается из БД при потоковой выдаче
+STREAM_CHUNK_SIZE = 1000
+
 
-def create_app():
+def create_app(
+    profile: Union[str, object] = "default",
+    config: Optional[Mapping[str, Any]] = None,
+):
+    """Создание приложения
+
+    profile - имя профиля из parking_app.config.PROFILES или объект
+    настроек (например, наследник Config); config - отдельные настройки
+    поверх профиля. Все настройки применяются до создания движка БД.
+    """
     app = Flask(__name__)
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///parking.db"
-    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-    db.init_app(app)
+    app.config.from_object(PROFILES.get(profile, profile))  # type: ignore
+    if config:
+        app.config.update(config)
 
-    from .models import Client, ClientParking, Parking
+    from .metrics import init_metrics, instrument_engine_options
 
-    # Заменяем before_first_request на контекст приложения
-    with app.app_context():
-        db.create_all()
+    if app.config["METRICS_ENABLED"]:
+        instrument_engine_options(app)
+    db.init_app(app)
+    configure_sqlite(app)
+    if app.config["METRICS_ENABLED"]:
+        init_metrics(app)
+
+    from . import availability
+    from .archive import init_archive, run_archive
+    from .availability import init_availability, reconcile_availability
+    from .client_import import import_clients, read_upload
+    from .idempotency import idempotent, init_idempotency, save_response
+    from .jobs import register_job, start_jobs
+    from .migrations import check_schema
+    from .models import Client, Parking, client_row_to_json
+    from .payments import init_payments
+    from .plates import init_plate_cache, resolve_client_id
+    from .search import match_expression, parse_cursor, search_clients
+    from .services import apply_parking_event, enter_parking, exit_parking
+    from .stats import init_stats, parking_stats, parse_datetime
+    from .tariffs import init_tariffs
+    from .versions import init_versions, versioned_response
+
+    init_plate_cache(app)
+    init_tariffs(app)
+    init_stats(app)
+    init_archive(app)
+    init_payments(app)
+    init_idempotency(app)
+    init_versions(app)
+
+    # Вместо db.create_all() - только проверка версии схемы
+    check_schema(app)
+
+    init_availability(app)
+    register_job(
+        app,
+        "reconcile-availability",
+        app.config["AVAILABILITY_RECONCILE_INTERVAL"],
+        reconcile_availability,
+    )
+    register_job(app, "archive-sessions", app.config["ARCHIVE_INTERVAL"], run_archive)
+    if app.config["START_BACKGROUND_JOBS"]:
+        start_jobs(app)
 
     @app.teardown_appcontext
     def shutdown_session(exception=None):
         db.session.remove()
 
+    @app.route("/metrics", methods=["GET"])
+    def metrics_handler():
+        """Метрики запросов этого процесса в текстовом формате Prometheus"""
+        if not app.config["METRICS_ENABLED"]:
+            return jsonify({"error": "Метрики отключены"}), 404
+        return Response(
+            app.extensions["metrics"].render(),
+            mimetype="text/plain; version=0.0.4; charset=utf-8",
+        )
+
     # Роуты для клиентов
     @app.route("/clients", methods=["GET"])
     def get_clients_handler():
-        """Получение списка всех клиентов"""
-        clients = db.session.query(Client).all()
-        clients_list = [client.to_json() for client in clients]
-        return jsonify(clients_list), 200
+        """Получение списка клиентов
+
+        after_id и limit включают постраничную выдачу по возрастанию id:
+        курсор следующей страницы возвращается в заголовке X-Next-After-Id.
+        stream=1 отдает JSON-массив потоком, читая строки из БД порциями.
+        Ответ без stream кэшируется по версии таблицы client.
+        """
+        after_id = request.args.get("after_id", type=int)
+        limit = request.args.get("limit", type=int)
+        stream = request.args.get("stream", "").lower() in ("1", "true")
+
+        if limit is not None and limit <= 0:
+            return jsonify({"error": "limit должен быть положительным"}), 400
+        if after_id is not None and limit is None:
+            limit = DEFAULT_PAGE_SIZE
+        if limit is not None:
+            limit = min(limit, MAX_PAGE_SIZE)
+
+        # Строки читаются Core-запросом и сериализуются без создания объектов ORM
+        query = select(*Client.__table__.columns).order_by(Client.id)
+        if after_id is not None:
+            query = query.where(Client.id > after_id)
+
+        if stream:
+            if limit is not None:
+                query = query.limit(limit)
+            query = query.execution_options(yield_per=STREAM_CHUNK_SIZE)
+
+            def generate():
+                # Каждая порция строк из БД уходит клиенту одним куском
+                yield "["
+                separator = ""
+                for chunk in db.session.execute(query).partitions():
+                    yield separator + ",".join(
+                        dumps(client_row_to_json(row)) for row in chunk
+                    )
+                    separator = ","
+                yield "]"
+
+            return Response(
+                stream_with_context(generate()), mimetype="application/json"
+            )
+
+        def build():
+            if limit is None:
+                rows = db.session.execute(query).all()
+                return json_response([client_row_to_json(row) for row in rows])
+
+            # Читаем на одну строку больше, чтобы понять, есть ли следующая страница
+            rows = db.session.execute(query.limit(limit + 1)).all()
+            response = json_response([client_row_to_json(row) for row in rows[:limit]])
+            if len(rows) > limit:
+                response.headers["X-Next-After-Id"] = str(rows[limit - 1].id)
+            return response
+
+        return versioned_response("client", ("clients", after_id, limit), build)
+
+    @app.route("/clients/search", methods=["GET"])
+    def search_clients_handler():
+        """Поиск клиентов по началу слов имени, фамилии и номера автомобиля
+
+        q - строка поиска, результаты по убыванию релевантности страницами
+        по limit; курсор следующей страницы возвращается в заголовке
+        X-Next-Cursor и передается параметром cursor. Заголовок
+        X-Search-Truncated: 1 - совпадений больше SEARCH_RANK_WINDOW и
+        ранжирована только их часть, запрос нужно уточнить. Ответ
+        кэшируется по версии таблицы client.
+        """
+        expression = match_expression(request.args.get("q", ""))
+        limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+        cursor = request.args.get("cursor")
+
+        if expression is None:
+            return jsonify({"error": "q должен содержать хотя бы одно слово"}), 400
+        if limit <= 0:
+            return jsonify({"error": "limit должен быть положительным"}), 400
+        limit = min(limit, MAX_PAGE_SIZE)
+        try:
+            after = parse_cursor(cursor) if cursor else None
+        except ValueError:
+            return jsonify({"error": "Некорректный cursor"}), 400
+
+        def build():
+            rows, next_cursor, truncated = search_clients(
+                expression, limit, app.config["SEARCH_RANK_WINDOW"], after
+            )
+            response = json_response([client_row_to_json(row) for row in rows])
+            if next_cursor is not None:
+                response.headers["X-Next-Cursor"] = next_cursor
+            if truncated:
+                response.headers["X-Search-Truncated"] = "1"
+            return response
+
+        return versioned_response(
+            "client", ("search", expression, cursor, limit), build
+        )
 
     @app.route("/clients/<int:client_id>", methods=["GET"])
     def get_client_handler(client_id: int):
-        """Получение информации о клиенте по ID"""
-        client = db.session.get(Client, client_id)
-        if not client:
-            return jsonify({"error": "Клиент не найден"}), 404
-        return jsonify(client.to_json()), 200
+        """Получение информации о клиенте по ID, с кэшем по версии таблицы"""
+
+        def build():
+            client = db.session.get(Client, client_id)
+            if not client:
+                return jsonify({"error": "Клиент не найден"}), 404
+            return jsonify(client.to_json()), 200
+
+        return versioned_response("client", ("client", client_id), build)
 
     @app.route("/clients", methods=["POST"])
     def create_client_handler():
@@ -60,10 +230,37 @@ def create_app():
         )
 
         db.session.add(new_client)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return (
+                jsonify({"error": "Клиент с таким номером автомобиля уже существует"}),
+                409,
+            )
 
         return jsonify(new_client.to_json()), 201
 
+    @app.route("/clients/import", methods=["POST"])
+    def import_clients_handler():
+        """Загрузка клиентов из CSV или NDJSON, см. parking_app.client_import
+
+        Тело читается потоком и вставляется порциями. Ответ - отчет с
+        числом загруженных клиентов и ошибками по номерам строк; 400, если
+        файл пришлось перестать читать (загруженное до этого остается).
+        """
+        lines = read_upload(request.stream, request.mimetype)
+        if lines is None:
+            return (
+                jsonify({"error": "Ожидается text/csv или application/x-ndjson"}),
+                415,
+            )
+
+        report = import_clients(
+            lines, app.config["IMPORT_BATCH_SIZE"], app.config["IMPORT_MAX_ERRORS"]
+        )
+        return jsonify(report), 400 if "error" in report else 200
+
     # Роуты для парковок
     @app.route("/parkings", methods=["POST"])
     def create_parking_handler():
@@ -93,8 +290,66 @@ def create_app():
 
         return jsonify(new_parking.to_json()), 201
 
+    @app.route("/parkings/<int:parking_id>/availability", methods=["GET"])
+    def get_parking_availability_handler(parking_id: int):
+        """Число свободных мест на парковке из общих счетчиков, без запроса к БД"""
+        available = availability.parking_availability(parking_id)
+        if available is None:
+            return jsonify({"error": "Парковка не найдена"}), 404
+        return (
+            jsonify({"parking_id": parking_id, "count_available_places": available}),
+            200,
+        )
+
+    @app.route("/parkings/<int:parking_id>/stats", methods=["GET"])
+    def get_parking_stats_handler(parking_id: int):
+        """Почасовые заезды, выезды и загрузка парковки за [from, to)
+
+        По умолчанию - последние сутки. Ответ строится из почасовых итогов,
+        а не из истории сессий.
+        """
+        try:
+            end = parse_datetime(request.args.get("to")) or datetime.now()
+            start = parse_datetime(request.args.get("from")) or end - timedelta(days=1)
+        except ValueError:
+            return jsonify({"error": "from и to - дата и время в ISO 8601"}), 400
+
+        if start >= end:
+            return jsonify({"error": "from должен быть раньше to"}), 400
+        if end - start > timedelta(hours=app.config["STATS_MAX_HOURS"]):
+            return (
+                jsonify(
+                    {
+                        "error": "Интервал больше "
+                        f"{app.config['STATS_MAX_HOURS']} часов"
+                    }
+                ),
+                400,
+            )
+
+        stats = parking_stats(parking_id, start, end)
+        if stats is None:
+            return jsonify({"error": "Парковка не найдена"}), 404
+        return jsonify(stats), 200
+
+    @app.route("/parkings/<int:parking_id>/events", methods=["GET"])
+    def parking_events_handler(parking_id: int):
+        """Поток Server-Sent Events с числом свободных мест на парковке"""
+        available = availability.parking_availability(parking_id)
+        if available is None:
+            return jsonify({"error": "Парковка не найдена"}), 404
+        stream = app.extensions["availability_hub"].subscribe(
+            parking_id, available, keepalive=app.config["SSE_KEEPALIVE"]
+        )
+        return Response(
+            stream,
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
     # Роуты для работы с парковкой клиентов
     @app.route("/client_parkings", methods=["POST"])
+    @idempotent
     def enter_parking_handler():
         """Заезд на парковку"""
         if request.is_json:
@@ -108,59 +363,10 @@ def create_app():
         if not client_id or not parking_id:
             return jsonify({"error": "client_id и parking_id обязательны"}), 400
 
-        # Проверяем существование клиента и парковки
-        client = db.session.get(Client, client_id)
-        parking = db.session.get(Parking, parking_id)
-
-        if not client:
-            return jsonify({"error": "Клиент не найден"}), 404
-        if not parking:
-            return jsonify({"error": "Парковка не найдена"}), 404
-
-        # Проверяем, открыта ли парковка
-        if not parking.opened:
-            return jsonify({"error": "Парковка закрыта"}), 400
-
-        # Проверяем наличие свободных мест
-        if parking.count_available_places <= 0:
-            return jsonify({"error": "Нет свободных мест на парковке"}), 400
-
-        # Проверяем, не находится ли клиент уже на парковке
-        active_parking = (
-            db.session.query(ClientParking)
-            .filter(
-                ClientParking.client_id == client_id, ClientParking.time_out.is_(None)
-            )
-            .first()
-        )
-
-        if active_parking:
-            return jsonify({"error": "Клиент уже находится на парковке"}), 400
-
-        # Создаем запись о заезде
-        from datetime import datetime
-
-        new_client_parking = ClientParking(
-            client_id=client_id, parking_id=parking_id, time_in=datetime.now()
-        )
-
-        # Уменьшаем количество свободных мест
-        parking.count_available_places -= 1
-
-        db.session.add(new_client_parking)
-        db.session.commit()
-
-        return (
-            jsonify(
-                {
-                    "message": "Успешный заезд на парковку",
-                    "client_parking": new_client_parking.to_json(),
-                }
-            ),
-            201,
-        )
+        return commit_result(enter_parking(client_id, parking_id))
 
     @app.route("/client_parkings", methods=["DELETE"])
+    @idempotent
     def exit_parking_handler():
         """Выезд с парковки"""
         if request.is_json:
@@ -174,51 +380,133 @@ def create_app():
         if not client_id or not parking_id:
             return jsonify({"error": "client_id и parking_id обязательны"}), 400
 
-        # Находим активную запись о парковке
-        client_parking = (
-            db.session.query(ClientParking)
-            .filter(
-                ClientParking.client_id == client_id,
-                ClientParking.parking_id == parking_id,
-                ClientParking.time_out.is_(None),
+        return commit_result(exit_parking(client_id, parking_id))
+
+    @app.route("/client_parkings/by_plate", methods=["POST"])
+    @idempotent
+    def enter_parking_by_plate_handler():
+        """Заезд на парковку по номеру автомобиля"""
+        client_id, parking_id, error = parse_plate_request()
+        if error:
+            return error
+        return commit_result(enter_parking(client_id, parking_id, check_client=False))
+
+    @app.route("/client_parkings/by_plate", methods=["DELETE"])
+    @idempotent
+    def exit_parking_by_plate_handler():
+        """Выезд с парковки по номеру автомобиля"""
+        client_id, parking_id, error = parse_plate_request()
+        if error:
+            return error
+        return commit_result(exit_parking(client_id, parking_id))
+
+    @app.route("/client_parkings/batch", methods=["POST"])
+    @idempotent
+    def batch_parking_handler():
+        """Пакетная обработка событий камер
+
+        События применяются по порядку в одной транзакции с одним коммитом.
+        Отказ по событию не отменяет остальные: результат каждого события
+        возвращается в массиве results с его HTTP-статусом.
+        """
+        data = request.get_json(silent=True)
+        events = data.get("events") if isinstance(data, dict) else data
+
+        if not isinstance(events, list):
+            return jsonify({"error": "Ожидается JSON со списком events"}), 400
+        if len(events) > app.config["BATCH_MAX_EVENTS"]:
+            return (
+                jsonify(
+                    {
+                        "error": "Слишком много событий в пакете, максимум "
+                        f"{app.config['BATCH_MAX_EVENTS']}"
+                    }
+                ),
+                413,
             )
-            .first()
-        )
 
-        if not client_parking:
-            return jsonify({"error": "Активная запись о парковке не найдена"}), 404
+        results = []
+        for index, parking_event in enumerate(events):
+            payload, status = apply_parking_event(parking_event)
+            results.append({"index": index, "status": status, **payload})
+
+        return commit_result(({"results": results}, 200))
 
-        # Проверяем, есть ли у клиента привязанная карта
-        client = db.session.get(Client, client_id)
-        if not client.credit_card:
-            return jsonify({"error": "У клиента не привязана карта для оплаты"}), 400
+    def parse_plate_request():
+        """Разбор запроса камеры: id клиента, id парковки и ответ с ошибкой"""
+        if request.is_json:
+            data = request.get_json()
+            car_number = data.get("car_number")
+            parking_id = data.get("parking_id")
+        else:
+            car_number = request.form.get("car_number", type=str)
+            parking_id = request.form.get("parking_id", type=int)
 
-        # Обновляем запись о парковке
-        from datetime import datetime
+        if not car_number or not parking_id:
+            error = jsonify({"error": "car_number и parking_id обязательны"}), 400
+            return None, None, error
+
+        client_id = resolve_client_id(car_number)
+        if client_id is None:
+            return None, None, (jsonify({"error": "Клиент не найден"}), 404)
+        return client_id, parking_id, None
+
+    def commit_result(result):
+        """Фиксация успешной операции с парковкой или откат неуспешной
+
+        Ответ успешной операции сохраняется под Idempotency-Key запроса в
+        той же транзакции.
+        """
+        payload, status = result
+        response = jsonify(payload)
+        response.status_code = status
+        if status >= 400:
+            db.session.rollback()
+            return response
+        replayed = save_response(response)
+        if replayed is not None:
+            # Тот же ключ уже выполнил параллельный запрос
+            db.session.rollback()
+            return replayed
+        db.session.commit()
+        return response
 
-        client_parking.time_out = datetime.now()
+    return app
 
-        # Увеличиваем количество свободных мест
-        parking = db.session.get(Parking, parking_id)
-        parking.count_available_places += 1
 
-        # Рассчитываем время парковки и стоимость (простая логика)
-        parking_time = client_parking.time_out - client_parking.time_in
-        parking_hours = parking_time.total_seconds() / 3600
-        cost = max(1, round(parking_hours * 50))
+def json_response(value, status: int = 200) -> Response:
+    """Ответ с JSON, уже приведенным сериализаторами к простым типам"""
+    return Response(dumps(value), status=status, mimetype="application/json")
 
-        db.session.commit()
 
-        return (
-            jsonify(
-                {
-                    "message": "Успешный выезд с парковки",
-                    "parking_time_hours": round(parking_hours, 2),
-                    "cost": cost,
-                    "client_parking": client_parking.to_json(),
-                }
-            ),
-            200,
-        )
+def configure_sqlite(app: Flask) -> None:
+    """Настройка соединений SQLite движка приложения
 
-    return app
+    На каждом новом соединении выполняются SQLITE_PRAGMAS. Для базы в
+    памяти транзакцию начинает SQLAlchemy, а не pysqlite: драйвер сам
+    открывает транзакцию только перед записью, и SAVEPOINT в ней не
+    работают. Для файловой базы поведение драйвера остается прежним:
+    чтение вне транзакции не держит блокировку.
+    """
+    pragmas = app.config["SQLITE_PRAGMAS"]
+    with app.app_context():
+        engine = db.engine
+    in_memory = engine.url.database in (None, "", ":memory:")
+    if not pragmas and not in_memory:
+        return
+
+    def on_connect(dbapi_connection, connection_record):
+        if in_memory:
+            # Драйвер не начинает и не завершает транзакции сам
+            dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    def on_begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+    event.listen(engine, "connect", on_connect)
+    if in_memory:
+        event.listen(engine, "begin", on_begin)
@@ -0,0 +1,117 @@
+"""Перенос закрытых сессий из client_parking в client_parking_history
+
+Заезд и выезд ищут только активные сессии (time_out IS NULL), а закрытые
+копятся в client_parking вместе с ее индексами. Архиватор переносит
+закрытые сессии старше ARCHIVE_AFTER_DAYS дней порциями: каждая порция -
+INSERT ... SELECT и DELETE в одной короткой транзакции, поэтому заезды и
+выезды других воркеров ждут не дольше одной порции.
+
+История (пересчет стоимости, итоги загрузки) читает обе таблицы через
+all_sessions().
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, cast
+
+import click
+from flask import Flask, current_app
+from flask.cli import with_appcontext
+from sqlalchemy import CursorResult, delete, insert, select, union_all
+
+from .app import db
+from .models import ClientParking, ClientParkingHistory
+
+logger = logging.getLogger(__name__)
+
+SESSION_COLUMNS = ("id", "client_id", "parking_id", "time_in", "time_out")
+
+
+def init_archive(app: Flask) -> None:
+    """Регистрация команды flask archive-sessions"""
+    app.cli.add_command(archive_sessions_command)
+
+
+def all_sessions():
+    """Подзапрос со всеми сессиями: активные и недавние вместе с архивом
+
+    Условия на его колонки SQLite переносит внутрь обеих частей UNION ALL,
+    поэтому индексы таблиц используются как при чтении одной таблицы.
+    """
+    return union_all(
+        select(*(ClientParking.__table__.c[name] for name in SESSION_COLUMNS)),
+        select(*(ClientParkingHistory.__table__.c[name] for name in SESSION_COLUMNS)),
+    ).subquery("sessions")
+
+
+def archive_sessions(
+    older_than: Optional[timedelta] = None,
+    chunk_size: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> int:
+    """Перенос закрытых до now - older_than сессий в архив, возвращает их число
+
+    Порция - первые chunk_size подходящих сессий по индексу time_out (и
+    сессии с тем же временем выезда, что у последней из них). Перенесенные
+    строки удаляются, поэтому каждая порция снова читает начало индекса, а
+    не обходит таблицу. id архивных сессий повторно не выдаются: у
+    client_parking AUTOINCREMENT.
+    """
+    config = current_app.config
+    if older_than is None:
+        older_than = timedelta(days=config["ARCHIVE_AFTER_DAYS"])
+    if chunk_size is None:
+        chunk_size = config["ARCHIVE_CHUNK_SIZE"]
+    cutoff = (now or datetime.now()) - older_than
+
+    columns = [ClientParking.__table__.c[name] for name in SESSION_COLUMNS]
+    archived = 0
+    while True:
+        closed = [ClientParking.time_out < cutoff]
+        bound = db.session.scalar(
+            select(ClientParking.time_out)
+            .where(*closed)
+            .order_by(ClientParking.time_out)
+            .offset(chunk_size - 1)
+            .limit(1)
+        )
+        if bound is not None:
+            closed.append(ClientParking.time_out <= bound)
+
+        result = db.session.execute(
+            insert(ClientParkingHistory).from_select(
+                list(SESSION_COLUMNS), select(*columns).where(*closed)
+            )
+        )
+        moved = cast(CursorResult, result).rowcount
+        if moved:
+            db.session.execute(delete(ClientParking).where(*closed))
+        db.session.commit()
+
+        archived += moved
+        if bound is None:
+            return archived
+
+
+def run_archive() -> None:
+    """Периодическая задача: перенос по настройкам приложения"""
+    archived = archive_sessions()
+    if archived:
+        logger.info("В архив перенесено сессий: %s", archived)
+
+
+@click.command("archive-sessions")
+@with_appcontext
+@click.option(
+    "--older-than-days",
+    type=float,
+    help="Возраст закрытых сессий, дней (по умолчанию ARCHIVE_AFTER_DAYS)",
+)
+@click.option("--chunk-size", type=int, help="Сессий в одной транзакции")
+def archive_sessions_command(
+    older_than_days: Optional[float], chunk_size: Optional[int]
+) -> None:
+    """Перенос старых закрытых сессий в архив"""
+    older_than = None if older_than_days is None else timedelta(older_than_days)
+    archived = archive_sessions(older_than, chunk_size)
+    click.echo(f"Перенесено сессий: {archived}")
@@ -0,0 +1,222 @@
+import ctypes
+import multiprocessing
+from typing import Callable, Dict, Optional, Tuple
+
+from flask import Flask, current_app, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, false, select, update
+from sqlalchemy.orm import object_session
+
+from .app import db
+from .events import AvailabilityHub
+from .models import Parking
+
+
+class AvailabilitySlot(ctypes.Structure):
+    """Счетчик одной парковки: известен ли, число мест и отметка записи"""
+
+    _fields_ = [
+        ("known", ctypes.c_bool),
+        ("count", ctypes.c_longlong),
+        ("stamp", ctypes.c_longlong),
+    ]
+
+
+class AvailabilityCounters:
+    """Число свободных мест по парковкам в разделяемой памяти
+
+    Счетчики лежат в multiprocessing.RawArray по id парковки и, как версии
+    таблиц, общие для процессов, запущенных fork после создания
+    приложения. Чтение - обращение к массиву без блокировок и без запроса
+    к БД. Парковки с id не меньше capacity в массив не попадают.
+
+    Значение записывается с отметкой из общего счетчика. Писатель берет ее,
+    пока держит блокировку записи БД, поэтому отметки идут в порядке
+    коммитов. Значение применяется, только если его отметка не старше
+    записанной: коммиты, чьи after_commit выполнились не по порядку, не
+    возвращают старое число мест. О каждом изменении значения сообщается в
+    on_change, а changes растет, чтобы изменения заметили другие процессы.
+    """
+
+    def __init__(
+        self, capacity: int, on_change: Optional[Callable[[int, int], None]] = None
+    ):
+        self.capacity = capacity
+        self._slots = multiprocessing.RawArray(AvailabilitySlot, capacity)
+        self._stamp = multiprocessing.RawValue(ctypes.c_longlong, 0)
+        self._changes = multiprocessing.RawValue(ctypes.c_longlong, 0)
+        # Наибольший записанный id + 1: сверка не обходит пустой хвост массива
+        self._size = multiprocessing.RawValue(ctypes.c_longlong, 0)
+        self._lock = multiprocessing.Lock()
+        self._on_change = on_change
+
+    @property
+    def changes(self) -> int:
+        return self._changes.value
+
+    def get(self, parking_id: int) -> Optional[int]:
+        if 0 <= parking_id < self.capacity:
+            slot = self._slots[parking_id]
+            if slot.known:
+                return slot.count
+        return None
+
+    def next_stamp(self) -> int:
+        with self._lock:
+            self._stamp.value += 1
+            return self._stamp.value
+
+    def update(self, counts: Dict[int, Tuple[int, int]]) -> None:
+        """Применение значений {id парковки: (число мест, отметка)}"""
+        with self._lock:
+            changed = {
+                parking_id: count
+                for parking_id, (count, stamp) in counts.items()
+                if self._store(parking_id, count, stamp)
+            }
+        self._notify(changed)
+
+    def fill(self, parking_id: int, count: int) -> None:
+        """Значение, прочитанное из БД при промахе: только в пустой счетчик"""
+        if not 0 <= parking_id < self.capacity:
+            return
+        with self._lock:
+            slot = self._slots[parking_id]
+            if not slot.known:
+                self._store(parking_id, count, slot.stamp)
+
+    def replace(self, counts: Dict[int, int], stamp: int) -> None:
+        """Сверка: число мест всех парковок, прочитанное с отметкой stamp
+
+        Парковки, которых нет в counts, становятся неизвестными.
+        """
+        changed = {}
+        with self._lock:
+            size = max(self._size.value, max(counts, default=-1) + 1)
+            for parking_id in range(min(size, self.capacity)):
+                count = counts.get(parking_id)
+                if count is None:
+                    slot = self._slots[parking_id]
+                    if slot.stamp <= stamp:
+                        slot.known = False
+                        slot.stamp = stamp
+                elif self._store(parking_id, count, stamp):
+                    changed[parking_id] = count
+        self._notify(changed)
+
+    def _store(self, parking_id: int, count: int, stamp: int) -> bool:
+        """Запись под блокировкой; True - значение изменилось"""
+        if not 0 <= parking_id < self.capacity:
+            return False
+        slot = self._slots[parking_id]
+        if slot.stamp > stamp:
+            return False
+        slot.stamp = stamp
+        if slot.known and slot.count == count:
+            return False
+        slot.count = count
+        slot.known = True
+        self._size.value = max(self._size.value, parking_id + 1)
+        self._changes.value += 1
+        return True
+
+    def _notify(self, changed: Dict[int, int]) -> None:
+        if self._on_change is not None:
+            for parking_id, count in changed.items():
+                self._on_change(parking_id, count)
+
+
+def init_availability(app: Flask) -> None:
+    """Создание счетчиков и рассылки изменений, загрузка счетчиков из БД
+
+    Вызывается до запуска воркеров: счетчики общие для них, а рассылка
+    каждого воркера опрашивает счетчики, чтобы подписчики SSE узнавали о
+    заездах и выездах через другие воркеры.
+    """
+    hub = AvailabilityHub()
+    counters = AvailabilityCounters(
+        app.config["AVAILABILITY_MAX_PARKINGS"], on_change=hub.publish
+    )
+    hub.watch(counters, app.config["SSE_POLL_INTERVAL"])
+    app.extensions["availability_hub"] = hub
+    app.extensions["availability"] = counters
+    with app.app_context():
+        reconcile_availability()
+        db.session.remove()
+
+
+def reconcile_availability() -> None:
+    """Сверка счетчиков с таблицей parking
+
+    Исправляет расхождения после падения процесса и записи в обход ORM.
+    Пустой UPDATE берет блокировку записи на время чтения: пока сверка
+    читает таблицу, ни одно изменение числа мест не ждет коммита, и
+    отметка сверки встает в общий порядок записей.
+    """
+    counters = current_app.extensions["availability"]
+    db.session.execute(
+        update(Parking)
+        .where(false())
+        .values(count_available_places=Parking.count_available_places)
+        .execution_options(synchronize_session=False)
+    )
+    stamp = counters.next_stamp()
+    rows = db.session.execute(select(Parking.id, Parking.count_available_places))
+    counts = dict(rows.tuples().all())
+    db.session.commit()
+    counters.replace(counts, stamp)
+
+
+def parking_availability(parking_id: int) -> Optional[int]:
+    """Число свободных мест из счетчиков; при промахе - из БД
+
+    Прочитанное из БД значение заполняет счетчик. None - парковки нет.
+    """
+    counters = current_app.extensions["availability"]
+    available = counters.get(parking_id)
+    if available is None:
+        available = db.session.scalar(
+            select(Parking.count_available_places).where(Parking.id == parking_id)
+        )
+        if available is not None:
+            counters.fill(parking_id, available)
+    return available
+
+
+def track_availability(parking_id: int, count: int, session=None) -> None:
+    """Запоминание нового числа мест до коммита транзакции
+
+    Вызывается после записи строки парковки, пока транзакция держит
+    блокировку записи БД: отметка значения соответствует порядку коммитов.
+    """
+    if not has_app_context():
+        return
+    counters = current_app.extensions.get("availability")
+    if counters is None:
+        return
+    session = session if session is not None else db.session()
+    pending = session.info.setdefault("availability", {})
+    pending[parking_id] = count, counters.next_stamp()
+
+
+@event.listens_for(Parking, "after_insert")
+@event.listens_for(Parking, "after_update")
+def track_parking_write(mapper, connection, target):
+    """Изменения парковок через ORM попадают в счетчики после коммита"""
+    session = object_session(target)
+    if session is not None:
+        track_availability(target.id, target.count_available_places, session)
+
+
+@event.listens_for(Session, "after_commit")
+def apply_availability(session):
+    counts = session.info.pop("availability", None)
+    if counts and has_app_context():
+        counters = current_app.extensions.get("availability")
+        if counters is not None:
+            counters.update(counts)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def discard_availability(session, previous_transaction):
+    session.info.pop("availability", None)
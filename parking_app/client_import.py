@@ -0,0 +1,230 @@
+"""Загрузка клиентов из файла: POST /clients/import
+
+Тело запроса читается построчно по мере поступления и целиком не
+хранится. Форматы:
+
+- text/csv - первая строка - заголовок из колонок name, surname,
+  credit_card, car_number (обязательны name и surname), пустое значение -
+  отсутствующее;
+- application/x-ndjson - по объекту JSON с теми же полями на строке.
+
+Строка проверяется так же, как в POST /clients: имя и фамилия
+обязательны. Строки вставляются порциями по IMPORT_BATCH_SIZE одним
+executemany, каждая порция в своей транзакции: блокировка записи SQLite не
+держится, пока клиент выгружает файл, а ошибка в середине файла не
+отменяет уже загруженное. Номер автомобиля уникален: занятые номера порции
+ищутся одним запросом перед вставкой, такие строки попадают в ошибки.
+
+Память не зависит от размера файла: в ней одна порция строк и не больше
+IMPORT_MAX_ERRORS ошибок, остальные ошибки только считаются.
+"""
+
+import csv
+import io
+import json
+from typing import IO, Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from .app import db
+from .models import Client
+from .versions import bump_version
+
+IMPORT_COLUMNS = ("name", "surname", "credit_card", "car_number")
+REQUIRED_COLUMNS = ("name", "surname")
+# Наибольшая длина строки файла в байтах вместе с переводом строки.
+# Длинная строка NDJSON пропускается с ошибкой, на длинной строке CSV
+# чтение прекращается: кавычки не дают надежно найти следующую запись
+MAX_LINE_LENGTH = 64 * 1024
+# Повторы вставки порции, если номер заняли между проверкой и вставкой
+INSERT_ATTEMPTS = 3
+
+DUPLICATE_PLATE = "Клиент с таким номером автомобиля уже существует"
+
+Record = Dict[str, Optional[str]]
+# Номер строки файла и запись клиента или текст ошибки
+Line = Tuple[int, Union[Record, str]]
+
+
+class ImportFormatError(ValueError):
+    """Файл нельзя читать дальше: неверный заголовок CSV или кодировка"""
+
+
+def validate_record(data: Dict[str, Any]) -> Union[Record, str]:
+    """Запись клиента из полей строки или текст ошибки"""
+    unknown = sorted(data.keys() - set(IMPORT_COLUMNS))
+    if unknown:
+        return f"Неизвестные поля: {', '.join(unknown)}"
+    if any(not isinstance(value, (str, type(None))) for value in data.values()):
+        return "Значения полей должны быть строками"
+    record = {column: data.get(column) or None for column in IMPORT_COLUMNS}
+    if not record["name"] or not record["surname"]:
+        return "Имя и фамилия обязательны"
+    return record
+
+
+def text_lines(stream: IO[bytes]) -> Iterator[str]:
+    """Строки UTF-8 не длиннее MAX_LINE_LENGTH байт
+
+    Строки декодируются по одной, поэтому ошибка кодировки относится к
+    своей строке, а все строки до нее уже прочитаны.
+    """
+    first = True
+    while True:
+        line = stream.readline(MAX_LINE_LENGTH)
+        if not line:
+            return
+        if len(line) == MAX_LINE_LENGTH and not line.endswith(b"\n"):
+            raise csv.Error(f"строка длиннее {MAX_LINE_LENGTH} байт")
+        yield line.decode("utf-8-sig" if first else "utf-8")
+        first = False
+
+
+def read_csv(stream: IO[bytes]) -> Iterator[Line]:
+    """Строки CSV с заголовком; номер строки - последняя строка записи"""
+    reader = csv.reader(text_lines(stream))
+    try:
+        header = [column.strip() for column in next(reader, [])]
+        missing = [column for column in REQUIRED_COLUMNS if column not in header]
+        unknown = sorted(set(header) - set(IMPORT_COLUMNS))
+        if missing or unknown or len(set(header)) != len(header):
+            raise ImportFormatError(
+                f"Заголовок CSV: колонки из {', '.join(IMPORT_COLUMNS)}, "
+                f"обязательны {', '.join(REQUIRED_COLUMNS)}, без повторов"
+            )
+        for values in reader:
+            if not any(values):
+                continue
+            if len(values) > len(header):
+                yield reader.line_num, "Значений больше, чем колонок в заголовке"
+                continue
+            yield reader.line_num, validate_record(dict(zip(header, values)))
+    except (csv.Error, UnicodeDecodeError) as error:
+        raise ImportFormatError(f"Строка {reader.line_num + 1}: {error}") from error
+
+
+def read_ndjson(stream: IO[bytes]) -> Iterator[Line]:
+    """Строки NDJSON; пустые строки пропускаются"""
+    line_number = 0
+    while True:
+        line = stream.readline(MAX_LINE_LENGTH)
+        if not line:
+            return
+        line_number += 1
+        if len(line) == MAX_LINE_LENGTH and not line.endswith(b"\n"):
+            # Остаток длинной строки читается и отбрасывается по частям
+            while line and not line.endswith(b"\n"):
+                line = stream.readline(MAX_LINE_LENGTH)
+            yield line_number, f"Строка длиннее {MAX_LINE_LENGTH} байт"
+            continue
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield line_number, "Некорректный JSON"
+            continue
+        if not isinstance(data, dict):
+            yield line_number, "Ожидается объект JSON"
+            continue
+        yield line_number, validate_record(data)
+
+
+# Чтение тела запроса по его Content-Type
+READERS = {
+    "text/csv": read_csv,
+    "application/x-ndjson": read_ndjson,
+}
+
+
+def read_upload(stream: IO[bytes], mimetype: str) -> Optional[Iterator[Line]]:
+    """Строки тела запроса; None - формат не поддерживается"""
+    reader = READERS.get(mimetype)
+    if reader is None:
+        return None
+    # Поток WSGI читает по байту в readline без буфера
+    return reader(io.BufferedReader(stream))  # type: ignore
+
+
+def insert_batch(batch: List[Tuple[int, Record]]) -> Tuple[int, List[int]]:
+    """Вставка порции без строк с занятыми номерами
+
+    Возвращает число вставленных строк и номера строк с занятым номером.
+    """
+    plates = [record["car_number"] for _, record in batch if record["car_number"]]
+    for attempt in range(INSERT_ATTEMPTS):
+        taken: Set[Optional[str]] = set()
+        if plates:
+            taken.update(
+                db.session.scalars(
+                    select(Client.car_number).where(Client.car_number.in_(plates))
+                )
+            )
+        rows = [record for _, record in batch if record["car_number"] not in taken]
+        try:
+            if rows:
+                db.session.execute(insert(Client.__table__), rows)
+            db.session.commit()
+            break
+        except IntegrityError:
+            # Номер занял параллельный запрос между проверкой и вставкой
+            db.session.rollback()
+            if attempt == INSERT_ATTEMPTS - 1:
+                raise
+
+    if rows:
+        # Вставка в обход ORM: кэши ответов по версии таблицы сбрасываются явно
+        bump_version("client")
+    return len(rows), [line for line, record in batch if record["car_number"] in taken]
+
+
+def import_clients(
+    lines: Iterator[Line], batch_size: int, max_errors: int
+) -> Dict[str, Any]:
+    """Загрузка строк файла порциями, возвращает отчет
+
+    Отчет: imported - вставлено клиентов, failed - строк с ошибкой, errors -
+    первые max_errors ошибок по номерам строк. Если файл нельзя читать
+    дальше, загруженное до этого места остается, а в отчете есть error.
+    """
+    report: Dict[str, Any] = {"imported": 0, "failed": 0, "errors": []}
+
+    def fail(line: int, error: str) -> None:
+        report["failed"] += 1
+        if len(report["errors"]) < max_errors:
+            report["errors"].append({"line": line, "error": error})
+
+    batch: List[Tuple[int, Record]] = []
+    # Номера текущей порции: повтор внутри нее запрос в БД не найдет
+    plates: Set[str] = set()
+
+    def flush() -> None:
+        imported, duplicates = insert_batch(batch)
+        report["imported"] += imported
+        for line in duplicates:
+            fail(line, DUPLICATE_PLATE)
+        batch.clear()
+        plates.clear()
+
+    try:
+        for line, record in lines:
+            if isinstance(record, str):
+                fail(line, record)
+                continue
+            plate = record["car_number"]
+            if plate is not None:
+                if plate in plates:
+                    fail(line, DUPLICATE_PLATE)
+                    continue
+                plates.add(plate)
+            batch.append((line, record))
+            if len(batch) >= batch_size:
+                flush()
+    except ImportFormatError as error:
+        report["error"] = str(error)
+    if batch:
+        flush()
+
+    report["errors"].sort(key=lambda item: item["line"])
+    return report
@@ -0,0 +1,150 @@
+from typing import Any, Dict
+
+from sqlalchemy.pool import StaticPool
+
+
+class Config:
+    """Профиль по умолчанию: SQLite с настройками драйвера как есть"""
+
+    SQLALCHEMY_DATABASE_URI = "sqlite:///parking.db"
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS: Dict[str, Any] = {}
+    # PRAGMA, выполняемые на каждом новом соединении с SQLite
+    SQLITE_PRAGMAS: Dict[str, Any] = {}
+    # Применять недостающие миграции схемы при создании приложения; без
+    # этого устаревшая схема - ошибка запуска (см. parking_app.migrations)
+    SCHEMA_AUTO_MIGRATE = True
+
+    # Кэш номер автомобиля -> id клиента для въездов по камерам
+    PLATE_CACHE_SIZE = 10000
+    PLATE_CACHE_TTL = 300
+    # Максимальное число событий в одном пакете от камер
+    BATCH_MAX_EVENTS = 1000
+    # Запуск фоновых задач при создании приложения
+    START_BACKGROUND_JOBS = True
+    # Период сверки счетчиков свободных мест с БД, секунд; 0 - не сверять
+    AVAILABILITY_RECONCILE_INTERVAL = 30
+    # Счетчики свободных мест в разделяемой памяти - для парковок с id
+    # меньше этого числа; остальные читаются из БД
+    AVAILABILITY_MAX_PARKINGS = 16384
+    # Период отправки keepalive в потоке SSE без изменений, секунд
+    SSE_KEEPALIVE = 15
+    # Период опроса счетчиков рассылкой SSE: заезды и выезды через другие
+    # воркеры доходят до подписчиков не позже, секунд
+    SSE_POLL_INTERVAL = 0.2
+    # Тарифы: "default" и отдельные по id парковки. rate - ставка за час
+    # или hourly_rates - 24 ставки по часам суток; minimum и cap - пределы
+    # стоимости одной сессии. Суммы в рублях, с копейками не точнее сотых
+    TARIFFS: Dict[Any, Dict[str, Any]] = {"default": {"rate": 50, "minimum": 1}}
+    # Наибольший интервал статистики загрузки за один запрос, часов
+    STATS_MAX_HOURS = 24 * 366
+    # Закрытые сессии старше ARCHIVE_AFTER_DAYS дней переносятся в архив
+    # каждые ARCHIVE_INTERVAL секунд (0 - не переносить) порциями по
+    # ARCHIVE_CHUNK_SIZE строк, каждая в своей транзакции
+    ARCHIVE_AFTER_DAYS = 30
+    ARCHIVE_INTERVAL = 3600
+    ARCHIVE_CHUNK_SIZE = 1000
+    # Метрики запросов в памяти процесса и их выдача на /metrics
+    METRICS_ENABLED = True
+    # Списание оплаты из очереди payment_intent: число воркеров (0 - не
+    # списывать в этом процессе), период опроса очереди, секунд, и размер
+    # порции. Неудачная попытка повторяется через PAYMENT_RETRY_BASE * 2^n
+    # секунд, но не реже PAYMENT_RETRY_MAX; после PAYMENT_MAX_ATTEMPTS
+    # попыток платеж помечается failed. PAYMENT_LEASE - сколько секунд
+    # платеж принадлежит воркеру, после чего его может взять другой
+    PAYMENT_PROCESSOR = "stub"
+    PAYMENT_WORKERS = 2
+    PAYMENT_POLL_INTERVAL = 1.0
+    PAYMENT_BATCH_SIZE = 50
+    PAYMENT_MAX_ATTEMPTS = 8
+    PAYMENT_RETRY_BASE = 5.0
+    PAYMENT_RETRY_MAX = 3600.0
+    PAYMENT_LEASE = 60.0
+    # Ответы на запросы с Idempotency-Key: сколько держать в кэше процесса,
+    # сколько секунд ключ действует и период удаления устаревших ключей из
+    # БД, секунд (0 - не удалять)
+    IDEMPOTENCY_CACHE_SIZE = 10000
+    IDEMPOTENCY_TTL = 24 * 3600
+    IDEMPOTENCY_PURGE_INTERVAL = 3600
+    # Кэш тел ответов GET /clients, /clients/<id> и /clients/search по
+    # версии таблицы client: число записей, наибольший кэшируемый ответ,
+    # байт, и через сколько секунд ETag и тела устаревают без записи через
+    # приложение (запись командами flask, datagen, другим экземпляром)
+    RESPONSE_CACHE_SIZE = 1000
+    RESPONSE_CACHE_MAX_BODY = 1024 * 1024
+    RESPONSE_CACHE_TTL = 5.0
+    # Поиск клиентов ранжирует столько первых совпадений (parking_app.search)
+    SEARCH_RANK_WINDOW = 500
+    # Загрузка клиентов из файла: строк в одной вставке и транзакции (не
+    # больше 32766 - ограничения SQLite на число параметров запроса) и
+    # сколько ошибок перечислять в отчете
+    IMPORT_BATCH_SIZE = 1000
+    IMPORT_MAX_ERRORS = 1000
+    # Многопроцессный сервер parking_app.server: число воркеров; запросов
+    # до перезапуска воркера (0 - без перезапуска) и случайная добавка к
+    # этому числу; секунд на завершение начатых запросов при остановке;
+    # очередь соединений слушающего сокета
+    SERVER_WORKERS = 4
+    SERVER_MAX_REQUESTS = 10000
+    SERVER_MAX_REQUESTS_JITTER = 1000
+    SERVER_GRACEFUL_TIMEOUT = 30.0
+    SERVER_BACKLOG = 1024
+
+
+class HighThroughputConfig(Config):
+    """Профиль для нагрузки от нескольких воркеров
+
+    - journal_mode=WAL: читатели не ждут писателя, а писатель - читателей;
+    - synchronous=NORMAL: в режиме WAL fsync выполняется только на
+      контрольной точке. Целостность базы сохраняется, при отключении
+      питания могут потеряться последние зафиксированные транзакции;
+    - busy_timeout: сколько миллисекунд ждать блокировку записи вместо
+      немедленной ошибки "database is locked";
+    - mmap_size и cache_size: чтение страниц через отображение файла в
+      память и кэш страниц 64 МБ на соединение (отрицательное значение - КБ);
+    - temp_store=MEMORY: временные таблицы и индексы сортировок в памяти.
+
+    Пул держит соединения открытыми, чтобы PRAGMA и прогретый кэш страниц
+    не терялись между запросами. Миграции схемы перед запуском применяет
+    python -m parking_app.migrations.
+    """
+
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,
+        "temp_store": "MEMORY",
+    }
+    # Миграции - отдельный шаг развертывания, а не гонка воркеров при старте
+    SCHEMA_AUTO_MIGRATE = False
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_size": 16,
+        "max_overflow": 16,
+        "pool_timeout": 30,
+    }
+
+
+class InMemoryConfig(Config):
+    """Профиль для тестов и бенчмарков без файлового ввода-вывода
+
+    База в памяти живет, пока открыто соединение, поэтому все потоки
+    работают через одно соединение (StaticPool). Параллельная запись на
+    нем не проверяется: для этого нужна файловая база. Транзакции
+    начинает SQLAlchemy, а не драйвер, поэтому работают SAVEPOINT.
+    """
+
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "poolclass": StaticPool,
+        "connect_args": {"check_same_thread": False},
+    }
+    START_BACKGROUND_JOBS = False
+
+
+PROFILES = {
+    "default": Config,
+    "high-throughput": HighThroughputConfig,
+    "memory": InMemoryConfig,
+}
@@ -0,0 +1,164 @@
+import json
+import threading
+from typing import Any, Dict, Generator, Optional, Protocol, Tuple
+
+
+class BroadcastChannel:
+    """Буфер из одного последнего значения с номером версии
+
+    Писатель только заменяет значение и будит ожидающих, поэтому не
+    зависит от числа и скорости подписчиков. Медленный подписчик не
+    копит очередь: проснувшись, он получает сразу последнее значение.
+    """
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self.version = 0
+        self.value: Any = None
+        self.subscribers = 0
+
+    def publish(self, value: Any) -> None:
+        with self._condition:
+            self.version += 1
+            self.value = value
+            self._condition.notify_all()
+
+    def seed(self, value: Any) -> None:
+        """Начальное значение канала без события для подписчиков"""
+        with self._condition:
+            if self.value is None:
+                self.value = value
+
+    def attach(self) -> None:
+        with self._condition:
+            self.subscribers += 1
+
+    def detach(self) -> None:
+        with self._condition:
+            self.subscribers -= 1
+
+    def wait(self, seen_version: int, timeout: Optional[float]) -> Tuple[int, Any]:
+        """Ожидание версии новее seen_version; по таймауту возвращает seen_version"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.version != seen_version, timeout)
+            return self.version, self.value
+
+
+class AvailabilitySource(Protocol):
+    """Счетчики свободных мест, которые опрашивает рассылка"""
+
+    @property
+    def changes(self) -> int: ...
+
+    def get(self, parking_id: int) -> Optional[int]: ...
+
+
+class AvailabilityHub:
+    """Рассылка изменений числа свободных мест подписчикам SSE по парковкам
+
+    publish только запоминает значение: каналы будит отдельный поток
+    рассылки, поэтому время коммита не зависит от числа подписчиков.
+    Изменения, пришедшие до очередного прохода рассылки, склеиваются, а
+    значение, которое канал уже разослал, повторно не отправляется.
+
+    publish вызывают коммиты этого процесса. Изменения из других процессов
+    поток рассылки находит сам, опрашивая источник из watch.
+    """
+
+    def __init__(self) -> None:
+        self._channels: Dict[int, BroadcastChannel] = {}
+        self._pending: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+        self._dispatch_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._source: Optional[AvailabilitySource] = None
+        self._poll_interval: Optional[float] = None
+
+    def watch(self, source: AvailabilitySource, interval: float) -> None:
+        """Опрос source раз в interval секунд после первой подписки
+
+        Когда source.changes меняется, каналам рассылаются текущие значения
+        их парковок из source.
+        """
+        self._source = source
+        self._poll_interval = interval
+
+    def channel(self, parking_id: int) -> BroadcastChannel:
+        channel = self._channels.get(parking_id)
+        if channel is None:
+            with self._lock:
+                channel = self._channels.setdefault(parking_id, BroadcastChannel())
+                if self._dispatcher is None:
+                    self._dispatcher = threading.Thread(
+                        target=self._run, name="availability-hub", daemon=True
+                    )
+                    self._dispatcher.start()
+        return channel
+
+    def publish(self, parking_id: int, available: int) -> None:
+        # Пока на парковку никто не подписан, рассылать некому
+        if parking_id not in self._channels:
+            return
+        with self._lock:
+            self._pending[parking_id] = available
+        self._wakeup.set()
+
+    def dispatch(self) -> None:
+        """Передача накопленных изменений в каналы подписчиков"""
+        with self._dispatch_lock:
+            with self._lock:
+                self._wakeup.clear()
+                pending, self._pending = self._pending, {}
+            for parking_id, available in pending.items():
+                channel = self._channels[parking_id]
+                if channel.value != available:
+                    channel.publish(available)
+
+    def poll(self, seen_changes: Optional[int]) -> Optional[int]:
+        """Значения из источника, если он изменился после seen_changes"""
+        if self._source is None:
+            return None
+        changes = self._source.changes
+        if changes != seen_changes:
+            for parking_id in list(self._channels):
+                available = self._source.get(parking_id)
+                if available is not None:
+                    self.publish(parking_id, available)
+        return changes
+
+    def _run(self) -> None:
+        seen_changes = None
+        while True:
+            self._wakeup.wait(self._poll_interval)
+            seen_changes = self.poll(seen_changes)
+            self.dispatch()
+
+    def subscribe(
+        self, parking_id: int, available: int, keepalive: float
+    ) -> Generator[str, None, None]:
+        """Поток сообщений SSE: текущее значение, затем каждое изменение
+
+        Раз в keepalive секунд без изменений отправляется комментарий,
+        чтобы прокси не закрывали соединение.
+        """
+        channel = self.channel(parking_id)
+        channel.seed(available)
+        version = channel.version
+        channel.attach()
+        try:
+            yield format_event(parking_id, version, available)
+            while True:
+                new_version, value = channel.wait(version, keepalive)
+                if new_version == version:
+                    yield ": keepalive\n\n"
+                    continue
+                version = new_version
+                yield format_event(parking_id, version, value)
+        finally:
+            channel.detach()
+
+
+def format_event(parking_id: int, version: int, available: int) -> str:
+    data = json.dumps({"parking_id": parking_id, "count_available_places": available})
+    return f"id: {version}\nevent: availability\ndata: {data}\n\n"
@@ -0,0 +1,190 @@
+"""Ключи идемпотентности для запросов заезда и выезда
+
+Контроллер шлагбаума повторяет запрос по таймауту с тем же заголовком
+Idempotency-Key. Ответ первого успешного запроса записывается в таблицу
+idempotency_key в той же транзакции, что и сам заезд или выезд: ключ
+сохраняется тогда и только тогда, когда операция выполнена. Повтор
+получает сохраненный ответ с заголовком Idempotent-Replayed без вызова
+обработчика - из LRU-кэша процесса или, после перезапуска и в другом
+процессе, одним запросом к idempotency_key.
+
+Ключ связан с отпечатком запроса (метод, путь и данные): тот же ключ с
+другим запросом получает 422. Ответы с ошибкой не сохраняются - они ничего
+не меняют в БД, и повтор выполняется заново. Перед ответом с ошибкой ключ
+ищется еще раз: повтор, пришедший во время первого запроса, получает его
+сохраненный ответ, а не отказ. Ключи живут IDEMPOTENCY_TTL секунд,
+устаревшие строки удаляет периодическая задача.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timedelta
+from functools import wraps
+from typing import Callable, NamedTuple, Optional
+
+from flask import Flask, Response, current_app, g, jsonify, request
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .app import db
+from .cache import LRUCache
+from .jobs import register_job
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 64
+
+
+class StoredResponse(NamedTuple):
+    """Ответ, сохраненный под ключом идемпотентности"""
+
+    fingerprint: str
+    status: int
+    body: str
+
+
+def init_idempotency(app: Flask) -> None:
+    """Кэш сохраненных ответов и задача удаления устаревших ключей"""
+    app.extensions["idempotency_cache"] = LRUCache(
+        app.config["IDEMPOTENCY_CACHE_SIZE"], ttl=app.config["IDEMPOTENCY_TTL"]
+    )
+    register_job(
+        app,
+        "purge-idempotency-keys",
+        app.config["IDEMPOTENCY_PURGE_INTERVAL"],
+        purge_idempotency_keys,
+    )
+
+
+def idempotent(view: Callable) -> Callable:
+    """Декоратор обработчика: повтор запроса с тем же ключом не выполняется
+
+    Ответ сохраняет save_response перед фиксацией транзакции обработчика.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return view(*args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            error = f"{IDEMPOTENCY_HEADER} - от 1 до {MAX_KEY_LENGTH} символов"
+            return jsonify({"error": error}), 400
+
+        fingerprint = request_fingerprint()
+        stored = find_response(key)
+        if stored is not None:
+            return replay(stored, fingerprint)
+
+        g.idempotency = (key, fingerprint)
+        try:
+            response = view(*args, **kwargs)
+        finally:
+            pending = g.pop("idempotency", None)
+        saved = g.pop("idempotency_saved", None)
+        if saved is not None:
+            # Обработчик уже зафиксировал транзакцию с ключом
+            current_app.extensions["idempotency_cache"].set(key, saved)
+        elif pending is not None:
+            # Ошибка без записи ключа. Отказ повтора ("уже на парковке",
+            # "нет сессии") возможен, когда первый запрос еще выполнялся
+            # при поиске ключа: записи в SQLite идут по очереди, и к этому
+            # моменту первый запрос уже зафиксировал ключ - повтор получает
+            # его ответ, а не ошибку
+            stored = find_response(key)
+            if stored is not None:
+                return replay(stored, fingerprint)
+        return response
+
+    return wrapper
+
+
+def request_fingerprint() -> str:
+    """Отпечаток запроса: метод, путь и данные JSON или формы"""
+    if request.is_json:
+        data = request.get_json(silent=True)
+    else:
+        data = sorted(request.form.items(multi=True))
+    canonical = json.dumps(
+        [request.method, request.path, data], sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def find_response(key: str) -> Optional[StoredResponse]:
+    """Сохраненный ответ по ключу: из кэша, затем из БД"""
+    cache = current_app.extensions["idempotency_cache"]
+    stored = cache.get(key)
+    if stored is not None:
+        return stored
+    row = db.session.execute(
+        select(IdempotencyKey.fingerprint, IdempotencyKey.status, IdempotencyKey.body)
+        .where(IdempotencyKey.key == key)
+        .where(IdempotencyKey.created_at >= expired_before())
+    ).first()
+    if row is None:
+        return None
+    stored = StoredResponse(*row)
+    cache.set(key, stored)
+    return stored
+
+
+def save_response(response: Response) -> Optional[Response]:
+    """Запись ответа под ключом текущего запроса без фиксации транзакции
+
+    Возвращает ответ для повтора, если ключ уже записал параллельный
+    запрос с тем же ключом: тогда транзакцию обработчика нужно откатить.
+    Без ключа в запросе ничего не делает.
+    """
+    pending = g.pop("idempotency", None)
+    if pending is None:
+        return None
+    key, fingerprint = pending
+    stored = StoredResponse(
+        fingerprint, response.status_code, response.get_data(as_text=True)
+    )
+    statement = sqlite_insert(IdempotencyKey).values(
+        key=key, created_at=datetime.now(), **stored._asdict()
+    )
+    saved = db.session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[IdempotencyKey.key],
+            set_={
+                name: statement.excluded[name]
+                for name in ("fingerprint", "status", "body", "created_at")
+            },
+            # Устаревший ключ можно занять заново
+            where=IdempotencyKey.created_at < expired_before(),
+        ).returning(IdempotencyKey.key)
+    ).scalar_one_or_none()
+    if saved is None:
+        current = find_response(key)
+        return replay(current, fingerprint) if current is not None else None
+    g.idempotency_saved = stored
+    return None
+
+
+def replay(stored: StoredResponse, fingerprint: str):
+    """Сохраненный ответ или 422, если ключ был у другого запроса"""
+    if stored.fingerprint != fingerprint:
+        error = f"{IDEMPOTENCY_HEADER} уже использован для другого запроса"
+        return jsonify({"error": error}), 422
+    return Response(
+        stored.body,
+        status=stored.status,
+        mimetype="application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def expired_before() -> datetime:
+    """Ключи, созданные раньше этого момента, устарели"""
+    return datetime.now() - timedelta(seconds=current_app.config["IDEMPOTENCY_TTL"])
+
+
+def purge_idempotency_keys() -> None:
+    """Периодическая задача: удаление устаревших ключей"""
+    db.session.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.created_at < expired_before())
+    )
+    db.session.commit()
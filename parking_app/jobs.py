@@ -0,0 +1,81 @@
+import logging
+import threading
+from typing import Callable, List
+
+from flask import Flask
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """Фоновый поток, выполняющий func в контексте приложения каждые interval секунд"""
+
+    def __init__(
+        self,
+        app: Flask,
+        name: str,
+        interval: float,
+        func: Callable[[], None],
+        every_process: bool = False,
+    ):
+        self.app = app
+        self.name = name
+        self.interval = interval
+        self.func = func
+        # Задача обслуживает состояние процесса и нужна в каждом воркере
+        self.every_process = every_process
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def run_once(self) -> None:
+        with self.app.app_context():
+            try:
+                self.func()
+            except Exception:
+                logger.exception("Фоновая задача %s завершилась с ошибкой", self.name)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.run_once()
+
+
+def register_job(
+    app: Flask,
+    name: str,
+    interval: float,
+    func: Callable[[], None],
+    every_process: bool = False,
+):
+    """Регистрация периодической задачи; interval <= 0 отключает задачу
+
+    every_process - задача обновляет память процесса (кэши, счетчики) и
+    запускается в каждом воркере многопроцессного сервера, остальные
+    задачи - только в одном.
+    """
+    if interval <= 0:
+        return
+    jobs: List[PeriodicJob] = app.extensions.setdefault("periodic_jobs", [])
+    jobs.append(PeriodicJob(app, name, interval, func, every_process))
+
+
+def start_jobs(app: Flask, every_process_only: bool = False) -> None:
+    """Запуск зарегистрированных задач в текущем процессе
+
+    every_process_only - только задачи, нужные каждому воркеру.
+    """
+    for job in app.extensions.get("periodic_jobs", []):
+        if job.every_process or not every_process_only:
+            job.start()
+
+
+def stop_jobs(app: Flask) -> None:
+    for job in app.extensions.get("periodic_jobs", []):
+        job.stop()
@@ -0,0 +1,300 @@
+"""Метрики запросов в памяти процесса и их выдача в формате Prometheus
+
+Для каждого маршрута считаются гистограмма длительности запросов, число
+SQL-запросов и время в них, число прочитанных и измененных строк. Во
+время запроса счетчики копятся в объекте RequestStats текущего потока
+без блокировок, в общий реестр они попадают одним коротким захватом
+блокировки в конце запроса (MetricsMiddleware).
+
+- SQL-запросы и их время - события движка before/after_cursor_execute;
+- прочитанные и измененные строки считает курсор CountingCursor:
+  выбранные строки при выборке, измененные - по приросту total_changes
+  соединения SQLite. Запрос с RETURNING учитывается в total_changes только
+  после выборки всех строк, поэтому курсор отдает счетчики при закрытии.
+  Строки, выбранные потоковым ответом после окончания обработчика, не
+  учитываются.
+
+Каждый воркер отдает на /metrics свои значения: их суммирует Prometheus.
+"""
+
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from flask import Flask, request
+from sqlalchemy import event
+
+from .app import db
+
+# Границы корзин гистограммы длительности запросов, секунд
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+# Маршрут и метод запроса - метки метрик
+RouteKey = Tuple[str, str]
+
+_current = threading.local()
+
+
+class RequestStats:
+    """Счетчики одного запроса, меняются только его потоком"""
+
+    __slots__ = ("rule", "queries", "sql_seconds", "rows_read", "rows_written")
+
+    def __init__(self):
+        # Правило маршрута, None - адрес не найден
+        self.rule = None
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.rows_read = 0
+        self.rows_written = 0
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин, без накопления"""
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        # Последняя корзина - значения больше всех границ (+Inf)
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class RouteMetrics:
+    """Накопленные метрики одного маршрута и метода"""
+
+    __slots__ = (
+        "latency",
+        "statuses",
+        "queries",
+        "sql_seconds",
+        "rows_read",
+        "rows_written",
+    )
+
+    def __init__(self, bounds: Sequence[float]):
+        self.latency = Histogram(bounds)
+        self.statuses: Dict[int, int] = {}
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.rows_read = 0
+        self.rows_written = 0
+
+
+class MetricsRegistry:
+    """Метрики маршрутов процесса"""
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self._routes: Dict[RouteKey, RouteMetrics] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self, key: RouteKey, status: int, seconds: float, stats: RequestStats
+    ) -> None:
+        """Учет завершенного запроса"""
+        with self._lock:
+            route = self._routes.get(key)
+            if route is None:
+                route = self._routes[key] = RouteMetrics(self.bounds)
+            route.latency.observe(seconds)
+            route.statuses[status] = route.statuses.get(status, 0) + 1
+            route.queries += stats.queries
+            route.sql_seconds += stats.sql_seconds
+            route.rows_read += stats.rows_read
+            route.rows_written += stats.rows_written
+
+    def render(self) -> str:
+        """Метрики в текстовом формате Prometheus"""
+        with self._lock:
+            routes = [
+                (key, route, list(route.latency.counts), dict(route.statuses))
+                for key, route in sorted(self._routes.items())
+            ]
+
+        lines: List[str] = []
+
+        def header(name: str, kind: str, description: str) -> None:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def labels(key: RouteKey, **extra: str) -> str:
+            route, method = key
+            pairs = {"route": route, "method": method, **extra}
+            return ",".join(
+                f'{name}="{escape(value)}"' for name, value in pairs.items()
+            )
+
+        name = "parking_http_request_duration_seconds"
+        header(name, "histogram", "Длительность обработки запроса")
+        for key, route, counts, _ in routes:
+            total = 0
+            for bound, count in zip((*self.bounds, "+Inf"), counts):
+                total += count
+                lines.append(f"{name}_bucket{{{labels(key, le=str(bound))}}} {total}")
+            lines.append(f"{name}_sum{{{labels(key)}}} {route.latency.sum}")
+            lines.append(f"{name}_count{{{labels(key)}}} {total}")
+
+        name = "parking_http_requests_total"
+        header(name, "counter", "Запросы по коду ответа")
+        for key, _, _, statuses in routes:
+            for status, count in sorted(statuses.items()):
+                lines.append(f"{name}{{{labels(key, status=str(status))}}} {count}")
+
+        for name, attribute, description in (
+            ("parking_sql_queries_total", "queries", "SQL-запросы"),
+            ("parking_sql_duration_seconds_total", "sql_seconds", "Время в SQL"),
+            ("parking_db_rows_read_total", "rows_read", "Прочитанные строки"),
+            ("parking_db_rows_written_total", "rows_written", "Измененные строки"),
+        ):
+            header(name, "counter", description)
+            for key, route, _, _ in routes:
+                lines.append(f"{name}{{{labels(key)}}} {getattr(route, attribute)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def escape(value: str) -> str:
+    """Экранирование значения метки Prometheus"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class CountingCursor(sqlite3.Cursor):
+    """Курсор, считающий выбранные и измененные строки для метрик запроса
+
+    SQLAlchemy создает курсор на каждый запрос к БД, поэтому значение
+    total_changes запоминается при создании курсора, а не при execute.
+    """
+
+    rows_read = 0
+    changes = 0
+    # Начало выполнения запроса, ставит событие before_cursor_execute
+    started = 0.0
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self.rows_read += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = super().fetchmany(*args, **kwargs)
+        self.rows_read += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self.rows_read += len(rows)
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        self.rows_read += 1
+        return row
+
+    def close(self):
+        super().close()
+        stats = getattr(_current, "stats", None)
+        if stats is not None:
+            stats.rows_read += self.rows_read
+            stats.rows_written += self.connection.total_changes - self.changes
+        self.rows_read = 0
+
+
+class CountingConnection(sqlite3.Connection):
+    """Соединение SQLite, создающее курсоры CountingCursor"""
+
+    def cursor(self, factory=CountingCursor):  # type: ignore[override]
+        cursor = super().cursor(factory)
+        cursor.changes = self.total_changes
+        return cursor
+
+
+def instrument_engine_options(app: Flask) -> None:
+    """Соединения движка через CountingConnection; вызывается до db.init_app"""
+    options = dict(app.config["SQLALCHEMY_ENGINE_OPTIONS"])
+    options["connect_args"] = {
+        **options.get("connect_args", {}),
+        "factory": CountingConnection,
+    }
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+
+def init_metrics(app: Flask) -> None:
+    """Реестр метрик, промежуточный слой WSGI и события движка"""
+    registry = MetricsRegistry()
+    app.extensions["metrics"] = registry
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app, registry)  # type: ignore
+
+    @app.before_request
+    def remember_route():
+        # После обработки запроса Flask уже не хранит его правило
+        stats = getattr(_current, "stats", None)
+        if stats is not None:
+            stats.rule = request.url_rule
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        cursor.started = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        stats = getattr(_current, "stats", None)
+        if stats is not None:
+            stats.queries += 1
+            stats.sql_seconds += time.perf_counter() - cursor.started
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """Промежуточный слой WSGI: длительность и счетчики каждого запроса
+
+    Код ответа берется из start_response, правило маршрута запоминает
+    обработчик before_request. Длительность - до начала отправки тела
+    ответа.
+    """
+
+    def __init__(self, wsgi_app: Callable, registry: MetricsRegistry):
+        self.wsgi_app = wsgi_app
+        self.registry = registry
+
+    def __call__(self, environ, start_response):
+        stats = _current.stats = RequestStats()
+        status = [500]
+
+        def capture_status(status_line, headers, exc_info=None):
+            status[0] = int(status_line[:3])
+            return start_response(status_line, headers, exc_info)
+
+        started = time.perf_counter()
+        try:
+            return self.wsgi_app(environ, capture_status)
+        finally:
+            seconds = time.perf_counter() - started
+            _current.stats = None
+            rule = stats.rule.rule if stats.rule is not None else "<unmatched>"
+            key = (rule, environ["REQUEST_METHOD"])
+            self.registry.record(key, status[0], seconds, stats)
@@ -0,0 +1,379 @@
+"""Версионная схема БД: миграции и проверка версии при запуске
+
+Версия схемы хранится в заголовке файла SQLite (PRAGMA user_version).
+Миграция N переводит схему из версии N - 1 в N и состоит из SQL, который
+не зависит от текущих моделей: модели меняются, а уже выпущенные миграции
+- нет. Изменение модели требует новой миграции в конце MIGRATIONS.
+
+Приложение при создании только читает user_version (check_schema). Если
+схема отстает, миграции применяются при SCHEMA_AUTO_MIGRATE, иначе запуск
+завершается ошибкой: миграции применяет отдельный шаг развертывания
+
+    python -m parking_app.migrations
+
+Миграции выполняются в одной транзакции BEGIN IMMEDIATE: процессы,
+запущенные одновременно, применяют их по очереди, и каждый перечитывает
+версию после получения блокировки.
+
+Первая миграция - схема на момент перехода с db.create_all() на миграции.
+Ее CREATE ... IF NOT EXISTS принимает и базы, созданные create_all.
+"""
+
+import argparse
+import os
+import sqlite3
+from typing import NamedTuple, Tuple, cast
+
+from flask import Flask
+from sqlalchemy import Engine
+
+from .app import db
+from .config import PROFILES
+
+
+class SchemaVersionError(RuntimeError):
+    """Версия схемы БД не совпадает с версией приложения"""
+
+
+class Migration(NamedTuple):
+    description: str
+    statements: Tuple[str, ...]
+
+
+MIGRATIONS: Tuple[Migration, ...] = (
+    Migration(
+        "Исходная схема: таблицы, созданные db.create_all()",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS client (
+                id INTEGER NOT NULL,
+                name VARCHAR(50) NOT NULL,
+                surname VARCHAR(50) NOT NULL,
+                credit_card VARCHAR(50),
+                car_number VARCHAR(10),
+                PRIMARY KEY (id)
+            )
+            """,
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS ix_client_car_number
+                ON client (car_number)
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS idempotency_key (
+                "key" VARCHAR(64) NOT NULL,
+                fingerprint VARCHAR(64) NOT NULL,
+                status INTEGER NOT NULL,
+                body TEXT NOT NULL,
+                created_at DATETIME NOT NULL,
+                PRIMARY KEY ("key")
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS ix_idempotency_key_created_at
+                ON idempotency_key (created_at)
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS parking (
+                id INTEGER NOT NULL,
+                address VARCHAR(100) NOT NULL,
+                opened BOOLEAN,
+                count_places INTEGER NOT NULL,
+                count_available_places INTEGER NOT NULL,
+                PRIMARY KEY (id)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS client_parking (
+                id INTEGER NOT NULL,
+                client_id INTEGER NOT NULL,
+                parking_id INTEGER NOT NULL,
+                time_in DATETIME,
+                time_out DATETIME,
+                PRIMARY KEY (id),
+                FOREIGN KEY(client_id) REFERENCES client (id),
+                FOREIGN KEY(parking_id) REFERENCES parking (id)
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS ix_client_parking_client_parking_time_out
+                ON client_parking (client_id, parking_id, time_out)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS ix_client_parking_parking_time_out
+                ON client_parking (parking_id, time_out)
+            """,
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_client_parking_active_client
+                ON client_parking (client_id) WHERE time_out IS NULL
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS client_parking_history (
+                id INTEGER NOT NULL,
+                client_id INTEGER NOT NULL,
+                parking_id INTEGER NOT NULL,
+                time_in DATETIME,
+                time_out DATETIME NOT NULL,
+                PRIMARY KEY (id),
+                FOREIGN KEY(client_id) REFERENCES client (id),
+                FOREIGN KEY(parking_id) REFERENCES parking (id)
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS ix_client_parking_history_client
+                ON client_parking_history (client_id)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS ix_client_parking_history_parking
+                ON client_parking_history (parking_id)
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS parking_hourly_stats (
+                parking_id INTEGER NOT NULL,
+                bucket DATETIME NOT NULL,
+                entries INTEGER NOT NULL,
+                exits INTEGER NOT NULL,
+                occupied_seconds FLOAT NOT NULL,
+                PRIMARY KEY (parking_id, bucket),
+                FOREIGN KEY(parking_id) REFERENCES parking (id)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS payment_intent (
+                id INTEGER NOT NULL,
+                client_parking_id INTEGER NOT NULL,
+                client_id INTEGER NOT NULL,
+                amount FLOAT NOT NULL,
+                status VARCHAR(10) NOT NULL,
+                attempts INTEGER NOT NULL,
+                next_attempt_at DATETIME NOT NULL,
+                locked_until DATETIME,
+                charge_id VARCHAR(64),
+                last_error VARCHAR(200),
+                created_at DATETIME NOT NULL,
+                completed_at DATETIME,
+                PRIMARY KEY (id),
+                UNIQUE (client_parking_id),
+                FOREIGN KEY(client_id) REFERENCES client (id)
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS ix_payment_intent_status_next_attempt
+                ON payment_intent (status, next_attempt_at)
+            """,
+        ),
+    ),
+    Migration(
+        "Полнотекстовый индекс клиентов client_fts (parking_app.search)",
+        (
+            # Строки не копируются: индекс ссылается на client по id
+            """
+            CREATE VIRTUAL TABLE client_fts USING fts5(
+                name, surname, car_number,
+                content='client', content_rowid='id',
+                tokenize='unicode61', prefix='1 2 3'
+            )
+            """,
+            # Вес совпадения: номер автомобиля > фамилия > имя
+            """
+            INSERT INTO client_fts (client_fts, rank)
+                VALUES ('rank', 'bm25(1.0, 2.0, 4.0)')
+            """,
+            """
+            CREATE TRIGGER client_fts_insert AFTER INSERT ON client BEGIN
+                INSERT INTO client_fts (rowid, name, surname, car_number)
+                    VALUES (new.id, new.name, new.surname, new.car_number);
+            END
+            """,
+            """
+            CREATE TRIGGER client_fts_delete AFTER DELETE ON client BEGIN
+                INSERT INTO client_fts (client_fts, rowid, name, surname, car_number)
+                    VALUES ('delete', old.id, old.name, old.surname, old.car_number);
+            END
+            """,
+            """
+            CREATE TRIGGER client_fts_update
+                AFTER UPDATE OF id, name, surname, car_number ON client
+            BEGIN
+                INSERT INTO client_fts (client_fts, rowid, name, surname, car_number)
+                    VALUES ('delete', old.id, old.name, old.surname, old.car_number);
+                INSERT INTO client_fts (rowid, name, surname, car_number)
+                    VALUES (new.id, new.name, new.surname, new.car_number);
+            END
+            """,
+            # Индекс по уже существующим клиентам
+            "INSERT INTO client_fts (client_fts) VALUES ('rebuild')",
+        ),
+    ),
+    Migration(
+        "AUTOINCREMENT у client_parking: id сессий не выдаются повторно",
+        (
+            # SQLite не добавляет AUTOINCREMENT к существующей таблице:
+            # таблица пересоздается с теми же строками и индексами
+            """
+            CREATE TABLE client_parking_new (
+                id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+                client_id INTEGER NOT NULL,
+                parking_id INTEGER NOT NULL,
+                time_in DATETIME,
+                time_out DATETIME,
+                FOREIGN KEY(client_id) REFERENCES client (id),
+                FOREIGN KEY(parking_id) REFERENCES parking (id)
+            )
+            """,
+            """
+            INSERT INTO client_parking_new (id, client_id, parking_id, time_in, time_out)
+                SELECT id, client_id, parking_id, time_in, time_out FROM client_parking
+            """,
+            "DROP TABLE client_parking",
+            "ALTER TABLE client_parking_new RENAME TO client_parking",
+            """
+            CREATE INDEX ix_client_parking_client_parking_time_out
+                ON client_parking (client_id, parking_id, time_out)
+            """,
+            """
+            CREATE INDEX ix_client_parking_parking_time_out
+                ON client_parking (parking_id, time_out)
+            """,
+            """
+            CREATE UNIQUE INDEX uq_client_parking_active_client
+                ON client_parking (client_id) WHERE time_out IS NULL
+            """,
+            # Новые id - после всех уже выданных, в том числе удаленных
+            # сессий, на которые остались платежи, и архивных
+            "DELETE FROM sqlite_sequence WHERE name = 'client_parking'",
+            """
+            INSERT INTO sqlite_sequence (name, seq) VALUES ('client_parking', max(
+                (SELECT coalesce(max(id), 0) FROM client_parking),
+                (SELECT coalesce(max(id), 0) FROM client_parking_history),
+                (SELECT coalesce(max(client_parking_id), 0) FROM payment_intent)
+            ))
+            """,
+        ),
+    ),
+    Migration(
+        "Индекс client_parking по time_out: порции архиватора (parking_app.archive)",
+        (
+            """
+            CREATE INDEX ix_client_parking_time_out
+                ON client_parking (time_out)
+            """,
+        ),
+    ),
+    Migration(
+        "Сумма платежа payment_intent.amount - целые копейки вместо рублей FLOAT",
+        (
+            # Тип колонки в SQLite не меняется: таблица пересоздается
+            """
+            CREATE TABLE payment_intent_new (
+                id INTEGER NOT NULL,
+                client_parking_id INTEGER NOT NULL,
+                client_id INTEGER NOT NULL,
+                amount INTEGER NOT NULL,
+                status VARCHAR(10) NOT NULL,
+                attempts INTEGER NOT NULL,
+                next_attempt_at DATETIME NOT NULL,
+                locked_until DATETIME,
+                charge_id VARCHAR(64),
+                last_error VARCHAR(200),
+                created_at DATETIME NOT NULL,
+                completed_at DATETIME,
+                PRIMARY KEY (id),
+                UNIQUE (client_parking_id),
+                FOREIGN KEY(client_id) REFERENCES client (id)
+            )
+            """,
+            """
+            INSERT INTO payment_intent_new
+                SELECT id, client_parking_id, client_id,
+                    CAST(round(amount * 100) AS INTEGER), status, attempts,
+                    next_attempt_at, locked_until, charge_id, last_error,
+                    created_at, completed_at
+                FROM payment_intent
+            """,
+            "DROP TABLE payment_intent",
+            "ALTER TABLE payment_intent_new RENAME TO payment_intent",
+            """
+            CREATE INDEX ix_payment_intent_status_next_attempt
+                ON payment_intent (status, next_attempt_at)
+            """,
+        ),
+    ),
+)
+
+# Версия схемы, которую ожидает приложение
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def check_schema(app: Flask) -> None:
+    """Проверка версии схемы при создании приложения - один PRAGMA"""
+    with app.app_context():
+        engine = db.engine
+    with engine.connect() as connection:
+        version = connection.exec_driver_sql("PRAGMA user_version").scalar_one()
+    if version == SCHEMA_VERSION:
+        return
+    if version > SCHEMA_VERSION:
+        raise SchemaVersionError(
+            f"Схема БД версии {version} новее приложения ({SCHEMA_VERSION})"
+        )
+    if not app.config["SCHEMA_AUTO_MIGRATE"]:
+        raise SchemaVersionError(
+            f"Схема БД версии {version}, приложению нужна {SCHEMA_VERSION}: "
+            "выполните python -m parking_app.migrations"
+        )
+    upgrade_schema(engine)
+
+
+def upgrade_schema(engine: Engine) -> Tuple[int, int]:
+    """Применение недостающих миграций, возвращает версии до и после"""
+    connection = engine.raw_connection()
+    sqlite_connection = cast(sqlite3.Connection, connection.driver_connection)
+    isolation_level = sqlite_connection.isolation_level
+    # Транзакцией управляем сами: драйвер не должен фиксировать ее перед DDL
+    sqlite_connection.isolation_level = None
+    cursor = sqlite_connection.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            start = cursor.execute("PRAGMA user_version").fetchone()[0]
+            for version in range(start + 1, SCHEMA_VERSION + 1):
+                for statement in MIGRATIONS[version - 1].statements:
+                    cursor.execute(statement)
+            if start < SCHEMA_VERSION:
+                cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        cursor.execute("COMMIT")
+    finally:
+        cursor.close()
+        sqlite_connection.isolation_level = isolation_level
+        connection.close()
+    return start, max(start, SCHEMA_VERSION)
+
+
+def main() -> None:
+    """Применение миграций к БД профиля без создания всего приложения"""
+    parser = argparse.ArgumentParser(description="Применение миграций схемы БД")
+    parser.add_argument(
+        "--profile",
+        choices=sorted(PROFILES),
+        default=os.environ.get("PARKING_PROFILE", "default"),
+        help="профиль настроек, по умолчанию PARKING_PROFILE или default",
+    )
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.from_object(PROFILES[args.profile])
+    db.init_app(app)
+    with app.app_context():
+        before, after = upgrade_schema(db.engine)
+        db.engine.dispose()
+    if before == after:
+        print(f"Схема БД актуальна: версия {after}")
+    else:
+        print(f"Схема БД обновлена: версия {before} -> {after}")
+
+
+if __name__ == "__main__":
+    main()
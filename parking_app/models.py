@@ -1,6 +1,7 @@
 from typing import Any, Dict
 
 from .app import db
+from .serializers import compile_object_serializer, compile_row_serializer
 
 
 class Client(db.Model):  # type: ignore
@@ -10,7 +11,7 @@ class Client(db.Model):  # type: ignore
     name = db.Column(db.String(50), nullable=False)
     surname = db.Column(db.String(50), nullable=False)
     credit_card = db.Column(db.String(50), nullable=True)
-    car_number = db.Column(db.String(10), nullable=True)
+    car_number = db.Column(db.String(10), nullable=True, unique=True, index=True)
 
     parking_logs = db.relationship("ClientParking", backref="client", lazy=True)
 
@@ -18,7 +19,7 @@ class Client(db.Model):  # type: ignore
         return f"Клиент {self.name} {self.surname}"
 
     def to_json(self) -> Dict[str, Any]:
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        return client_to_json(self)
 
 
 class Parking(db.Model):  # type: ignore
@@ -36,11 +37,34 @@ class Parking(db.Model):  # type: ignore
         return f"Парковка {self.address}"
 
     def to_json(self) -> Dict[str, Any]:
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        return parking_to_json(self)
 
 
 class ClientParking(db.Model):  # type: ignore
     __tablename__ = "client_parking"
+    __table_args__ = (
+        # Поиск активной сессии при выезде
+        db.Index(
+            "ix_client_parking_client_parking_time_out",
+            "client_id",
+            "parking_id",
+            "time_out",
+        ),
+        # Сессии конкретной парковки
+        db.Index("ix_client_parking_parking_time_out", "parking_id", "time_out"),
+        # Закрытые сессии по времени выезда: порции архиватора
+        db.Index("ix_client_parking_time_out", "time_out"),
+        # Не более одной активной сессии на клиента: проверяет сама БД
+        db.Index(
+            "uq_client_parking_active_client",
+            "client_id",
+            unique=True,
+            sqlite_where=db.text("time_out IS NULL"),
+        ),
+        # id удаленной или перенесенной в архив сессии не выдается повторно:
+        # на него ссылаются payment_intent и client_parking_history
+        {"sqlite_autoincrement": True},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     client_id = db.Column(db.Integer, db.ForeignKey("client.id"), nullable=False)
@@ -52,4 +76,108 @@ class ClientParking(db.Model):  # type: ignore
         return f"Лог парковки клиента {self.client_id}"
 
     def to_json(self) -> Dict[str, Any]:
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        return client_parking_to_json(self)
+
+
+class ClientParkingHistory(db.Model):  # type: ignore
+    """Архив закрытых сессий: строки client_parking с прежними id
+
+    Сессии переносит parking_app.archive, активные запросы заезда и
+    выезда работают только с client_parking.
+    """
+
+    __tablename__ = "client_parking_history"
+    __table_args__ = (
+        db.Index("ix_client_parking_history_client", "client_id"),
+        db.Index("ix_client_parking_history_parking", "parking_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    client_id = db.Column(db.Integer, db.ForeignKey("client.id"), nullable=False)
+    parking_id = db.Column(db.Integer, db.ForeignKey("parking.id"), nullable=False)
+    time_in = db.Column(db.DateTime, nullable=True)
+    time_out = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"Архивный лог парковки клиента {self.client_id}"
+
+
+class ParkingHourlyStats(db.Model):  # type: ignore
+    """Почасовые итоги парковки: заезды и выезды за час и занятое время
+
+    occupied_seconds - сумма времени стоянки закрытых сессий внутри часа;
+    сессия попадает в итоги при выезде.
+    """
+
+    __tablename__ = "parking_hourly_stats"
+
+    parking_id = db.Column(db.Integer, db.ForeignKey("parking.id"), primary_key=True)
+    # Начало часа
+    bucket = db.Column(db.DateTime, primary_key=True)
+    entries = db.Column(db.Integer, nullable=False, default=0)
+    exits = db.Column(db.Integer, nullable=False, default=0)
+    occupied_seconds = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"Итоги парковки {self.parking_id} за {self.bucket}"
+
+
+class PaymentIntent(db.Model):  # type: ignore
+    """Платеж за сессию в очереди на списание (outbox)
+
+    Создается при выезде в той же транзакции, что и закрытие сессии;
+    списание выполняют фоновые воркеры parking_app.payments.
+    """
+
+    __tablename__ = "payment_intent"
+    __table_args__ = (
+        # Выбор платежей, готовых к списанию
+        db.Index("ix_payment_intent_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Сессия может уйти в архив, поэтому без внешнего ключа
+    client_parking_id = db.Column(db.Integer, nullable=False, unique=True)
+    client_id = db.Column(db.Integer, db.ForeignKey("client.id"), nullable=False)
+    # Сумма в копейках
+    amount = db.Column(db.Integer, nullable=False)
+    # pending, processing, succeeded или failed
+    status = db.Column(db.String(10), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False)
+    # До этого момента платеж принадлежит воркеру, взявшему его в работу
+    locked_until = db.Column(db.DateTime, nullable=True)
+    charge_id = db.Column(db.String(64), nullable=True)
+    last_error = db.Column(db.String(200), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"Платеж {self.id} клиента {self.client_id}"
+
+
+class IdempotencyKey(db.Model):  # type: ignore
+    """Ответ на запрос с заголовком Idempotency-Key, см. parking_app.idempotency"""
+
+    __tablename__ = "idempotency_key"
+
+    key = db.Column(db.String(64), primary_key=True)
+    # sha256 метода, пути и данных запроса
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.Integer, nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    # Удаление устаревших ключей
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"Ключ идемпотентности {self.key}"
+
+
+# Сериализаторы собираются один раз по колонкам таблиц
+client_to_json = compile_object_serializer(Client.__table__)
+parking_to_json = compile_object_serializer(Parking.__table__)
+client_parking_to_json = compile_object_serializer(ClientParking.__table__)
+
+# Сериализаторы строк Core-запросов select(*Model.__table__.columns)
+client_row_to_json = compile_row_serializer(Client.__table__)
+client_parking_row_to_json = compile_row_serializer(ClientParking.__table__)
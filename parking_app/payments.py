@@ -0,0 +1,321 @@
+"""Списание оплаты за парковку через очередь payment_intent (outbox)
+
+Выезд только записывает платеж в payment_intent в той же транзакции, что
+и закрытие сессии: шлагбаум открывается после коммита и не ждет
+процессинга. Фоновые воркеры (PeriodicJob, PAYMENT_WORKERS потоков)
+забирают готовые платежи порциями и списывают их вне транзакции:
+
+1. захват порции - один UPDATE ... RETURNING в короткой транзакции:
+   pending -> processing, attempts + 1, locked_until = now + PAYMENT_LEASE.
+   Запись в SQLite последовательна, поэтому два воркера не получат один
+   платеж; платеж упавшего воркера снова доступен после locked_until;
+2. перед списанием каждого платежа его аренда продлевается. Если платеж
+   уже взял другой воркер (аренда истекла, пока списывались предыдущие),
+   он пропускается;
+3. списание через процессор из app.extensions["payment_processor"] с
+   ключом идемпотентности платежа: повторный вызов с тем же ключом не
+   списывает деньги второй раз, даже если аренда истекла во время
+   самого списания;
+4. запись итога: succeeded, failed или pending с next_attempt_at по
+   экспоненциальной задержке. Итог пишется, только если платеж все еще
+   принадлежит этой попытке (status и attempts не изменились), и
+   фиксируется вместе с продлением аренды следующего платежа порции.
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import click
+from flask import Flask, current_app
+from flask.cli import with_appcontext
+from sqlalchemy import and_, insert, or_, select, update
+
+from .app import db
+from .jobs import register_job
+from .models import Client, PaymentIntent
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentError(Exception):
+    """Отказ процессора; retryable - можно повторить позже"""
+
+    retryable = False
+
+
+class PaymentDeclined(PaymentError):
+    """Списание отклонено: повтор не поможет"""
+
+
+class PaymentUnavailable(PaymentError):
+    """Процессор недоступен или не ответил вовремя"""
+
+    retryable = True
+
+
+class StubProcessor:
+    """Процессор для разработки и тестов: списывает без обращения к банку
+
+    failures - исключения, которые выбрасываются по одному на первые
+    вызовы charge, до успешных списаний. Как и настоящий процессор,
+    заглушка помнит ключи идемпотентности списаний.
+    """
+
+    def __init__(self, failures: Iterable[Exception] = ()):
+        self.failures = list(failures)
+        self.charges: List[Tuple[str, str, int]] = []
+        self._charge_ids: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def charge(self, idempotency_key: str, card: str, amount: int) -> str:
+        """Списание amount копеек с карты card, возвращает id операции процессора
+
+        Повторный вызов с тем же idempotency_key возвращает id прежнего
+        списания и ничего не списывает.
+        """
+        with self._lock:
+            if idempotency_key in self._charge_ids:
+                return self._charge_ids[idempotency_key]
+            if self.failures:
+                raise self.failures.pop(0)
+            self.charges.append((idempotency_key, card, amount))
+            charge_id = f"stub-{len(self.charges)}"
+            self._charge_ids[idempotency_key] = charge_id
+        return charge_id
+
+
+PROCESSORS = {"stub": StubProcessor}
+
+# Статус платежа после попытки -> счетчик в итогах порции
+OUTCOMES = {"succeeded": "succeeded", "pending": "retried", "failed": "failed"}
+
+# Запрос постановки платежа в очередь собирается один раз: выезд только
+# подставляет значения колонок
+INSERT_INTENT = insert(PaymentIntent.__table__).returning(PaymentIntent.__table__.c.id)
+
+
+def init_payments(app: Flask) -> None:
+    """Процессор платежей, воркеры очереди и команда flask process-payments
+
+    PAYMENT_PROCESSOR - имя из PROCESSORS или готовый объект процессора.
+    """
+    processor = app.config["PAYMENT_PROCESSOR"]
+    if isinstance(processor, str):
+        processor = PROCESSORS[processor]()
+    app.extensions["payment_processor"] = processor
+    app.cli.add_command(process_payments_command)
+    for index in range(app.config["PAYMENT_WORKERS"]):
+        register_job(
+            app,
+            f"payments-{index}",
+            app.config["PAYMENT_POLL_INTERVAL"],
+            drain_payments,
+        )
+
+
+def create_payment_intent(
+    client_parking_id: int, client_id: int, amount: int, created_at: datetime
+) -> int:
+    """Запись платежа в amount копеек в очередь без фиксации транзакции
+
+    Возвращает id платежа.
+    """
+    return db.session.execute(
+        INSERT_INTENT,
+        {
+            "client_parking_id": client_parking_id,
+            "client_id": client_id,
+            "amount": amount,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": created_at,
+            "created_at": created_at,
+        },
+    ).scalar_one()
+
+
+def idempotency_key(intent_id: int) -> str:
+    """Ключ идемпотентности списания: один на платеж при всех попытках"""
+    return f"payment-intent-{intent_id}"
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Задержка перед следующей попыткой после attempts неудачных"""
+    config = current_app.config
+    seconds = config["PAYMENT_RETRY_BASE"] * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, config["PAYMENT_RETRY_MAX"]))
+
+
+def claim_payments(batch_size: int, now: datetime) -> List[Tuple[int, int, int, int]]:
+    """Захват порции платежей и фиксация транзакции
+
+    Возвращает (id, id клиента, сумма, номер попытки) захваченных платежей.
+    """
+    ready = or_(
+        and_(PaymentIntent.status == "pending", PaymentIntent.next_attempt_at <= now),
+        # Воркер, взявший платеж, не записал итог до конца аренды
+        and_(PaymentIntent.status == "processing", PaymentIntent.locked_until < now),
+    )
+    ids = (
+        select(PaymentIntent.id)
+        .where(ready)
+        .order_by(PaymentIntent.next_attempt_at)
+        .limit(batch_size)
+        .scalar_subquery()
+    )
+    rows = db.session.execute(
+        update(PaymentIntent)
+        .where(PaymentIntent.id.in_(ids))
+        .values(
+            status="processing",
+            attempts=PaymentIntent.attempts + 1,
+            locked_until=now + timedelta(seconds=current_app.config["PAYMENT_LEASE"]),
+        )
+        .returning(
+            PaymentIntent.id,
+            PaymentIntent.client_id,
+            PaymentIntent.amount,
+            PaymentIntent.attempts,
+        )
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+    return [tuple(row) for row in rows]  # type: ignore[misc]
+
+
+def process_payments(
+    batch_size: Optional[int] = None, now: Optional[datetime] = None
+) -> Dict[str, int]:
+    """Одна порция очереди: захват, списание и запись итогов
+
+    Возвращает число захваченных платежей и итогов по видам; платежи,
+    которые во время порции взял другой воркер, в итоги не входят.
+    """
+    processor = current_app.extensions["payment_processor"]
+    batch_size = batch_size or current_app.config["PAYMENT_BATCH_SIZE"]
+    claimed = claim_payments(batch_size, now or datetime.now())
+    counts = {"claimed": len(claimed), "succeeded": 0, "retried": 0, "failed": 0}
+    if not claimed:
+        return counts
+
+    client_ids = {client_id for _, client_id, _, _ in claimed}
+    rows = db.session.execute(
+        select(Client.id, Client.credit_card).where(Client.id.in_(client_ids))
+    )
+    cards: Dict[int, Optional[str]] = {client_id: card for client_id, card in rows}
+    # Чтение карт не должно держать транзакцию на время списания
+    db.session.commit()
+
+    outcome: Optional[Tuple[int, int, Dict[str, Any]]] = None
+    for intent_id, client_id, amount, attempts in claimed:
+        # Итог предыдущего платежа фиксируется вместе с продлением аренды
+        # текущего: платеж не остается без итога до конца порции
+        if outcome is not None:
+            record_outcome(*outcome)
+            outcome = None
+        owned = renew_lease(intent_id, attempts)
+        db.session.commit()
+        if not owned:
+            logger.info("Платеж %s уже взял другой воркер", intent_id)
+            continue
+        values = charge_outcome(
+            processor, intent_id, cards.get(client_id), amount, attempts
+        )
+        counts[OUTCOMES[values["status"]]] += 1
+        outcome = intent_id, attempts, values
+    if outcome is not None:
+        record_outcome(*outcome)
+        db.session.commit()
+    return counts
+
+
+def owned_by(intent_id: int, attempts: int) -> Any:
+    """Условие: платеж все еще принадлежит попытке attempts"""
+    return and_(
+        PaymentIntent.id == intent_id,
+        PaymentIntent.status == "processing",
+        PaymentIntent.attempts == attempts,
+    )
+
+
+def renew_lease(intent_id: int, attempts: int) -> bool:
+    """Продление аренды платежа перед списанием без фиксации транзакции
+
+    False - аренда истекла, и платеж уже взял другой воркер.
+    """
+    lease = timedelta(seconds=current_app.config["PAYMENT_LEASE"])
+    result = db.session.execute(
+        update(PaymentIntent)
+        .where(owned_by(intent_id, attempts))
+        .values(locked_until=datetime.now() + lease)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1  # type: ignore[attr-defined]
+
+
+def record_outcome(intent_id: int, attempts: int, values: Dict[str, Any]) -> None:
+    """Запись итога списания без фиксации транзакции"""
+    db.session.execute(
+        update(PaymentIntent)
+        .where(owned_by(intent_id, attempts))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def charge_outcome(
+    processor, intent_id: int, card: Optional[str], amount: int, attempts: int
+) -> Dict[str, Any]:
+    """Списание одного платежа, возвращает новые значения его колонок"""
+    try:
+        if not card:
+            raise PaymentDeclined("У клиента не привязана карта")
+        charge_id = processor.charge(idempotency_key(intent_id), card, amount)
+    except Exception as error:
+        if isinstance(error, PaymentError):
+            retryable = error.retryable
+        else:
+            # Неожиданная ошибка процессора считается временной
+            logger.exception("Ошибка списания платежа %s", intent_id)
+            retryable = True
+        values: Dict[str, Any] = {"locked_until": None, "last_error": str(error)[:200]}
+        if retryable and attempts < current_app.config["PAYMENT_MAX_ATTEMPTS"]:
+            values["status"] = "pending"
+            values["next_attempt_at"] = datetime.now() + retry_delay(attempts)
+        else:
+            values["status"] = "failed"
+            values["completed_at"] = datetime.now()
+        return values
+    return {
+        "status": "succeeded",
+        "charge_id": charge_id,
+        "locked_until": None,
+        "last_error": None,
+        "completed_at": datetime.now(),
+    }
+
+
+def drain_payments() -> None:
+    """Периодическая задача: порции очереди, пока есть готовые платежи"""
+    while process_payments()["claimed"]:
+        pass
+
+
+@click.command("process-payments")
+@with_appcontext
+@click.option("--batch-size", type=int, help="Платежей в одной порции")
+def process_payments_command(batch_size: Optional[int]) -> None:
+    """Списание всех готовых платежей из очереди"""
+    totals = {"succeeded": 0, "retried": 0, "failed": 0}
+    while True:
+        counts = process_payments(batch_size)
+        if not counts["claimed"]:
+            break
+        for name in totals:
+            totals[name] += counts[name]
+    click.echo(
+        f"Списано: {totals['succeeded']}, отложено: {totals['retried']}, "
+        f"отклонено: {totals['failed']}"
+    )
@@ -0,0 +1,68 @@
+from typing import Optional
+
+from flask import Flask, current_app, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import object_session
+
+from .app import db
+from .cache import LRUCache
+from .models import Client
+
+
+def init_plate_cache(app: Flask) -> None:
+    """Создание кэша номер автомобиля -> id клиента для приложения"""
+    app.extensions["plate_cache"] = LRUCache(
+        app.config["PLATE_CACHE_SIZE"], ttl=app.config["PLATE_CACHE_TTL"]
+    )
+
+
+def resolve_client_id(car_number: str) -> Optional[int]:
+    """Поиск id клиента по номеру автомобиля через кэш
+
+    Отсутствующие номера не кэшируются, поэтому новый клиент находится сразу.
+    Записи других процессов становятся видны не позже чем через PLATE_CACHE_TTL.
+    """
+    cache = current_app.extensions["plate_cache"]
+    client_id = cache.get(car_number)
+    if client_id is None:
+        client_id = db.session.scalar(
+            select(Client.id).where(Client.car_number == car_number)
+        )
+        if client_id is not None:
+            cache.set(car_number, client_id)
+    return client_id
+
+
+@event.listens_for(Client, "after_insert")
+@event.listens_for(Client, "after_update")
+@event.listens_for(Client, "after_delete")
+def track_client_plates(mapper, connection, target):
+    """Номера записанного клиента сбрасываются из кэша после коммита
+
+    Сброс при flush не годится: запрос другого потока между flush и
+    коммитом или откат транзакции вернули бы в кэш прежнего владельца.
+    """
+    session = object_session(target)
+    if session is None:
+        return
+    plates = session.info.setdefault("plates", set())
+    history = inspect(target).attrs.car_number.history
+    for car_number in (*history.deleted, target.car_number):
+        if car_number:
+            plates.add(car_number)
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_plates(session):
+    plates = session.info.pop("plates", None)
+    if plates and has_app_context():
+        cache = current_app.extensions.get("plate_cache")
+        if cache is not None:
+            for car_number in plates:
+                cache.invalidate(car_number)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def discard_plates(session, previous_transaction):
+    session.info.pop("plates", None)
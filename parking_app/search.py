@@ -0,0 +1,113 @@
+"""Поиск клиентов по имени, фамилии и номеру автомобиля
+
+Индекс - виртуальная таблица FTS5 client_fts (вторая миграция схемы):
+строки client она не копирует, а триггеры на client обновляют индекс в
+той же транзакции, что и изменение клиента.
+
+Каждое слово запроса ищется как начало слова в любой из трех колонок,
+все слова запроса должны найтись. Точное совпадение слова весит больше
+совпадения начала, номер автомобиля больше фамилии, фамилия больше
+имени (bm25 с весами колонок, см. миграцию).
+
+Ранжирование bm25 обходит все совпадения, и на миллионе клиентов запрос
+из одной буквы совпал бы с сотней тысяч строк (ранжирование всех строк -
+сотни миллисекунд). Поэтому ранжируются только первые SEARCH_RANK_WINDOW
+совпадений в порядке id. Если совпадений больше, выдача неполная:
+подходящий клиент за окном в нее не попадет, и каждая страница такой
+выдачи об этом сообщает (truncated), чтобы запрос уточнили. Страницы
+выдачи - ключ (rank, id) последней строки.
+"""
+
+import math
+import re
+from typing import Any, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, column, literal_column, or_, select, table
+
+from .app import db
+from .models import Client
+
+# Слово запроса: так же делит текст токенизатор unicode61 индекса
+SEARCH_WORD = re.compile(r"\w+")
+# Слов запроса сверх этого числа не учитываются
+MAX_SEARCH_WORDS = 8
+
+client_fts = table("client_fts", column("rowid"), column("rank"))
+
+Cursor = Tuple[float, int]
+
+
+def match_expression(query: str) -> Optional[str]:
+    """Запрос FTS5 из строки поиска; None - в строке нет ни одного слова
+
+    Слова берутся в кавычки, поэтому синтаксис FTS5 в строке поиска
+    (AND, NEAR, *, двоеточие) ищется как обычный текст.
+    """
+    words = SEARCH_WORD.findall(query.lower())[:MAX_SEARCH_WORDS]
+    if not words:
+        return None
+    return " AND ".join(f'("{word}" OR "{word}"*)' for word in words)
+
+
+def format_cursor(rank: float, client_id: int) -> str:
+    return f"{rank!r}:{client_id}"
+
+
+def parse_cursor(value: str) -> Cursor:
+    """Курсор из заголовка X-Next-Cursor; ValueError, если он испорчен"""
+    rank, client_id = value.rsplit(":", 1)
+    cursor = float(rank), int(client_id)
+    if not math.isfinite(cursor[0]):
+        raise ValueError(value)
+    return cursor
+
+
+def search_clients(
+    expression: str, limit: int, window: int, cursor: Optional[Cursor] = None
+) -> Tuple[Sequence[Any], Optional[str], bool]:
+    """Страница найденных клиентов, курсор следующей страницы и признак
+    неполной выдачи (совпадений больше window)
+
+    Строки - колонки client в их порядке, rank и truncated. Один запрос:
+    совпадения ранжируются и режутся до страницы по индексу, и только
+    строки страницы читаются из client по первичному ключу. Есть ли
+    совпадение за окном, проверяет некоррелированный EXISTS по id без
+    ранжирования: SQLite вычисляет его один раз.
+    """
+    match = literal_column("client_fts").match(expression)
+    matches = (
+        select(client_fts.c.rowid, client_fts.c.rank)
+        .where(match)
+        .limit(window)
+        .subquery("matches")
+    )
+    beyond_window = (
+        select(client_fts.c.rowid).where(match).limit(1).offset(window).exists()
+    )
+    # Читаем на одну строку больше, чтобы понять, есть ли следующая страница
+    page = select(matches).order_by(matches.c.rank, matches.c.rowid).limit(limit + 1)
+    if cursor is not None:
+        rank, after_id = cursor
+        page = page.where(
+            or_(
+                matches.c.rank > rank,
+                and_(matches.c.rank == rank, matches.c.rowid > after_id),
+            )
+        )
+    page_rows = page.subquery("page")
+    query = (
+        select(
+            *Client.__table__.columns,
+            page_rows.c.rank,
+            beyond_window.label("truncated"),
+        )
+        .join_from(page_rows, Client, Client.id == page_rows.c.rowid)
+        .order_by(page_rows.c.rank, page_rows.c.rowid)
+    )
+
+    rows = db.session.execute(query).all()
+    truncated = bool(rows) and bool(rows[0].truncated)
+    if len(rows) <= limit:
+        return rows, None, truncated
+    last = rows[limit - 1]
+    return rows[:limit], format_cursor(last.rank, last.id), truncated
@@ -0,0 +1,62 @@
+import json
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict
+
+from sqlalchemy import DateTime, Table
+
+Serializer = Callable[[Any], Dict[str, Any]]
+
+WEEKDAYS = "Mon Tue Wed Thu Fri Sat Sun".split()
+MONTHS = "Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec".split()
+
+
+def compile_object_serializer(table: Table) -> Serializer:
+    """Функция объект модели -> словарь по колонкам таблицы
+
+    Список колонок читается один раз, результат - функция с литералом
+    словаря, без обхода __table__.columns и getattr на каждый вызов.
+    Значения возвращаются как есть.
+    """
+    items = ", ".join(f"{c.name!r}: obj.{c.name}" for c in table.columns)
+    return _compile(f"def serialize(obj):\n    return {{{items}}}\n")
+
+
+def compile_row_serializer(table: Table) -> Serializer:
+    """Функция строка Core-запроса -> словарь, готовый к json.dumps
+
+    Строка должна содержать колонки таблицы в их порядке, например
+    результат select(*table.columns). Дата и время форматируются так же,
+    как их выводит jsonify, поэтому ответы API не меняются.
+    """
+    items = []
+    for index, column in enumerate(table.columns):
+        value = f"row[{index}]"
+        if isinstance(column.type, DateTime):
+            value = f"_date({value}) if {value} is not None else None"
+        items.append(f"{column.name!r}: {value}")
+    return _compile(f"def serialize(row):\n    return {{{', '.join(items)}}}\n")
+
+
+def http_date(value: datetime) -> str:
+    """Дата в формате RFC 822, как ее выводит jsonify (werkzeug.http.http_date)
+
+    Собирается f-строкой без email.utils, поэтому в разы быстрее. Время без часового
+    пояса считается UTC.
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return (
+        f"{WEEKDAYS[value.weekday()]}, {value.day:02d} {MONTHS[value.month - 1]} "
+        f"{value.year:04d} {value.hour:02d}:{value.minute:02d}:{value.second:02d} GMT"
+    )
+
+
+def dumps(value: Any) -> str:
+    """JSON без пробелов и без экранирования не-ASCII символов"""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _compile(source: str) -> Serializer:
+    namespace: Dict[str, Any] = {"_date": http_date}
+    exec(source, namespace)
+    return namespace["serialize"]
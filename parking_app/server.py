@@ -0,0 +1,295 @@
+"""Многопроцессный сервер приложения на стандартной библиотеке
+
+Мастер создает приложение один раз (preload), открывает слушающий сокет и
+запускает fork воркеров. Воркеры принимают соединения с общего сокета:
+сокет неблокирующий, поэтому воркер, которого опередил другой, не
+зависает в accept. Каждый воркер - WSGI-сервер wsgiref с потоком на
+соединение (потоки нужны долгим ответам SSE).
+
+- Воркер перезапускается после SERVER_MAX_REQUESTS запросов (со случайной
+  добавкой до SERVER_MAX_REQUESTS_JITTER, чтобы воркеры не уходили
+  одновременно): перестает принимать соединения, дожидается начатых
+  запросов и завершается, мастер запускает новый.
+- SIGTERM и SIGINT мастеру - плавная остановка: воркеры получают SIGTERM и
+  SERVER_GRACEFUL_TIMEOUT секунд на начатые запросы, затем SIGKILL.
+- Соединения с БД не переходят через fork: мастер закрывает пул до запуска
+  воркеров, воркер сбрасывает унаследованный пул.
+- Фоновые задачи запускаются после fork: задачи с every_process - в каждом
+  воркере, остальные - в воркере первого слота.
+
+Счетчики версий таблиц и свободных мест создаются до fork в разделяемой
+памяти и общие для воркеров. Подписчики SSE свои у каждого воркера, но
+его рассылка опрашивает общие счетчики и узнает о заездах через другие
+воркеры не позже чем через SSE_POLL_INTERVAL. Остальное состояние в
+памяти свое у каждого воркера: кэши и метрики /metrics.
+"""
+
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from socketserver import ThreadingMixIn
+from typing import Dict, Optional, Tuple, Union
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from flask import Flask
+
+from .app import create_app, db
+from .jobs import start_jobs
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед повторным запуском воркера, завершившегося с ошибкой, секунд
+RESPAWN_DELAY = 1.0
+
+
+class RequestHandler(WSGIRequestHandler):
+    """Обработчик wsgiref без строки журнала на каждый запрос"""
+
+    def log_request(self, code="-", size="-"):
+        pass
+
+
+class WorkerServer(ThreadingMixIn, WSGIServer):
+    """WSGI-сервер воркера на общем слушающем сокете
+
+    max_requests - сколько соединений принять до остановки (0 - без
+    ограничения).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, listener: socket.socket, app: Flask, max_requests: int = 0):
+        super().__init__(
+            listener.getsockname(), RequestHandler, bind_and_activate=False
+        )
+        self.socket.close()
+        self.socket = listener
+        host, port = listener.getsockname()[:2]
+        self.server_name = socket.getfqdn(host)
+        self.server_port = port
+        self.setup_environ()
+        self.set_app(app)
+        self.max_requests = max_requests
+        self.handled = 0
+        self.active = 0
+        self._idle = threading.Condition()
+        self._stopping = False
+
+    def process_request(self, request, client_address):
+        with self._idle:
+            self.active += 1
+            self.handled += 1
+            recycle = self.max_requests and self.handled >= self.max_requests
+        if recycle:
+            self.stop()
+        super().process_request(request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            with self._idle:
+                self.active -= 1
+                self._idle.notify_all()
+
+    def stop(self) -> None:
+        """Прекращение приема соединений; можно вызывать из любого потока"""
+        with self._idle:
+            if self._stopping:
+                return
+            self._stopping = True
+        # shutdown ждет выхода из serve_forever, поэтому не в его потоке
+        threading.Thread(target=self.shutdown, daemon=True).start()
+
+    def wait_idle(self, timeout: Optional[float]) -> bool:
+        """Ожидание завершения начатых запросов; False - не дождались"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self.active == 0, timeout)
+
+
+def run_worker(
+    app: Flask,
+    listener: socket.socket,
+    max_requests: int,
+    all_jobs: bool,
+    graceful_timeout: float,
+) -> None:
+    """Цикл воркера после fork: до SIGTERM или max_requests запросов"""
+    server = WorkerServer(listener, app, max_requests)
+    # Ctrl+C получает вся группа процессов, воркеров останавливает мастер
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+    with app.app_context():
+        # Соединения пула мастера не закрываются: они принадлежат ему
+        db.engine.dispose(close=False)
+    start_jobs(app, every_process_only=not all_jobs)
+
+    server.serve_forever(poll_interval=0.5)
+    if not server.wait_idle(graceful_timeout):
+        logger.warning(
+            "Воркер %s: запросы не завершились за отведенное время", os.getpid()
+        )
+
+
+class PreforkServer:
+    """Мастер: слушающий сокет и fork воркеров с перезапуском
+
+    Параметры по умолчанию берутся из настроек SERVER_* приложения.
+    run_jobs - запускать ли фоновые задачи в воркерах; само приложение
+    создается без запуска задач, чтобы потоки не оказались в мастере.
+    """
+
+    def __init__(
+        self,
+        app: Flask,
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        workers: Optional[int] = None,
+        max_requests: Optional[int] = None,
+        run_jobs: bool = True,
+    ):
+        config = app.config
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers or config["SERVER_WORKERS"]
+        self.max_requests = (
+            config["SERVER_MAX_REQUESTS"] if max_requests is None else max_requests
+        )
+        self.max_requests_jitter = config["SERVER_MAX_REQUESTS_JITTER"]
+        self.graceful_timeout = config["SERVER_GRACEFUL_TIMEOUT"]
+        self.backlog = config["SERVER_BACKLOG"]
+        self.run_jobs = run_jobs
+        self.listener: Optional[socket.socket] = None
+        # pid воркера -> номер слота
+        self._children: Dict[int, int] = {}
+        self._respawn_at: Dict[int, float] = {}
+        self._stopping = False
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        assert self.listener is not None
+        return self.listener.getsockname()[:2]
+
+    def bind(self) -> None:
+        """Открытие слушающего сокета; port=0 - свободный порт"""
+        self.listener = socket.create_server(
+            (self.host, self.port), backlog=self.backlog
+        )
+        self.listener.setblocking(False)
+
+    def run(self) -> None:
+        """Работа мастера до SIGTERM или SIGINT"""
+        if self.listener is None:
+            self.bind()
+        with self.app.app_context():
+            db.engine.dispose()
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        logger.info("Сервер на %s:%s, воркеров: %s", *self.address, self.workers)
+        try:
+            while not self._stopping:
+                self._reap()
+                self._spawn_missing()
+                time.sleep(0.1)
+        finally:
+            self._shutdown()
+
+    def stop(self) -> None:
+        self._stopping = True
+
+    def _handle_stop(self, signum, frame) -> None:
+        self.stop()
+
+    def _spawn_missing(self) -> None:
+        busy = set(self._children.values())
+        now = time.monotonic()
+        for slot in range(self.workers):
+            if slot not in busy and self._respawn_at.get(slot, 0) <= now:
+                self._spawn(slot)
+
+    def _spawn(self, slot: int) -> None:
+        max_requests = self.max_requests
+        if max_requests:
+            max_requests += random.randint(0, self.max_requests_jitter)
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                assert self.listener is not None
+                run_worker(
+                    self.app,
+                    self.listener,
+                    max_requests,
+                    self.run_jobs and slot == 0,
+                    self.graceful_timeout,
+                )
+            except BaseException:
+                logger.exception("Воркер %s завершился с ошибкой", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        self._children[pid] = slot
+
+    def _reap(self) -> None:
+        """Учет завершившихся воркеров"""
+        while self._children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            slot = self._children.pop(pid, None)
+            code = os.waitstatus_to_exitcode(status)
+            if code != 0 and slot is not None and not self._stopping:
+                logger.warning("Воркер %s завершился с кодом %s", pid, code)
+                self._respawn_at[slot] = time.monotonic() + RESPAWN_DELAY
+
+    def _shutdown(self) -> None:
+        """Плавная остановка воркеров, затем SIGKILL оставшимся"""
+        self._signal_children(signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self._children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.05)
+        self._signal_children(signal.SIGKILL)
+        for pid in list(self._children):
+            os.waitpid(pid, 0)
+            del self._children[pid]
+        if self.listener is not None:
+            self.listener.close()
+
+    def _signal_children(self, signum: int) -> None:
+        for pid in self._children:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+
+def serve(
+    profile: Union[str, object] = "default",
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    workers: Optional[int] = None,
+    max_requests: Optional[int] = None,
+    run_jobs: bool = True,
+) -> None:
+    """Создание приложения и работа многопроцессного сервера до остановки"""
+    app = create_app(profile, {"START_BACKGROUND_JOBS": False})
+    with app.app_context():
+        in_memory = db.engine.url.database in (None, "", ":memory:")
+    if in_memory:
+        raise ValueError("База в памяти не может быть общей для воркеров")
+    server = PreforkServer(
+        app,
+        host,
+        port,
+        workers=workers,
+        max_requests=max_requests,
+        run_jobs=run_jobs,
+    )
+    server.run()
@@ -0,0 +1,211 @@
+from datetime import datetime
+from typing import Any, Dict, Tuple
+
+from flask import current_app
+from sqlalchemy import bindparam, func, select, text, update
+
+from .app import db
+from .availability import track_availability
+from .models import Client, ClientParking, Parking, client_parking_row_to_json
+from .payments import create_payment_intent
+from .plates import resolve_client_id
+from .stats import record_entry, record_exit
+from .tariffs import to_rubles
+
+# Тело ответа и HTTP-статус операции
+Result = Tuple[Dict[str, Any], int]
+
+# Запросы заезда и выезда собраны один раз на уровне модуля и отличаются
+# только параметрами: SQLAlchemy запоминает ключ кэша у экземпляра запроса
+# и не строит выражения заново, поэтому событие пакета стоит только
+# выполнения запросов. Запросы работают с таблицами, а не с моделями: путь
+# массового UPDATE ORM здесь не нужен
+clients = Client.__table__
+parkings = Parking.__table__
+sessions = ClientParking.__table__
+
+CLIENT_EXISTS = select(clients.c.id).where(clients.c.id == bindparam("client"))
+
+# Занятие места: проверка и уменьшение счётчика выполняются атомарно в БД
+TAKE_PLACE = (
+    update(parkings)
+    .where(
+        parkings.c.id == bindparam("parking"),
+        parkings.c.opened.is_(True),
+        parkings.c.count_available_places > 0,
+    )
+    .values(count_available_places=parkings.c.count_available_places - 1)
+    .returning(parkings.c.count_available_places)
+)
+
+RELEASE_PLACE = (
+    update(parkings)
+    .where(parkings.c.id == bindparam("parking"))
+    .values(count_available_places=parkings.c.count_available_places + 1)
+    .returning(parkings.c.count_available_places)
+)
+
+# Закрытие активной сессии клиента с привязанной картой
+CLOSE_SESSION = (
+    update(sessions)
+    .where(
+        sessions.c.client_id == bindparam("client"),
+        sessions.c.parking_id == bindparam("parking"),
+        sessions.c.time_out.is_(None),
+        clients.c.id == sessions.c.client_id,
+        func.coalesce(clients.c.credit_card, "") != "",
+    )
+    .values(time_out=bindparam("closed_at"))
+    .returning(*sessions.c)
+)
+
+# Запись о заезде. Повторный заезд отсекает частичный уникальный индекс
+# uq_client_parking_active_client. Текстовый запрос компилируется один раз:
+# INSERT диалекта SQLite с ON CONFLICT не кэшируется SQLAlchemy
+INSERT_SESSION = (
+    text(
+        """
+        INSERT INTO client_parking (client_id, parking_id, time_in)
+        VALUES (:client_id, :parking_id, :time_in)
+        ON CONFLICT (client_id) WHERE time_out IS NULL DO NOTHING
+        RETURNING id, client_id, parking_id, time_in, time_out
+        """
+    )
+    .bindparams(bindparam("time_in", type_=ClientParking.time_in.type))
+    .columns(*ClientParking.__table__.columns)
+)
+
+
+def enter_parking(client_id: int, parking_id: int, check_client: bool = True) -> Result:
+    """Заезд клиента на парковку без фиксации транзакции
+
+    При отказе все изменения, сделанные функцией, уже отменены, поэтому
+    вызывающий может продолжать работу в той же транзакции.
+    """
+    # Проверяем существование клиента
+    if check_client and db.session.scalar(CLIENT_EXISTS, {"client": client_id}) is None:
+        return {"error": "Клиент не найден"}, 404
+
+    # Занимаем место одним условным UPDATE, поэтому несколько воркеров не
+    # могут продать одно и то же место
+    available = db.session.execute(TAKE_PLACE, {"parking": parking_id}).scalar()
+
+    if available is None:
+        # Место не занято - выясняем причину для ответа
+        parking = db.session.get(Parking, parking_id)
+        if not parking:
+            return {"error": "Парковка не найдена"}, 404
+        if not parking.opened:
+            return {"error": "Парковка закрыта"}, 400
+        return {"error": "Нет свободных мест на парковке"}, 400
+
+    # Создаем запись о заезде, если у клиента нет активной
+    new_client_parking = db.session.execute(
+        INSERT_SESSION,
+        {"client_id": client_id, "parking_id": parking_id, "time_in": datetime.now()},
+    ).first()
+
+    if new_client_parking is None:
+        # Возвращаем занятое место
+        release_place(parking_id)
+        return {"error": "Клиент уже находится на парковке"}, 400
+
+    track_availability(parking_id, available)
+    record_entry(parking_id, new_client_parking.time_in)
+
+    return {
+        "message": "Успешный заезд на парковку",
+        "client_parking": client_parking_row_to_json(new_client_parking),
+    }, 201
+
+
+def exit_parking(client_id: int, parking_id: int) -> Result:
+    """Выезд клиента с парковки без фиксации транзакции
+
+    При отказе функция ничего не изменяет в БД.
+    """
+    # Закрываем активную запись одним UPDATE ... FROM client ... RETURNING:
+    # наличие карты проверяется соединением с client, без загрузки объекта
+    client_parking = db.session.execute(
+        CLOSE_SESSION,
+        {"client": client_id, "parking": parking_id, "closed_at": datetime.now()},
+    ).first()
+
+    if client_parking is None:
+        # Ничего не закрыто - выясняем причину для ответа
+        active_parking = (
+            db.session.query(ClientParking.id)
+            .filter(
+                ClientParking.client_id == client_id,
+                ClientParking.parking_id == parking_id,
+                ClientParking.time_out.is_(None),
+            )
+            .first()
+        )
+        if not active_parking:
+            return {"error": "Активная запись о парковке не найдена"}, 404
+        return {"error": "У клиента не привязана карта для оплаты"}, 400
+
+    # Увеличиваем количество свободных мест
+    release_place(parking_id)
+    record_exit(parking_id, client_parking.time_in, client_parking.time_out)
+
+    # Рассчитываем время парковки и стоимость в копейках по тарифу парковки
+    parking_time = client_parking.time_out - client_parking.time_in
+    parking_hours = parking_time.total_seconds() / 3600
+    tariff = current_app.extensions["tariffs"].for_parking(parking_id)
+    cost = tariff.price(client_parking.time_in, client_parking.time_out)
+
+    # Оплата списывается фоновыми воркерами после коммита выезда
+    payment_intent_id = create_payment_intent(
+        client_parking.id, client_id, cost, client_parking.time_out
+    )
+
+    return {
+        "message": "Успешный выезд с парковки",
+        "parking_time_hours": round(parking_hours, 2),
+        "cost": to_rubles(cost),
+        "payment": {"id": payment_intent_id, "status": "pending"},
+        "client_parking": client_parking_row_to_json(client_parking),
+    }, 200
+
+
+def release_place(parking_id: int) -> None:
+    """Освобождение места на парковке"""
+    available = db.session.execute(RELEASE_PLACE, {"parking": parking_id}).scalar()
+    if available is not None:
+        track_availability(parking_id, available)
+
+
+def apply_parking_event(event: Any) -> Result:
+    """Обработка одного события камеры из пакета без фиксации транзакции
+
+    Событие - словарь с action (enter или exit), parking_id и client_id
+    либо car_number. Проверки те же, что у одиночных запросов.
+    """
+    if not isinstance(event, dict):
+        return {"error": "Событие должно быть объектом"}, 400
+
+    action = event.get("action")
+    if action not in ("enter", "exit"):
+        return {"error": "action должен быть enter или exit"}, 400
+
+    parking_id = event.get("parking_id")
+    client_id = event.get("client_id")
+    car_number = event.get("car_number")
+    check_client = True
+
+    if car_number and not client_id:
+        if not parking_id:
+            return {"error": "car_number и parking_id обязательны"}, 400
+        client_id = resolve_client_id(car_number)
+        if client_id is None:
+            return {"error": "Клиент не найден"}, 404
+        check_client = False
+
+    if not client_id or not parking_id:
+        return {"error": "client_id и parking_id обязательны"}, 400
+
+    if action == "enter":
+        return enter_parking(client_id, parking_id, check_client=check_client)
+    return exit_parking(client_id, parking_id)
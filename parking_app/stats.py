@@ -0,0 +1,282 @@
+"""Почасовые итоги загрузки парковок
+
+Заезд и выезд копят свои изменения в сессии, а перед коммитом они
+прибавляются к итогам часов одним UPSERT в той же транзакции, что и сами
+операции: пакет событий пишет итоги один раз, а не на каждое событие.
+Статистика читает только parking_hourly_stats - одну строку на час, без
+обхода истории сессий. Команда flask rebuild-stats пересчитывает итоги из
+истории сессий.
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import click
+from flask import Flask
+from flask.cli import with_appcontext
+from flask_sqlalchemy.session import Session
+from sqlalchemy import bindparam, delete, event, insert, select, text
+
+from .app import db
+from .archive import all_sessions
+from .models import Parking, ParkingHourlyStats
+
+HOUR = timedelta(hours=1)
+# Сколько сессий читается за раз при пересчете
+REBUILD_CHUNK_SIZE = 10000
+
+# Приращения итогов часа: заезды, выезды, секунды стоянки
+Increments = Dict[datetime, List[float]]
+
+
+def init_stats(app: Flask) -> None:
+    """Регистрация команды flask rebuild-stats"""
+    app.cli.add_command(rebuild_stats_command)
+
+
+def hour_bucket(value: datetime) -> datetime:
+    """Начало часа, к которому относится момент value"""
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def occupancy_by_hour(
+    time_in: datetime, time_out: datetime
+) -> Iterator[Tuple[datetime, float]]:
+    """Время стоянки по часам: пары (начало часа, секунд стоянки в нем)"""
+    bucket = hour_bucket(time_in)
+    while bucket < time_out:
+        end = bucket + HOUR
+        seconds = (min(end, time_out) - max(bucket, time_in)).total_seconds()
+        if seconds > 0:
+            yield bucket, seconds
+        bucket = end
+
+
+def add_session(
+    increments: Increments, time_in: datetime, time_out: Optional[datetime]
+) -> None:
+    """Прибавление заезда и, для закрытой сессии, выезда и времени стоянки"""
+    increments.setdefault(hour_bucket(time_in), [0, 0, 0.0])[0] += 1
+    if time_out is not None:
+        add_exit(increments, time_in, time_out)
+
+
+def add_exit(increments: Increments, time_in: datetime, time_out: datetime) -> None:
+    increments.setdefault(hour_bucket(time_out), [0, 0, 0.0])[1] += 1
+    for bucket, seconds in occupancy_by_hour(time_in, time_out):
+        increments.setdefault(bucket, [0, 0, 0.0])[2] += seconds
+
+
+def stats_rows(parking_id: int, increments: Increments) -> List[Dict[str, Any]]:
+    return [
+        {
+            "parking_id": parking_id,
+            "bucket": bucket,
+            "entries": entries,
+            "exits": exits,
+            "occupied_seconds": seconds,
+        }
+        for bucket, (entries, exits, seconds) in increments.items()
+    ]
+
+
+# Прибавление приращений к итогам часа. Текстовый запрос компилируется один
+# раз и берется из кэша: INSERT диалекта SQLite с ON CONFLICT не кэшируется
+# и компилировался бы на каждый заезд и выезд. bucket привязан к типу
+# колонки, чтобы дата записывалась в том же формате, что и через ORM
+UPSERT_STATS = text(
+    """
+    INSERT INTO parking_hourly_stats
+        (parking_id, bucket, entries, exits, occupied_seconds)
+    VALUES (:parking_id, :bucket, :entries, :exits, :occupied_seconds)
+    ON CONFLICT (parking_id, bucket) DO UPDATE SET
+        entries = entries + excluded.entries,
+        exits = exits + excluded.exits,
+        occupied_seconds = occupied_seconds + excluded.occupied_seconds
+    """
+).bindparams(bindparam("bucket", type_=ParkingHourlyStats.bucket.type))
+
+
+def track_stats(parking_id: int, increments: Increments) -> None:
+    """Приращения итогов парковки, которые запишутся перед коммитом"""
+    pending = db.session().info.setdefault("stats", {})
+    for bucket, values in increments.items():
+        totals = pending.setdefault((parking_id, bucket), [0, 0, 0.0])
+        for index, value in enumerate(values):
+            totals[index] += value
+
+
+def record_entry(parking_id: int, time_in: datetime) -> None:
+    """Учет заезда в итогах часа"""
+    track_stats(parking_id, {hour_bucket(time_in): [1, 0, 0.0]})
+
+
+def record_exit(
+    parking_id: int, time_in: Optional[datetime], time_out: datetime
+) -> None:
+    """Учет выезда и времени стоянки по всем часам сессии"""
+    increments: Increments = {}
+    if time_in is None:
+        # Сессия без времени заезда: известен только выезд
+        increments[hour_bucket(time_out)] = [0, 1, 0.0]
+    else:
+        add_exit(increments, time_in, time_out)
+    track_stats(parking_id, increments)
+
+
+@event.listens_for(Session, "before_commit")
+def write_stats(session):
+    """Накопленные приращения - одним UPSERT в фиксируемой транзакции"""
+    pending = session.info.pop("stats", None)
+    if pending:
+        session.execute(
+            UPSERT_STATS,
+            [
+                {
+                    "parking_id": parking_id,
+                    "bucket": bucket,
+                    "entries": entries,
+                    "exits": exits,
+                    "occupied_seconds": seconds,
+                }
+                for (parking_id, bucket), (entries, exits, seconds) in pending.items()
+            ],
+        )
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def discard_stats(session, previous_transaction):
+    session.info.pop("stats", None)
+
+
+def rebuild_stats(parking_id: Optional[int] = None) -> Dict[str, int]:
+    """Пересчет итогов из истории сессий и фиксация транзакции
+
+    Сессии читаются порциями в порядке парковок, поэтому в памяти
+    одновременно только итоги одной парковки. Пересчет идет одной
+    транзакцией: операции других воркеров ждут его окончания и не
+    теряются. Возвращает число сессий и строк итогов.
+    """
+    stats = ParkingHourlyStats.__table__
+    sessions = all_sessions().c
+    query = (
+        select(sessions.parking_id, sessions.time_in, sessions.time_out)
+        .where(sessions.time_in.is_not(None))
+        .order_by(sessions.parking_id)
+    )
+    cleanup = delete(stats)
+    if parking_id is not None:
+        query = query.where(sessions.parking_id == parking_id)
+        cleanup = cleanup.where(stats.c.parking_id == parking_id)
+
+    connection = db.session.connection()
+    connection.execute(cleanup)
+    counts = {"sessions": 0, "buckets": 0}
+
+    def flush(current_parking: int, increments: Increments) -> None:
+        rows = stats_rows(current_parking, increments)
+        if rows:
+            connection.execute(insert(stats), rows)
+        counts["buckets"] += len(rows)
+
+    current: Optional[int] = None
+    increments: Increments = {}
+    result = connection.execution_options(yield_per=REBUILD_CHUNK_SIZE).execute(query)
+    for session_parking, time_in, time_out in result:
+        if session_parking != current:
+            if current is not None:
+                flush(current, increments)
+            current, increments = session_parking, {}
+        add_session(increments, time_in, time_out)
+        counts["sessions"] += 1
+    if current is not None:
+        flush(current, increments)
+
+    db.session.commit()
+    return counts
+
+
+def parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """Дата и время ISO 8601 из параметра запроса, в местном времени без пояса
+
+    Пустое значение - None, неверный формат - ValueError.
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def parking_stats(
+    parking_id: int, start: datetime, end: datetime
+) -> Optional[Dict[str, Any]]:
+    """Почасовая загрузка парковки за [start, end) из итогов
+
+    Часы без строк в итогах возвращаются с нулями. None - парковки нет.
+    """
+    parking = db.session.get(Parking, parking_id)
+    if parking is None:
+        return None
+
+    first = hour_bucket(start)
+    rows = db.session.execute(
+        select(
+            ParkingHourlyStats.bucket,
+            ParkingHourlyStats.entries,
+            ParkingHourlyStats.exits,
+            ParkingHourlyStats.occupied_seconds,
+        ).where(
+            ParkingHourlyStats.parking_id == parking_id,
+            ParkingHourlyStats.bucket >= first,
+            ParkingHourlyStats.bucket < end,
+        )
+    )
+    by_bucket = {
+        bucket: (entries, exits, seconds) for bucket, entries, exits, seconds in rows
+    }
+
+    buckets = []
+    totals = {"entries": 0, "exits": 0, "occupied_hours": 0.0}
+    bucket = first
+    while bucket < end:
+        entries, exits, seconds = by_bucket.get(bucket, (0, 0, 0.0))
+        # Среднее число занятых мест за час
+        occupied = seconds / HOUR.total_seconds()
+        buckets.append(
+            {
+                "bucket": bucket,
+                "entries": entries,
+                "exits": exits,
+                "average_occupied_places": round(occupied, 3),
+                "occupancy": (
+                    round(occupied / parking.count_places, 3)
+                    if parking.count_places
+                    else None
+                ),
+            }
+        )
+        totals["entries"] += entries
+        totals["exits"] += exits
+        totals["occupied_hours"] += occupied
+        bucket += HOUR
+    totals["occupied_hours"] = round(totals["occupied_hours"], 3)
+
+    return {
+        "parking_id": parking_id,
+        "from": first,
+        "to": end,
+        "count_places": parking.count_places,
+        "buckets": buckets,
+        "totals": totals,
+    }
+
+
+@click.command("rebuild-stats")
+@with_appcontext
+@click.option("--parking-id", type=int, help="Пересчитать только эту парковку")
+def rebuild_stats_command(parking_id: Optional[int]) -> None:
+    """Пересчет почасовых итогов парковок из истории сессий"""
+    counts = rebuild_stats(parking_id)
+    click.echo(f"Сессий: {counts['sessions']}, строк итогов: {counts['buckets']}")
@@ -0,0 +1,298 @@
+"""Тарифы парковок и пересчет стоимости закрытых сессий
+
+Тариф - 24 почасовые ставки по времени суток, минимальная стоимость и
+потолок стоимости сессии. Стоимость - интеграл ставки по времени стоянки,
+округленный до целых рублей. Для этого используется накопленная стоимость с
+начала суток: стоимость отрезка равна разности накопленных значений на его
+концах плюс стоимость полных суток между ними.
+
+Суммы в настройках и ответах API - в рублях, а считаются и хранятся они в
+целых копейках: ставки переводятся в копейки через Decimal, поэтому цена
+сессии и платеж - точное целое число без ошибок двоичной дроби.
+
+Выезд считает одну сессию функцией Tariff.price, пересчет истории
+(rebill) - те же формулы над массивами NumPy сразу для порции сессий.
+"""
+
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import accumulate
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Union
+
+import click
+from flask import Flask, current_app
+from flask.cli import with_appcontext
+from sqlalchemy import Float, Integer, cast, func, select
+
+from .app import db
+from .archive import all_sessions
+from .serializers import dumps
+
+HOUR_SECONDS = 60 * 60
+DAY_SECONDS = 24 * HOUR_SECONDS
+EPOCH = datetime(1970, 1, 1)
+
+# Копеек в рубле; стоимость сессии округляется до целых рублей
+KOPECKS = 100
+
+# Сколько сессий пересчитывается за один проход
+REBILL_CHUNK_SIZE = 100000
+
+
+def to_kopecks(rubles: Union[int, float, str, Decimal]) -> int:
+    """Сумма в рублях из настроек - целое число копеек
+
+    Значение переводится в Decimal через строку, поэтому 0.1 рубля - ровно
+    10 копеек. Доли копейки округляются по правилу половины вверх.
+    """
+    value = Decimal(str(rubles)) * KOPECKS
+    return int(value.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_rubles(kopecks: int) -> Union[int, float]:
+    """Сумма в копейках для ответа API: рубли, целое число без копеек"""
+    rubles, rest = divmod(int(kopecks), KOPECKS)
+    return rubles if rest == 0 else kopecks / KOPECKS
+
+
+class Tariff:
+    """Тариф: почасовые ставки по времени суток, минимум и потолок сессии
+
+    Ставки, минимум и потолок задаются в рублях, а хранятся в копейках.
+    """
+
+    def __init__(
+        self,
+        hourly_rates: Sequence[float],
+        minimum: float = 0,
+        cap: Optional[float] = None,
+    ):
+        if len(hourly_rates) != 24:
+            raise ValueError("Тариф должен задавать 24 почасовые ставки")
+        if any(rate < 0 for rate in hourly_rates):
+            raise ValueError("Ставки тарифа не могут быть отрицательными")
+        # Копеек в час
+        self.hourly_rates = [to_kopecks(rate) for rate in hourly_rates]
+        self.minimum = to_kopecks(minimum)
+        self.cap = None if cap is None else to_kopecks(cap)
+        # Стоимость с полуночи до начала каждого часа, последняя - за сутки
+        self.cumulative = list(accumulate(self.hourly_rates, initial=0))
+
+    @classmethod
+    def from_config(cls, settings: Mapping[str, Any]) -> "Tariff":
+        """Тариф из настроек: rate (одна ставка) или hourly_rates, minimum, cap"""
+        rates = settings.get("hourly_rates")
+        if rates is None:
+            rates = [settings["rate"]] * 24
+        return cls(rates, settings.get("minimum", 0), settings.get("cap"))
+
+    def since_midnight(self, seconds: float) -> float:
+        """Стоимость стоянки с полуночи до seconds секунд от начала суток"""
+        hour = min(int(seconds // HOUR_SECONDS), 23)
+        rate = self.hourly_rates[hour]
+        return (
+            self.cumulative[hour]
+            + rate * (seconds - hour * HOUR_SECONDS) / HOUR_SECONDS
+        )
+
+    def charge(self, time_in: datetime, time_out: datetime) -> float:
+        """Стоимость стоянки по ставкам в копейках, без округления и пределов"""
+        start_day, start = divmod((time_in - EPOCH).total_seconds(), DAY_SECONDS)
+        end_day, end = divmod((time_out - EPOCH).total_seconds(), DAY_SECONDS)
+        return (
+            (end_day - start_day) * self.cumulative[24]
+            + self.since_midnight(end)
+            - self.since_midnight(start)
+        )
+
+    def price(self, time_in: datetime, time_out: datetime) -> int:
+        """Стоимость сессии в копейках: до целых рублей и в пределах тарифа"""
+        rubles = round(self.charge(time_in, time_out) / KOPECKS)
+        cost = max(self.minimum, rubles * KOPECKS)
+        if self.cap is not None:
+            cost = min(cost, self.cap)
+        return cost
+
+
+class TariffBook:
+    """Тарифы всех парковок: отдельные по id и тариф по умолчанию"""
+
+    def __init__(self, default: Tariff, by_parking: Mapping[int, Tariff]):
+        self.default = default
+        self.by_parking = dict(by_parking)
+
+    @classmethod
+    def from_config(cls, tariffs: Mapping[Any, Mapping[str, Any]]) -> "TariffBook":
+        """Тарифы из настройки TARIFFS: ключ default и id парковок"""
+        by_parking = {
+            int(key): Tariff.from_config(settings)
+            for key, settings in tariffs.items()
+            if key != "default"
+        }
+        return cls(Tariff.from_config(tariffs["default"]), by_parking)
+
+    def for_parking(self, parking_id: int) -> Tariff:
+        return self.by_parking.get(parking_id, self.default)
+
+    def price_sessions(self, parking_ids, starts, ends):
+        """Стоимость сессий по массивам NumPy
+
+        parking_ids - id парковок, starts и ends - начало и конец сессий в
+        секундах от эпохи Unix. Формулы те же, что у Tariff.price, но
+        ставки выбираются индексами сразу для всего массива. Стоимость - в
+        копейках, целые значения в массиве float.
+        """
+        import numpy as np
+
+        tariffs = [self.default, *self.by_parking.values()]
+        rates = np.array([tariff.hourly_rates for tariff in tariffs])
+        cumulative = np.array([tariff.cumulative for tariff in tariffs])
+        minimum = np.array([tariff.minimum for tariff in tariffs], dtype=float)
+        cap = np.array(
+            [np.inf if tariff.cap is None else tariff.cap for tariff in tariffs]
+        )
+
+        # Номер тарифа для каждой сессии: 0 - тариф по умолчанию
+        lookup = np.zeros(int(parking_ids.max(initial=0)) + 1, dtype=np.intp)
+        for index, parking_id in enumerate(self.by_parking, start=1):
+            if parking_id < len(lookup):
+                lookup[parking_id] = index
+        tariff = lookup[parking_ids]
+
+        def since_midnight(seconds):
+            hour = np.minimum(seconds // HOUR_SECONDS, 23).astype(np.intp)
+            rate = rates[tariff, hour]
+            return (
+                cumulative[tariff, hour]
+                + rate * (seconds - hour * HOUR_SECONDS) / HOUR_SECONDS
+            )
+
+        start_day, start = np.divmod(starts, DAY_SECONDS)
+        end_day, end = np.divmod(ends, DAY_SECONDS)
+        charge = (
+            (end_day - start_day) * cumulative[tariff, 24]
+            + since_midnight(end)
+            - since_midnight(start)
+        )
+        cost = np.rint(charge / KOPECKS) * KOPECKS
+        return np.minimum(np.maximum(cost, minimum[tariff]), cap[tariff])
+
+
+def init_tariffs(app: Flask) -> None:
+    """Тарифы из настройки TARIFFS и команда flask rebill"""
+    app.extensions["tariffs"] = TariffBook.from_config(app.config["TARIFFS"])
+    app.cli.add_command(rebill_command)
+
+
+def unix_seconds(column):
+    """Выражение SQLite: дата и время колонки в секундах от эпохи Unix
+
+    Целые секунды дает strftime('%s'), дробная часть берется из строки
+    хранения как есть. julianday() не подходит: его погрешность сдвигает
+    округление стоимости на границах половины единицы.
+    """
+    seconds = func.strftime("%s", column)
+    fraction = func.substr(column, 20)
+    return cast(seconds, Integer) + cast(fraction, Float)
+
+
+def rebill(
+    book: TariffBook,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    chunk_size: int = REBILL_CHUNK_SIZE,
+) -> Dict[str, Any]:
+    """Пересчет закрытых сессий по тарифам book с итогами по клиентам и парковкам
+
+    Сессии читаются порциями по chunk_size колонками (id клиента, id
+    парковки, начало и конец в секундах) без объектов ORM, цены считаются
+    price_sessions, итоги накапливаются np.bincount по id. since и until
+    ограничивают время заезда. Читаются и активные, и архивные сессии.
+    Суммы копятся в копейках, в итогах - рубли.
+    """
+    import numpy as np
+
+    sessions = all_sessions().c
+    query = select(
+        sessions.client_id,
+        sessions.parking_id,
+        unix_seconds(sessions.time_in),
+        unix_seconds(sessions.time_out),
+    ).where(sessions.time_out.is_not(None))
+    if since is not None:
+        query = query.where(sessions.time_in >= since)
+    if until is not None:
+        query = query.where(sessions.time_in < until)
+
+    # Суммы по id клиента и id парковки: сессии, часы и стоимость
+    totals = {
+        name: {"sessions": np.zeros(0), "hours": np.zeros(0), "cost": np.zeros(0)}
+        for name in ("clients", "parkings")
+    }
+
+    connection = db.session.connection()
+    result = connection.execution_options(yield_per=chunk_size).execute(query)
+    for rows in result.partitions():
+        # Кортежи NumPy разбирает в разы быстрее, чем строки SQLAlchemy
+        columns = np.array([tuple(row) for row in rows], dtype=float)
+        client_ids = columns[:, 0].astype(np.intp)
+        parking_ids = columns[:, 1].astype(np.intp)
+        starts, ends = columns[:, 2], columns[:, 3]
+        costs = book.price_sessions(parking_ids, starts, ends)
+        hours = (ends - starts) / HOUR_SECONDS
+        for name, ids in (("clients", client_ids), ("parkings", parking_ids)):
+            group = totals[name]
+            group["sessions"] = accumulate_by_id(group["sessions"], ids)
+            group["hours"] = accumulate_by_id(group["hours"], ids, hours)
+            group["cost"] = accumulate_by_id(group["cost"], ids, costs)
+
+    summary: Dict[str, Any] = {}
+    for name, group in totals.items():
+        ids = np.flatnonzero(group["sessions"])
+        summary[name] = [
+            {
+                "id": int(item_id),
+                "sessions": int(group["sessions"][item_id]),
+                "hours": round(float(group["hours"][item_id]), 2),
+                "cost": to_rubles(int(group["cost"][item_id])),
+            }
+            for item_id in ids
+        ]
+    summary["sessions"] = sum(item["sessions"] for item in summary["parkings"])
+    summary["cost"] = to_rubles(int(totals["parkings"]["cost"].sum()))
+    return summary
+
+
+def accumulate_by_id(total, ids, weights=None):
+    """Прибавление weights (или единиц) к total по индексам ids"""
+    import numpy as np
+
+    counts = np.bincount(ids, weights=weights)
+    size = len(counts)
+    if size > len(total):
+        total = np.pad(total, (0, size - len(total)))
+    total[:size] += counts
+    return total
+
+
+@click.command("rebill")
+@with_appcontext
+@click.option("--since", type=click.DateTime(), help="Заезды не раньше этой даты")
+@click.option("--until", type=click.DateTime(), help="Заезды раньше этой даты")
+@click.option("--output", type=click.Path(dir_okay=False), help="Файл для JSON итогов")
+def rebill_command(
+    since: Optional[datetime], until: Optional[datetime], output: Optional[str]
+) -> None:
+    """Пересчет стоимости закрытых сессий по текущим тарифам"""
+    summary = rebill(current_app.extensions["tariffs"], since, until)
+    click.echo(f"Сессий: {summary['sessions']}, сумма: {summary['cost']:.2f}")
+    parkings: List[Dict[str, Any]] = summary["parkings"]
+    for item in parkings:
+        click.echo(
+            f"Парковка {item['id']}: сессий {item['sessions']}, "
+            f"часов {item['hours']}, сумма {item['cost']:.2f}"
+        )
+    if output:
+        with open(output, "w") as output_file:
+            output_file.write(dumps(summary))
+        click.echo(f"Итоги по клиентам и парковкам записаны в {output}")
@@ -0,0 +1,151 @@
+"""Версии таблиц для ETag и кэша ответов GET
+
+У каждой таблицы из VERSIONED_MODELS есть счетчик версии, который растет
+после фиксации каждой транзакции, изменившей ее строки через ORM. Запись
+в обход ORM (executemany, INSERT ... SELECT) поднимает версию вызовом
+bump_version. Счетчики лежат в разделяемой памяти (multiprocessing.Value)
+и общие для процессов, запущенных fork после создания приложения.
+
+Записи, о которых счетчики не знают - команды flask, datagen, миграции,
+другой экземпляр приложения на той же БД, - становятся видны не позже чем
+через RESPONSE_CACHE_TTL секунд: к версии добавляется номер окна времени
+этой длины (эпоха). Эпоха считается по часам системы и одинакова во всех
+процессах.
+
+Версия и эпоха дают сильный ETag "<таблица>-<nonce>-<версия>-<эпоха>":
+nonce выбирается при создании приложения, поэтому ETag после перезапуска
+не совпадет со старым. versioned_response отвечает 304 на If-None-Match с
+текущим ETag без обращения к БД, а тела ответов хранит в LRU-кэше процесса
+по ключу запроса, версии и эпохе: устаревшие версии просто вытесняются.
+
+Версия читается до запроса к БД и поднимается после коммита. Поэтому
+тело, закэшированное под версией, не старше данных этой версии.
+"""
+
+import ctypes
+import multiprocessing
+import secrets
+import time
+from typing import Callable, Hashable, Iterable
+
+from flask import Flask, Response, current_app, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from .cache import LRUCache
+from .models import Client
+
+VERSIONED_MODELS = (Client,)
+
+
+class TableVersions:
+    """Счетчики версий таблиц в разделяемой памяти"""
+
+    def __init__(
+        self,
+        tables: Iterable[str],
+        ttl: float,
+        timer: Callable[[], float] = time.time,
+    ):
+        self.nonce = secrets.token_hex(4)
+        self.ttl = ttl
+        self._timer = timer
+        self._counters = {
+            table: multiprocessing.Value(ctypes.c_longlong, 0) for table in tables
+        }
+
+    def get(self, table: str) -> int:
+        return self._counters[table].value
+
+    def bump(self, table: str) -> None:
+        counter = self._counters[table]
+        with counter.get_lock():
+            counter.value += 1
+
+    def epoch(self) -> int:
+        """Номер текущего окна времени длиной ttl секунд"""
+        return int(self._timer() // self.ttl)
+
+    def etag(self, table: str, version: int, epoch: int) -> str:
+        return f"{table}-{self.nonce}-{version}-{epoch}"
+
+
+def init_versions(app: Flask) -> None:
+    """Счетчики версий и кэш тел ответов; вызывается до запуска воркеров"""
+    app.extensions["table_versions"] = TableVersions(
+        (model.__tablename__ for model in VERSIONED_MODELS),
+        ttl=app.config["RESPONSE_CACHE_TTL"],
+    )
+    app.extensions["response_cache"] = LRUCache(app.config["RESPONSE_CACHE_SIZE"])
+
+
+def bump_version(table: str) -> None:
+    """Новая версия таблицы после записи в обход ORM"""
+    current_app.extensions["table_versions"].bump(table)
+
+
+def versioned_response(table: str, key: Hashable, build: Callable) -> Response:
+    """Ответ GET, зависящий только от строк таблицы table
+
+    key - ключ запроса в кэше (например, маршрут и параметры), build -
+    обработчик без кэша. Кэшируются только ответы 200 не длиннее
+    RESPONSE_CACHE_MAX_BODY байт.
+    """
+    versions = current_app.extensions["table_versions"]
+    version = versions.get(table)
+    epoch = versions.epoch()
+    etag = versions.etag(table, version, epoch)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    cache = current_app.extensions["response_cache"]
+    cached = cache.get((key, version, epoch))
+    if cached is not None:
+        body, headers = cached
+        response = Response(body, headers=headers)
+    else:
+        response = current_app.make_response(build())
+        if response.status_code != 200:
+            return response
+        body = response.get_data()
+        if len(body) <= current_app.config["RESPONSE_CACHE_MAX_BODY"]:
+            headers = [
+                (name, value)
+                for name, value in response.headers
+                if name != "Content-Length"
+            ]
+            cache.set((key, version, epoch), (body, headers))
+    response.set_etag(etag)
+    return response
+
+
+def mark_table_changed(mapper, connection, target):
+    """Запоминание измененной таблицы до коммита сессии"""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_tables", set()).add(mapper.local_table.name)
+
+
+for model in VERSIONED_MODELS:
+    for name in ("after_insert", "after_update", "after_delete"):
+        event.listen(model, name, mark_table_changed)
+
+
+@event.listens_for(Session, "after_commit")
+def bump_changed_tables(session):
+    """Новые версии таблиц, измененных зафиксированной транзакцией"""
+    tables = session.info.pop("changed_tables", None)
+    if not tables or not has_app_context():
+        return
+    versions = current_app.extensions.get("table_versions")
+    if versions is not None:
+        for table in tables:
+            versions.bump(table)
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_changed_tables(session):
+    """Откаченные изменения версий не меняют"""
+    session.info.pop("changed_tables", None)
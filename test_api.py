@@ -1,9 +1,18 @@
 import json
+import multiprocessing
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 import pytest
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, insert, select, text
+from sqlalchemy.exc import IntegrityError
 
-from parking_app.models import Client, ClientParking, Parking
+from parking_app import availability
+from parking_app.availability import reconcile_availability
+from parking_app.events import AvailabilityHub
+from parking_app.models import Client, ClientParking, Parking, db
 
 
 class TestAPI:
@@ -223,6 +232,66 @@ class TestAPI:
         response = client.delete("/client_parkings", data=exit_data)
         assert response.status_code == 404
 
+    @pytest.mark.parking
+    def test_repeated_exit(self, client, sample_client_parking, db_session):
+        """Повторный выезд не находит активной сессии и не освобождает место"""
+        exit_data = {
+            "client_id": sample_client_parking.client_id,
+            "parking_id": sample_client_parking.parking_id,
+        }
+        assert client.delete("/client_parkings", data=exit_data).status_code == 200
+        available = db_session.session.get(
+            Parking, sample_client_parking.parking_id
+        ).count_available_places
+
+        response = client.delete("/client_parkings", data=exit_data)
+
+        assert response.status_code == 404
+        assert "не найдена" in response.get_json()["error"]
+        db_session.session.expire_all()
+        parking = db_session.session.get(Parking, sample_client_parking.parking_id)
+        assert parking.count_available_places == available
+
+    @pytest.mark.parking
+    def test_exit_without_card_changes_nothing(
+        self, client, client_without_card, sample_parking, db_session
+    ):
+        """Отказ в выезде без карты оставляет сессию открытой, а место занятым"""
+        data = {"client_id": client_without_card.id, "parking_id": sample_parking.id}
+        assert client.post("/client_parkings", data=data).status_code == 201
+
+        response = client.delete("/client_parkings", data=data)
+
+        assert response.status_code == 400
+        db_session.session.expire_all()
+        session = db_session.session.scalars(
+            select(ClientParking).filter_by(client_id=client_without_card.id)
+        ).one()
+        assert session.time_out is None
+        parking = db_session.session.get(Parking, sample_parking.id)
+        assert parking.count_available_places == parking.count_places - 1
+
+    @pytest.mark.parking
+    def test_exit_frees_place(self, client, sample_client, db_session):
+        """Место, освобожденное выездом, может занять следующий клиент"""
+        parking = Parking(
+            address="ул. Тестовая, д. 2",
+            opened=True,
+            count_places=1,
+            count_available_places=1,
+        )
+        other = Client(name="Петр", surname="Петров", credit_card="4000000000000002")
+        db_session.session.add_all([parking, other])
+        db_session.session.commit()
+        first = {"client_id": sample_client.id, "parking_id": parking.id}
+        second = {"client_id": other.id, "parking_id": parking.id}
+
+        assert client.post("/client_parkings", data=first).status_code == 201
+        assert client.post("/client_parkings", data=second).status_code == 400
+        assert client.delete("/client_parkings", data=first).status_code == 200
+
+        assert client.post("/client_parkings", data=second).status_code == 201
+
     def test_get_clients_list(self, client, sample_client):
         """Тестирование получения списка клиентов"""
         response = client.get("/clients")
@@ -241,6 +310,44 @@ class TestAPI:
         )
         assert client_found
 
+    def test_get_clients_pagination(self, client, client_factory):
+        """Тестирование постраничной выдачи клиентов по курсору"""
+        created_ids = [c.id for c in client_factory.create_batch(5)]
+        after_id = created_ids[0] - 1
+
+        page_ids = []
+        while True:
+            response = client.get(f"/clients?after_id={after_id}&limit=2")
+            assert response.status_code == 200
+            page = response.get_json()
+            assert len(page) <= 2
+            page_ids.extend(item["id"] for item in page)
+            if "X-Next-After-Id" not in response.headers:
+                break
+            after_id = int(response.headers["X-Next-After-Id"])
+
+        assert page_ids[:5] == created_ids
+        assert page_ids == sorted(page_ids)
+
+    def test_get_clients_invalid_limit(self, client):
+        """Тестирование валидации limit"""
+        response = client.get("/clients?limit=0")
+        assert response.status_code == 400
+        assert "error" in response.get_json()
+
+    def test_get_clients_stream(self, client, client_factory):
+        """Потоковая выдача совпадает с обычной"""
+        client_factory.create_batch(3)
+
+        response = client.get("/clients?stream=1")
+        assert response.status_code == 200
+        assert response.is_streamed
+        assert response.mimetype == "application/json"
+        assert json.loads(response.get_data()) == client.get("/clients").get_json()
+
+        limited = client.get("/clients?stream=1&limit=2")
+        assert len(json.loads(limited.get_data())) == 2
+
     def test_get_client_by_id(self, client, sample_client):
         """Тестирование получения клиента по ID"""
         response = client.get(f"/clients/{sample_client.id}")
@@ -477,3 +584,605 @@ class TestFactoryBoyFeatures:
             assert parking.count_available_places == parking.count_places
         else:
             assert parking.count_available_places == 0
+
+
+class TestConcurrentParking:
+    """Тесты конкурентного заезда на парковку"""
+
+    @pytest.mark.parking
+    def test_parallel_enter_never_overbooks(self, file_app):
+        """Параллельные заезды не уводят счетчик свободных мест в минус"""
+        places = 25
+        parking = Parking(
+            address="ул. Конкурентная, д. 1",
+            opened=True,
+            count_places=places,
+            count_available_places=places,
+        )
+        clients = [
+            Client(name=f"Гонщик{i}", surname="Параллельный") for i in range(300)
+        ]
+        db.session.add(parking)
+        db.session.add_all(clients)
+        db.session.commit()
+
+        parking_id = parking.id
+        client_ids = [c.id for c in clients]
+
+        def enter(client_id):
+            # Каждый поток работает со своим тестовым клиентом и своей сессией
+            response = file_app.test_client().post(
+                "/client_parkings",
+                data={"client_id": client_id, "parking_id": parking_id},
+            )
+            return response.status_code
+
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            statuses = list(pool.map(enter, client_ids))
+
+        assert statuses.count(201) == places
+        assert statuses.count(400) == len(client_ids) - places
+
+        db.session.expire_all()
+        updated_parking = db.session.get(Parking, parking_id)
+        assert updated_parking.count_available_places == 0
+
+        active_sessions = (
+            db.session.query(ClientParking)
+            .filter_by(parking_id=parking_id, time_out=None)
+            .count()
+        )
+        assert active_sessions == places
+
+
+class TestClientParkingIndexes:
+    """Тесты индексов таблицы client_parking"""
+
+    def test_active_session_unique_per_client(self, db_session, sample_client_parking):
+        """БД не дает завести клиенту вторую активную сессию"""
+        db_session.session.add(
+            ClientParking(
+                client_id=sample_client_parking.client_id,
+                parking_id=sample_client_parking.parking_id,
+                time_in=datetime.now(),
+            )
+        )
+        with pytest.raises(IntegrityError):
+            db_session.session.commit()
+        db_session.session.rollback()
+
+    def test_hot_queries_use_indexes(self, db_session, sample_client, sample_parking):
+        """Запросы заезда и выезда идут по индексам на большой таблице"""
+        history = [
+            {
+                "client_id": sample_client.id + i % 500,
+                "parking_id": sample_parking.id,
+                "time_in": datetime(2024, 1, 1, 8),
+                "time_out": datetime(2024, 1, 1, 18),
+            }
+            for i in range(20000)
+        ]
+        db_session.session.execute(insert(ClientParking), history)
+        db_session.session.commit()
+
+        queries = {
+            "uq_client_parking_active_client": (
+                "SELECT id FROM client_parking "
+                "WHERE client_id = :client_id AND time_out IS NULL"
+            ),
+            "ix_client_parking_client_parking_time_out": (
+                "SELECT id FROM client_parking WHERE client_id = :client_id "
+                "AND parking_id = :parking_id AND time_out IS NULL"
+            ),
+        }
+        for index_name, query in queries.items():
+            plan = db_session.session.execute(
+                text(f"EXPLAIN QUERY PLAN {query}"),
+                {"client_id": sample_client.id, "parking_id": sample_parking.id},
+            ).all()
+            details = " ".join(row[-1] for row in plan)
+            assert f"INDEX {index_name}" in details, details
+            assert "SCAN" not in details, details
+
+
+class TestPlateParking:
+    """Тесты заезда и выезда по номеру автомобиля"""
+
+    @pytest.mark.parking
+    def test_enter_and_exit_by_plate(
+        self, app, client, sample_client, sample_parking, db_session
+    ):
+        """Заезд и выезд по номеру автомобиля"""
+        plate_data = {
+            "car_number": sample_client.car_number,
+            "parking_id": sample_parking.id,
+        }
+
+        response = client.post("/client_parkings/by_plate", data=plate_data)
+        assert response.status_code == 201
+        assert response.get_json()["client_parking"]["client_id"] == sample_client.id
+        assert app.extensions["plate_cache"].get(sample_client.car_number) == (
+            sample_client.id
+        )
+
+        response = client.delete("/client_parkings/by_plate", data=plate_data)
+        assert response.status_code == 200
+        assert response.get_json()["cost"] > 0
+
+    @pytest.mark.parking
+    def test_enter_by_unknown_plate(self, client, sample_parking):
+        """Неизвестный номер автомобиля"""
+        response = client.post(
+            "/client_parkings/by_plate",
+            data={"car_number": "Н000НН000", "parking_id": sample_parking.id},
+        )
+        assert response.status_code == 404
+
+    def test_plate_cache_invalidated_on_client_update(
+        self, app, client, sample_client, sample_parking, db_session
+    ):
+        """Смена номера автомобиля сбрасывает кэш"""
+        old_plate = sample_client.car_number
+        client.post(
+            "/client_parkings/by_plate",
+            data={"car_number": old_plate, "parking_id": sample_parking.id},
+        )
+        assert app.extensions["plate_cache"].get(old_plate) == sample_client.id
+
+        sample_client.car_number = "К" + old_plate[1:]
+        db_session.session.commit()
+
+        assert app.extensions["plate_cache"].get(old_plate) is None
+        response = client.delete(
+            "/client_parkings/by_plate",
+            data={"car_number": old_plate, "parking_id": sample_parking.id},
+        )
+        assert response.status_code == 404
+
+    def test_plate_cache_invalidated_after_commit(self, app, sample_client, db_session):
+        """Номер, закэшированный между flush и коммитом, сбрасывается коммитом"""
+        cache = app.extensions["plate_cache"]
+        old_plate = sample_client.car_number
+
+        sample_client.car_number = "К" + old_plate[1:]
+        db_session.session.flush()
+        # Запрос другого потока еще видит прежнюю строку клиента
+        cache.set(old_plate, sample_client.id)
+        db_session.session.commit()
+
+        assert cache.get(old_plate) is None
+
+    def test_create_client_duplicate_plate(self, client, sample_client):
+        """Номер автомобиля уникален"""
+        response = client.post(
+            "/clients",
+            data={
+                "name": "Двойник",
+                "surname": "Иванов",
+                "car_number": sample_client.car_number,
+            },
+        )
+        assert response.status_code == 409
+        assert "error" in response.get_json()
+
+
+class TestBatchParking:
+    """Тесты пакетной обработки событий камер"""
+
+    @pytest.mark.parking
+    def test_batch_events_in_one_commit(
+        self, app, client, sample_client, sample_parking, db_session
+    ):
+        """События применяются по порядку одним коммитом"""
+        initial_available_places = sample_parking.count_available_places
+        ids = {"client_id": sample_client.id, "parking_id": sample_parking.id}
+        events = [
+            {"action": "enter", **ids},
+            {"action": "enter", **ids},
+            {"action": "exit", **ids},
+            {"action": "exit", **ids},
+            {
+                "action": "enter",
+                "car_number": sample_client.car_number,
+                "parking_id": sample_parking.id,
+            },
+            {"action": "park", **ids},
+            {"action": "enter", "client_id": sample_client.id},
+        ]
+
+        commits = []
+
+        def count_commit(session):
+            commits.append(session)
+
+        event.listen(Session, "after_commit", count_commit)
+        try:
+            response = client.post("/client_parkings/batch", json={"events": events})
+        finally:
+            event.remove(Session, "after_commit", count_commit)
+
+        assert response.status_code == 200
+        results = response.get_json()["results"]
+        assert [r["index"] for r in results] == list(range(len(events)))
+        assert [r["status"] for r in results] == [201, 400, 200, 404, 201, 400, 400]
+        assert "уже находится" in results[1]["error"]
+        assert len(commits) == 1
+
+        db_session.session.expire_all()
+        parking = db_session.session.get(Parking, sample_parking.id)
+        assert parking.count_available_places == initial_available_places - 1
+
+    def test_batch_validation(self, app, client):
+        """Проверка формата пакета"""
+        response = client.post("/client_parkings/batch", data={"events": "1"})
+        assert response.status_code == 400
+
+        too_many = [{"action": "enter"}] * (app.config["BATCH_MAX_EVENTS"] + 1)
+        response = client.post("/client_parkings/batch", json=too_many)
+        assert response.status_code == 413
+
+
+class TestAvailability:
+    """Тесты счетчиков свободных мест в памяти"""
+
+    def availability(self, client, parking_id):
+        response = client.get(f"/parkings/{parking_id}/availability")
+        assert response.status_code == 200
+        return response.get_json()["count_available_places"]
+
+    def test_new_parking_available(self, client):
+        """Созданная парковка сразу видна в счетчиках"""
+        response = client.post(
+            "/parkings", data={"address": "ул. Счетная, д. 1", "count_places": 7}
+        )
+        assert self.availability(client, response.get_json()["id"]) == 7
+
+    def test_unknown_parking(self, client):
+        """Неизвестная парковка"""
+        response = client.get("/parkings/99999/availability")
+        assert response.status_code == 404
+
+    @pytest.mark.parking
+    def test_counters_follow_enter_and_exit(
+        self, client, sample_client, sample_parking
+    ):
+        """Заезд и выезд меняют счетчик после коммита, отказ - не меняет"""
+        data = {"client_id": sample_client.id, "parking_id": sample_parking.id}
+        places = sample_parking.count_places
+        assert self.availability(client, sample_parking.id) == places
+
+        client.post("/client_parkings", data=data)
+        assert self.availability(client, sample_parking.id) == places - 1
+
+        response = client.post("/client_parkings", data=data)
+        assert response.status_code == 400
+        assert self.availability(client, sample_parking.id) == places - 1
+
+        client.delete("/client_parkings", data=data)
+        assert self.availability(client, sample_parking.id) == places
+
+    def test_reconcile_heals_drift(self, app, client, sample_parking):
+        """Сверка с БД исправляет расхождение счетчиков"""
+        counters = app.extensions["availability"]
+        counters.update({sample_parking.id: (-5, counters.next_stamp())})
+        reconcile_availability()
+
+        assert self.availability(client, sample_parking.id) == (
+            sample_parking.count_available_places
+        )
+
+    def test_miss_reads_database(self, app, client, db_session):
+        """Парковка, записанная в обход ORM, читается из БД и попадает в счетчик"""
+        parking_id = db_session.session.execute(
+            insert(Parking)
+            .values(
+                address="ул. Обходная, д. 1",
+                opened=True,
+                count_places=4,
+                count_available_places=3,
+            )
+            .returning(Parking.id)
+        ).scalar_one()
+        db_session.session.commit()
+        assert app.extensions["availability"].get(parking_id) is None
+
+        assert self.availability(client, parking_id) == 3
+        assert app.extensions["availability"].get(parking_id) == 3
+
+    def test_stale_stamp_ignored(self):
+        """Значение с более старой отметкой не затирает более новое"""
+        counters = availability.AvailabilityCounters(8)
+        older, newer = counters.next_stamp(), counters.next_stamp()
+        counters.update({1: (5, newer)})
+        counters.update({1: (9, older)})
+
+        assert counters.get(1) == 5
+
+    def test_counters_shared_with_forked_process(self):
+        """Запись из процесса, запущенного fork, видна в родителе"""
+        counters = availability.AvailabilityCounters(8)
+        child = multiprocessing.get_context("fork").Process(
+            target=counters.update, args=({3: (2, counters.next_stamp())},)
+        )
+        child.start()
+        child.join(timeout=10)
+
+        assert child.exitcode == 0
+        assert counters.get(3) == 2
+        assert counters.changes == 1
+
+
+class TestAvailabilityEvents:
+    """Тесты потока Server-Sent Events со свободными местами"""
+
+    @staticmethod
+    def event_data(chunk):
+        data_line = next(
+            line for line in chunk.decode().splitlines() if line.startswith("data:")
+        )
+        return json.loads(data_line.partition(":")[2])
+
+    @pytest.mark.parking
+    def test_stream_pushes_changes(self, client, sample_client, sample_parking):
+        """Подписчик получает текущее значение и изменение после заезда"""
+        response = client.get(f"/parkings/{sample_parking.id}/events", buffered=False)
+        assert response.status_code == 200
+        assert response.mimetype == "text/event-stream"
+        chunks = iter(response.response)
+
+        initial = self.event_data(next(chunks))
+        assert initial["count_available_places"] == sample_parking.count_places
+
+        client.post(
+            "/client_parkings",
+            data={"client_id": sample_client.id, "parking_id": sample_parking.id},
+        )
+        update = self.event_data(next(chunks))
+        assert update["count_available_places"] == sample_parking.count_places - 1
+        response.close()
+
+    def test_unknown_parking(self, client):
+        """Неизвестная парковка"""
+        assert client.get("/parkings/99999/events").status_code == 404
+
+    def test_slow_subscriber_gets_latest_value(self):
+        """Медленный подписчик не копит очередь, а получает последнее значение"""
+        hub = AvailabilityHub()
+        stream = hub.subscribe(1, 10, keepalive=1)
+        assert self.event_data(next(stream).encode())["count_available_places"] == 10
+
+        for available in (9, 8, 7):
+            hub.publish(1, available)
+        hub.dispatch()
+
+        assert self.event_data(next(stream).encode())["count_available_places"] == 7
+        assert hub.channel(1).subscribers == 1
+        stream.close()
+        assert hub.channel(1).subscribers == 0
+
+    def test_changes_from_other_process(self):
+        """Подписчик узнает об изменении, записанном в другом процессе"""
+        counters = availability.AvailabilityCounters(8)
+        counters.update({1: (10, counters.next_stamp())})
+        hub = AvailabilityHub()
+        hub.watch(counters, 0.05)
+        stream = hub.subscribe(1, 10, keepalive=5)
+        assert self.event_data(next(stream).encode())["count_available_places"] == 10
+
+        child = multiprocessing.get_context("fork").Process(
+            target=counters.update, args=({1: (9, counters.next_stamp())},)
+        )
+        child.start()
+        child.join(timeout=10)
+
+        assert self.event_data(next(stream).encode())["count_available_places"] == 9
+        stream.close()
+
+
+# Сценарии бюджетов запросов: подготовка вне бюджета возвращает запрос,
+# число SQL-запросов которого проверяется. ids - id клиента и парковки и
+# номер автомобиля: объекты фикстур в сценарии не используются, так как
+# сессия перед запросом закрывается
+def budget_get_metrics(http, ids):
+    return lambda: http.get("/metrics")
+
+
+def budget_get_clients(http, ids):
+    return lambda: http.get("/clients")
+
+
+def budget_get_clients_page(http, ids):
+    return lambda: http.get("/clients", query_string={"after_id": 100, "limit": 500})
+
+
+def budget_search_clients(http, ids):
+    return lambda: http.get("/clients/search", query_string={"q": "иван"})
+
+
+def budget_get_client(http, ids):
+    return lambda: http.get(f"/clients/{ids['client_id']}")
+
+
+def budget_get_client_cached(http, ids):
+    http.get(f"/clients/{ids['client_id']}")
+    return lambda: http.get(f"/clients/{ids['client_id']}")
+
+
+def budget_get_client_not_modified(http, ids):
+    etag = http.get(f"/clients/{ids['client_id']}").headers["ETag"]
+    return lambda: http.get(
+        f"/clients/{ids['client_id']}", headers={"If-None-Match": etag}
+    )
+
+
+def budget_create_client(http, ids):
+    return lambda: http.post("/clients", data={"name": "Анна", "surname": "Лимитова"})
+
+
+def budget_import_clients(http, ids):
+    # Одна порция: проверка номеров и вставка
+    body = "name,surname,car_number\n" + "".join(
+        f"Анна,Лимитова,ЛИМ{i}\n" for i in range(10)
+    )
+    return lambda: http.post(
+        "/clients/import", data=body.encode(), content_type="text/csv"
+    )
+
+
+def budget_create_parking(http, ids):
+    data = {"address": "ул. Лимитная, д. 1", "count_places": 5}
+    return lambda: http.post("/parkings", data=data)
+
+
+def budget_get_availability(http, ids):
+    return lambda: http.get(f"/parkings/{ids['parking_id']}/availability")
+
+
+def budget_get_stats(http, ids):
+    return lambda: http.get(f"/parkings/{ids['parking_id']}/stats")
+
+
+def budget_get_events(http, ids):
+    def request():
+        response = http.get(f"/parkings/{ids['parking_id']}/events", buffered=False)
+        response.close()
+        return response
+
+    return request
+
+
+def budget_enter(http, ids):
+    data = {"client_id": ids["client_id"], "parking_id": ids["parking_id"]}
+    return lambda: http.post("/client_parkings", data=data)
+
+
+def budget_exit(http, ids):
+    data = {"client_id": ids["client_id"], "parking_id": ids["parking_id"]}
+    http.post("/client_parkings", data=data)
+    return lambda: http.delete("/client_parkings", data=data)
+
+
+def budget_exit_with_key(http, ids):
+    data = {"client_id": ids["client_id"], "parking_id": ids["parking_id"]}
+    headers = {"Idempotency-Key": f"budget-exit-{uuid.uuid4()}"}
+    http.post("/client_parkings", data=data)
+    return lambda: http.delete("/client_parkings", data=data, headers=headers)
+
+
+def budget_exit_replay(http, ids):
+    data = {"client_id": ids["client_id"], "parking_id": ids["parking_id"]}
+    headers = {"Idempotency-Key": f"budget-replay-{uuid.uuid4()}"}
+    http.post("/client_parkings", data=data)
+    http.delete("/client_parkings", data=data, headers=headers)
+    return lambda: http.delete("/client_parkings", data=data, headers=headers)
+
+
+def budget_enter_by_plate(http, ids):
+    data = {"car_number": ids["car_number"], "parking_id": ids["parking_id"]}
+    return lambda: http.post("/client_parkings/by_plate", data=data)
+
+
+def budget_exit_by_plate(http, ids):
+    data = {"car_number": ids["car_number"], "parking_id": ids["parking_id"]}
+    http.post("/client_parkings/by_plate", data=data)
+    return lambda: http.delete("/client_parkings/by_plate", data=data)
+
+
+def budget_batch(http, ids):
+    pair = {"client_id": ids["client_id"], "parking_id": ids["parking_id"]}
+    events = [
+        {"action": action, **pair}
+        for _ in range(BUDGET_BATCH_PAIRS)
+        for action in ("enter", "exit")
+    ]
+    return lambda: http.post("/client_parkings/batch", json=events)
+
+
+# Пар заезд-выезд в пакете: по три запроса на заезд и на выезд, итоги часов
+# пишутся одним UPSERT на весь пакет
+BUDGET_BATCH_PAIRS = 5
+
+# (endpoint, метод) -> [(сценарий, бюджет SQL-запросов, ожидаемый код)]
+QUERY_BUDGETS = {
+    ("metrics_handler", "GET"): [(budget_get_metrics, 0, 200)],
+    ("get_clients_handler", "GET"): [
+        (budget_get_clients, 1, 200),
+        (budget_get_clients_page, 1, 200),
+    ],
+    ("search_clients_handler", "GET"): [(budget_search_clients, 1, 200)],
+    ("get_client_handler", "GET"): [
+        (budget_get_client, 1, 200),
+        (budget_get_client_cached, 0, 200),
+        (budget_get_client_not_modified, 0, 304),
+    ],
+    ("create_client_handler", "POST"): [(budget_create_client, 2, 201)],
+    ("import_clients_handler", "POST"): [(budget_import_clients, 2, 200)],
+    ("create_parking_handler", "POST"): [(budget_create_parking, 2, 201)],
+    ("get_parking_availability_handler", "GET"): [(budget_get_availability, 0, 200)],
+    ("get_parking_stats_handler", "GET"): [(budget_get_stats, 2, 200)],
+    ("parking_events_handler", "GET"): [(budget_get_events, 0, 200)],
+    ("enter_parking_handler", "POST"): [(budget_enter, 4, 201)],
+    ("exit_parking_handler", "DELETE"): [
+        (budget_exit, 4, 200),
+        (budget_exit_with_key, 6, 200),
+        (budget_exit_replay, 0, 200),
+    ],
+    ("enter_parking_by_plate_handler", "POST"): [(budget_enter_by_plate, 4, 201)],
+    ("exit_parking_by_plate_handler", "DELETE"): [(budget_exit_by_plate, 4, 200)],
+    ("batch_parking_handler", "POST"): [
+        (budget_batch, 6 * BUDGET_BATCH_PAIRS + 1, 200)
+    ],
+}
+
+
+class TestQueryBudgets:
+    """Бюджеты SQL-запросов маршрутов на наборе из нескольких тысяч строк
+
+    Число запросов не должно зависеть от числа строк: обращение к
+    ленивым связям (parking_logs, client_logs) в сериализаторах или
+    обработчиках превратит выдачу списков в N+1 запрос.
+    """
+
+    def test_every_route_has_budget(self, app):
+        """Новый маршрут должен получить бюджет в QUERY_BUDGETS"""
+        routes = {
+            (rule.endpoint, method)
+            for rule in app.url_map.iter_rules()
+            if rule.endpoint != "static"
+            for method in (rule.methods or set()) - {"HEAD", "OPTIONS"}
+        }
+        assert routes == set(QUERY_BUDGETS)
+
+    @pytest.mark.parametrize(
+        "scenario,budget,status",
+        [case for cases in QUERY_BUDGETS.values() for case in cases],
+        ids=lambda value: getattr(value, "__name__", None),
+    )
+    def test_route_within_budget(
+        self,
+        client,
+        query_budget,
+        large_dataset,
+        sample_client,
+        sample_parking,
+        scenario,
+        budget,
+        status,
+    ):
+        ids = {
+            "client_id": sample_client.id,
+            "parking_id": sample_parking.id,
+            "car_number": sample_client.car_number,
+        }
+        request = scenario(client, ids)
+        with query_budget(budget):
+            response = request()
+        assert response.status_code == status
+
+    def test_budget_exceeded(self, client, query_budget, sample_client):
+        """Запросы сверх бюджета роняют тест со списком SQL"""
+        client_id = sample_client.id
+        with pytest.raises(pytest.fail.Exception, match="SQL-запросов 2, бюджет 1"):
+            with query_budget(1):
+                client.get(f"/clients/{client_id}")
+                client.get("/clients")
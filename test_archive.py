@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from parking_app.archive import all_sessions, archive_sessions
+from parking_app.models import ClientParking, ClientParkingHistory
+from parking_app.stats import rebuild_stats
+from parking_app.tariffs import TariffBook, rebill
+
+NOW = datetime(2024, 6, 1, 12)
+
+
+def count_rows(db_session, model):
+    return db_session.session.scalar(select(func.count()).select_from(model))
+
+
+class TestArchive:
+    """Тесты переноса закрытых сессий в архив"""
+
+    @pytest.fixture
+    def history(self, db_session, client_factory, sample_client, sample_parking):
+        """Десять старых закрытых сессий, одна недавняя и одна активная"""
+        clients = client_factory.create_batch(11)
+        rows = [
+            {
+                "client_id": client.id,
+                "parking_id": sample_parking.id,
+                "time_in": NOW - timedelta(days=60 + index),
+                "time_out": NOW - timedelta(days=60 + index) + timedelta(hours=2),
+            }
+            for index, client in enumerate(clients[:10])
+        ]
+        rows.append(
+            {
+                "client_id": clients[10].id,
+                "parking_id": sample_parking.id,
+                "time_in": NOW - timedelta(days=1),
+                "time_out": NOW - timedelta(days=1) + timedelta(hours=1),
+            }
+        )
+        rows.append(
+            {
+                "client_id": sample_client.id,
+                "parking_id": sample_parking.id,
+                "time_in": NOW - timedelta(hours=1),
+                "time_out": None,
+            }
+        )
+        db_session.session.execute(insert(ClientParking), rows)
+        db_session.session.commit()
+        return rows
+
+    def test_moves_old_closed_sessions(self, db_session, history):
+        """Переносятся только закрытые сессии старше порога, с прежними id"""
+        ids_before = db_session.session.scalars(
+            select(ClientParking.id).order_by(ClientParking.id)
+        ).all()
+
+        archived = archive_sessions(timedelta(days=30), chunk_size=3, now=NOW)
+
+        assert archived == 10
+        assert count_rows(db_session, ClientParking) == 2
+        archived_ids = db_session.session.scalars(
+            select(ClientParkingHistory.id).order_by(ClientParkingHistory.id)
+        ).all()
+        assert archived_ids == ids_before[:10]
+        # Повторный запуск ничего не переносит
+        assert archive_sessions(timedelta(days=30), chunk_size=3, now=NOW) == 0
+
+    def test_archives_newest_session(self, client, db_session, history):
+        """Переносится и сессия с наибольшим id, а ее id не выдается повторно"""
+        newest = db_session.session.scalar(select(func.max(ClientParking.id)))
+        closed = history[-2]
+        archived = archive_sessions(
+            timedelta(0), chunk_size=100, now=NOW + timedelta(days=1)
+        )
+
+        assert archived == 11
+        assert count_rows(db_session, ClientParkingHistory) == 11
+        response = client.post(
+            "/client_parkings",
+            data={"client_id": closed["client_id"], "parking_id": closed["parking_id"]},
+        )
+        assert response.status_code == 201
+        assert response.get_json()["client_parking"]["id"] > newest
+
+    def test_history_reads_union(self, db_session, history):
+        """Пересчет стоимости и итогов видит архивные сессии"""
+        book = TariffBook.from_config({"default": {"rate": 50, "minimum": 1}})
+        before = rebill(book)
+        stats_before = rebuild_stats()
+
+        archive_sessions(timedelta(days=30), chunk_size=4, now=NOW)
+
+        assert rebill(book) == before
+        assert rebuild_stats() == stats_before
+        sessions = all_sessions()
+        assert db_session.session.scalar(
+            select(func.count()).select_from(sessions)
+        ) == len(history)
+
+    def test_exit_after_archive(self, client, db_session, history):
+        """Заезд и выезд работают после переноса"""
+        archive_sessions(timedelta(days=30), now=NOW)
+        active = history[-1]
+
+        response = client.delete(
+            "/client_parkings",
+            data={"client_id": active["client_id"], "parking_id": active["parking_id"]},
+        )
+
+        assert response.status_code == 200
+
+    def test_archive_command(self, app, history):
+        """Команда flask archive-sessions"""
+        result = app.test_cli_runner().invoke(
+            args=["archive-sessions", "--older-than-days", "0", "--chunk-size", "2"]
+        )
+        assert result.exit_code == 0, result.output
+        assert "Перенесено сессий: 11" in result.output
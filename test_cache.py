@@ -0,0 +1,55 @@
+from parking_app.cache import LRUCache
+
+
+class FakeTimer:
+    """Управляемые часы для проверки времени жизни записей"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLRUCache:
+    """Тесты LRU-кэша"""
+
+    def test_evicts_least_recently_used(self):
+        """При переполнении вытесняется давно не использованная запись"""
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert len(cache) == 2
+
+    def test_expires_entries(self):
+        """Записи истекают через ttl"""
+        timer = FakeTimer()
+        cache = LRUCache(maxsize=10, ttl=5, timer=timer)
+        cache.set("a", 1)
+
+        timer.now = 4.9
+        assert cache.get("a") == 1
+
+        timer.now = 5
+        assert cache.get("a", "нет") == "нет"
+        assert len(cache) == 0
+
+    def test_invalidate_and_clear(self):
+        """Явный сброс записей"""
+        cache = LRUCache(maxsize=10)
+        cache.set("a", 1)
+        cache.set("b", 2)
+
+        cache.invalidate("a")
+        cache.invalidate("missing")
+        assert cache.get("a") is None
+
+        cache.clear()
+        assert len(cache) == 0
@@ -0,0 +1,80 @@
+from sqlalchemy import text
+from sqlalchemy.pool import StaticPool
+
+from parking_app.app import create_app, db
+from parking_app.config import Config, HighThroughputConfig
+
+
+class TestEngineProfiles:
+    """Тесты профилей настроек движка БД"""
+
+    def test_high_throughput_profile(self, tmp_path):
+        """Профиль high-throughput включает WAL, PRAGMA и размер пула"""
+
+        class Profile(HighThroughputConfig):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'parking.db'}"
+            START_BACKGROUND_JOBS = False
+            SCHEMA_AUTO_MIGRATE = True
+
+        def pragma(name):
+            return db.session.execute(text(f"PRAGMA {name}")).scalar()
+
+        app = create_app(Profile)
+        with app.app_context():
+            assert pragma("journal_mode") == "wal"
+            assert pragma("synchronous") == 1  # NORMAL
+            assert pragma("busy_timeout") == 5000
+            assert pragma("temp_store") == 2  # MEMORY
+            assert db.engine.pool.size() == 16
+            db.session.remove()
+            db.engine.dispose()
+
+    def test_default_profile_keeps_driver_settings(self, tmp_path):
+        """Профиль по умолчанию не меняет режим журнала"""
+
+        class Profile(Config):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'parking.db'}"
+            START_BACKGROUND_JOBS = False
+
+        app = create_app(Profile)
+        with app.app_context():
+            journal_mode = db.session.execute(text("PRAGMA journal_mode")).scalar()
+            assert journal_mode == "delete"
+            db.session.remove()
+            db.engine.dispose()
+
+    def test_config_mapping_applied_before_engine(self, tmp_path):
+        """Настройки из config применяются до создания движка"""
+        database = tmp_path / "override.db"
+        app = create_app(
+            "default",
+            {
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///{database}",
+                "START_BACKGROUND_JOBS": False,
+            },
+        )
+        with app.app_context():
+            assert db.engine.url.database == str(database)
+            assert database.exists()
+            db.session.remove()
+            db.engine.dispose()
+
+    def test_memory_profile_supports_savepoints(self):
+        """База в памяти: SAVEPOINT внутри транзакции, откат отменяет все"""
+        app = create_app("memory")
+        with app.app_context():
+            assert isinstance(db.engine.pool, StaticPool)
+            with db.engine.connect() as connection:
+                connection.execute(text("CREATE TABLE t (x INTEGER)"))
+                connection.commit()
+
+                transaction = connection.begin()
+                savepoint = connection.begin_nested()
+                connection.execute(text("INSERT INTO t VALUES (1)"))
+                # Без BEGIN от SQLAlchemy RELEASE самого внешнего SAVEPOINT
+                # фиксирует запись, и откат транзакции ее уже не отменит
+                savepoint.commit()
+                transaction.rollback()
+
+                assert connection.execute(text("SELECT count(*) FROM t")).scalar() == 0
+            db.engine.dispose()
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from datagen import DataGenerator, populate
+from parking_app.app import create_app, db
+from parking_app.config import Config
+from parking_app.models import Client, ClientParking, ParkingHourlyStats
+from parking_app.stats import rebuild_stats
+
+
+def stats_snapshot():
+    rows = db.session.execute(
+        select(
+            ParkingHourlyStats.parking_id,
+            ParkingHourlyStats.bucket,
+            ParkingHourlyStats.entries,
+            ParkingHourlyStats.exits,
+            ParkingHourlyStats.occupied_seconds,
+        ).order_by(ParkingHourlyStats.parking_id, ParkingHourlyStats.bucket)
+    )
+    return [(*row[:4], round(row[4], 3)) for row in rows]
+
+
+class TestDataGenerator:
+    """Тесты генератора больших наборов данных"""
+
+    def test_plates_unique_across_calls(self):
+        """Номера уникальны и не повторяются при продолжении с start"""
+        generator = DataGenerator(seed=1, pool_size=50)
+        first = [row[3] for row in generator.clients(5000)]
+        second = [row[3] for row in generator.clients(5000, start=5000)]
+        plates = first + second
+        assert len(set(plates)) == len(plates)
+        assert all(len(plate) <= 10 for plate in plates)
+
+    def test_sessions_do_not_overlap(self):
+        """Сессии клиента закрыты, в окне дат и не пересекаются"""
+        generator = DataGenerator(seed=2, pool_size=50)
+        end = datetime(2024, 7, 1)
+        sessions = list(generator.sessions(range(1, 201), [1, 2, 3], 5, 30, end))
+        assert sessions
+        by_client = {}
+        for client_id, parking_id, time_in, time_out in sessions:
+            assert parking_id in (1, 2, 3)
+            time_in = datetime.fromisoformat(time_in)
+            time_out = datetime.fromisoformat(time_out)
+            assert datetime(2024, 6, 1) <= time_in < time_out < end
+            by_client.setdefault(client_id, []).append((time_in, time_out))
+        for intervals in by_client.values():
+            intervals.sort()
+            for (_, previous_out), (next_in, _) in zip(intervals, intervals[1:]):
+                assert previous_out <= next_in
+
+    def test_populate(self, tmp_path):
+        """Строки пишутся в БД и читаются моделями"""
+
+        class Profile(Config):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'parking.db'}"
+            START_BACKGROUND_JOBS = False
+
+        app = create_app(Profile)
+        with app.app_context():
+            counts = populate(2000, sessions_per_client=3, seed=3)
+            assert counts["clients"] == 2000
+            assert counts["parkings"] == 2
+            assert db.session.scalar(select(func.count(Client.id))) == 2000
+            assert (
+                db.session.scalar(select(func.count(ClientParking.id)))
+                == counts["client_parkings"]
+            )
+            session = db.session.scalars(select(ClientParking).limit(1)).one()
+            assert isinstance(session.time_in, datetime)
+            assert session.time_out > session.time_in
+
+            # Итоги часов, посчитанные генератором, совпадают с пересчетом
+            generated = stats_snapshot()
+            assert len(generated) == counts["parking_hourly_stats"]
+            rebuild_stats()
+            assert stats_snapshot() == generated
+
+            # Повторный вызов продолжает идентификаторы и номера
+            populate(100, seed=4)
+            assert db.session.scalar(select(func.count(Client.id))) == 2100
+            db.session.remove()
+            db.engine.dispose()
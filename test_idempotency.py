@@ -0,0 +1,177 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, select
+
+from parking_app import idempotency
+from parking_app.idempotency import purge_idempotency_keys
+from parking_app.models import ClientParking, IdempotencyKey
+
+
+@pytest.fixture
+def headers():
+    """Новый ключ на тест: кэш ответов живет в приложении между тестами"""
+    return {"Idempotency-Key": str(uuid.uuid4())}
+
+
+@pytest.fixture
+def parked(client, sample_client, sample_parking):
+    """Данные запроса клиента, стоящего на парковке"""
+    data = {"client_id": sample_client.id, "parking_id": sample_parking.id}
+    assert client.post("/client_parkings", data=data).status_code == 201
+    return data
+
+
+@pytest.mark.parking
+class TestIdempotency:
+    """Тесты повторов запросов с Idempotency-Key"""
+
+    def test_exit_replayed_from_cache(self, client, query_budget, parked, headers):
+        """Повтор выезда возвращает первый ответ без запросов к БД"""
+        first = client.delete("/client_parkings", data=parked, headers=headers)
+        assert first.status_code == 200
+
+        with query_budget(0):
+            retry = client.delete("/client_parkings", data=parked, headers=headers)
+
+        assert retry.status_code == 200
+        assert retry.get_data() == first.get_data()
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        assert "Idempotent-Replayed" not in first.headers
+
+    def test_replayed_from_db(self, app, client, query_budget, parked, headers):
+        """После перезапуска ответ читается из idempotency_key"""
+        first = client.delete("/client_parkings", data=parked, headers=headers)
+        app.extensions["idempotency_cache"].clear()
+
+        with query_budget(1) as counter:
+            retry = client.delete("/client_parkings", data=parked, headers=headers)
+
+        assert retry.status_code == 200
+        assert retry.get_json() == first.get_json()
+        assert "client_parking" not in " ".join(counter.statements)
+
+    def test_enter_retry_not_duplicate(
+        self, client, db_session, sample_client, sample_parking, headers
+    ):
+        """Повтор заезда - тот же 201, а не отказ и не вторая сессия"""
+        data = {"client_id": sample_client.id, "parking_id": sample_parking.id}
+        first = client.post("/client_parkings", json=data, headers=headers)
+        retry = client.post("/client_parkings", json=data, headers=headers)
+
+        assert first.status_code == retry.status_code == 201
+        assert retry.get_json() == first.get_json()
+        sessions = db_session.session.scalars(
+            select(ClientParking).where(ClientParking.client_id == sample_client.id)
+        ).all()
+        assert len(sessions) == 1
+
+    def test_retry_during_first_request(
+        self, app, client, monkeypatch, sample_client, sample_parking, headers
+    ):
+        """Повтор, не нашедший ключ до фиксации первого запроса, - тот же 201"""
+        data = {"client_id": sample_client.id, "parking_id": sample_parking.id}
+        first = client.post("/client_parkings", json=data, headers=headers)
+        app.extensions["idempotency_cache"].clear()
+
+        # Первый поиск ключа повтора прошел, пока первый запрос выполнялся
+        find_response = idempotency.find_response
+        calls = []
+
+        def find_after_first(key):
+            calls.append(key)
+            return find_response(key) if len(calls) > 1 else None
+
+        monkeypatch.setattr(idempotency, "find_response", find_after_first)
+        retry = client.post("/client_parkings", json=data, headers=headers)
+
+        assert len(calls) == 2
+        assert retry.status_code == 201
+        assert retry.get_json() == first.get_json()
+        assert retry.headers["Idempotent-Replayed"] == "true"
+
+    def test_batch_replayed(self, client, parked, headers):
+        """Пакет событий не применяется повторно"""
+        events = [{"action": "exit", **parked}, {"action": "enter", **parked}]
+        first = client.post("/client_parkings/batch", json=events, headers=headers)
+        retry = client.post("/client_parkings/batch", json=events, headers=headers)
+
+        assert [result["status"] for result in first.get_json()["results"]] == [
+            200,
+            201,
+        ]
+        assert retry.get_json() == first.get_json()
+        assert retry.headers["Idempotent-Replayed"] == "true"
+
+    def test_key_reused_for_other_request(self, client, parked, headers):
+        """Тот же ключ с другими данными - 422"""
+        assert (
+            client.delete("/client_parkings", data=parked, headers=headers).status_code
+            == 200
+        )
+        other = {**parked, "parking_id": parked["parking_id"] + 1}
+
+        response = client.delete("/client_parkings", data=other, headers=headers)
+
+        assert response.status_code == 422
+
+    def test_errors_not_stored(self, client, sample_client, sample_parking, headers):
+        """Ответ с ошибкой не сохраняется: повтор выполняется заново"""
+        data = {"client_id": sample_client.id, "parking_id": sample_parking.id}
+        assert (
+            client.delete("/client_parkings", data=data, headers=headers).status_code
+            == 404
+        )
+        client.post("/client_parkings", data=data)
+
+        response = client.delete("/client_parkings", data=data, headers=headers)
+
+        assert response.status_code == 200
+
+    def test_invalid_key(self, client, parked):
+        """Слишком длинный ключ - 400"""
+        response = client.delete(
+            "/client_parkings", data=parked, headers={"Idempotency-Key": "k" * 65}
+        )
+        assert response.status_code == 400
+
+    def test_expired_key(self, app, client, db_session, parked, headers):
+        """Устаревший ключ не повторяется и занимается новым ответом"""
+        key = headers["Idempotency-Key"]
+        created_at = datetime.now() - timedelta(seconds=app.config["IDEMPOTENCY_TTL"])
+        db_session.session.execute(
+            insert(IdempotencyKey).values(
+                key=key,
+                fingerprint="old",
+                status=200,
+                body="{}",
+                created_at=created_at - timedelta(seconds=1),
+            )
+        )
+        db_session.session.commit()
+
+        response = client.delete("/client_parkings", data=parked, headers=headers)
+        assert response.status_code == 200
+        assert "Idempotent-Replayed" not in response.headers
+
+        db_session.session.expire_all()
+        stored = db_session.session.get(IdempotencyKey, key)
+        assert stored.body == response.get_data(as_text=True)
+
+    def test_purge(self, app, db_session):
+        """Задача удаляет только устаревшие ключи"""
+        now = datetime.now()
+        ttl = timedelta(seconds=app.config["IDEMPOTENCY_TTL"])
+        row = {"fingerprint": "", "status": 200, "body": "{}"}
+        rows = [
+            {**row, "key": "old", "created_at": now - ttl - timedelta(minutes=1)},
+            {**row, "key": "fresh", "created_at": now - ttl + timedelta(minutes=1)},
+        ]
+        db_session.session.execute(insert(IdempotencyKey), rows)
+        db_session.session.commit()
+
+        purge_idempotency_keys()
+
+        keys = db_session.session.scalars(select(IdempotencyKey.key)).all()
+        assert keys == ["fresh"]
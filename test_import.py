@@ -0,0 +1,184 @@
+import io
+import json
+
+import pytest
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+from parking_app import client_import
+from parking_app.client_import import DUPLICATE_PLATE
+
+
+def post_import(client, body, content_type="text/csv"):
+    return client.post("/clients/import", data=body.encode(), content_type=content_type)
+
+
+def ndjson(*records):
+    return "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+
+class LinesStream(io.RawIOBase):
+    """Тело запроса, строки которого создаются по мере чтения"""
+
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self.pending:
+            self.pending = next(self.lines, "").encode()
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+class TestClientImport:
+    """Тесты POST /clients/import"""
+
+    def test_csv(self, client, sample_client):
+        """Строки с ошибками не мешают остальным, ошибки - по номерам строк"""
+        body = (
+            "surname,name,car_number,credit_card\n"
+            "Ершов,Ефим,ИМ00177,4000000000000002\n"
+            "Пустов,,,\n"
+            "\n"
+            f"Иванов,Иван,{sample_client.car_number},\n"
+            "Ершова,Ева,ИМ00177,\n"
+            '"Ли, мл.",Ян,,\n'
+        )
+
+        response = post_import(client, body)
+
+        assert response.status_code == 200
+        assert response.get_json() == {
+            "imported": 2,
+            "failed": 3,
+            "errors": [
+                {"line": 3, "error": "Имя и фамилия обязательны"},
+                {"line": 5, "error": DUPLICATE_PLATE},
+                {"line": 6, "error": DUPLICATE_PLATE},
+            ],
+        }
+        found = client.get("/clients/search", query_string={"q": "Ершов"}).get_json()
+        assert found == [
+            {
+                "id": found[0]["id"],
+                "name": "Ефим",
+                "surname": "Ершов",
+                "credit_card": "4000000000000002",
+                "car_number": "ИМ00177",
+            }
+        ]
+        found = client.get("/clients/search", query_string={"q": "Ли"}).get_json()
+        assert [row["surname"] for row in found] == ["Ли, мл."]
+
+    def test_ndjson(self, client):
+        body = ndjson(
+            {"name": "Ефим", "surname": "Ершов"},
+            ["Ефим", "Ершов"],
+            {"name": "Ефим", "surname": 5},
+            {"name": "Ефим", "surname": "Ершов", "phone": "1"},
+        )
+        body += "{\n\n"
+
+        report = post_import(client, body, "application/x-ndjson").get_json()
+
+        assert report["imported"] == 1
+        assert report["errors"] == [
+            {"line": 2, "error": "Ожидается объект JSON"},
+            {"line": 3, "error": "Значения полей должны быть строками"},
+            {"line": 4, "error": "Неизвестные поля: phone"},
+            {"line": 5, "error": "Некорректный JSON"},
+        ]
+
+    def test_batches(self, app, client, query_budget, monkeypatch):
+        """По запросу проверки номеров и одной вставке на порцию"""
+        monkeypatch.setitem(app.config, "IMPORT_BATCH_SIZE", 2)
+        body = ndjson(
+            *(
+                {"name": "Ефим", "surname": "Ершов", "car_number": f"ИМ{i % 5:03d}77"}
+                for i in range(6)
+            )
+        )
+
+        with query_budget(6) as counter:
+            report = post_import(client, body, "application/x-ndjson").get_json()
+
+        assert len(counter.statements) == 6
+        assert report["imported"] == 5
+        assert report["errors"] == [{"line": 6, "error": DUPLICATE_PLATE}]
+
+    def test_errors_limit(self, app, client, monkeypatch):
+        """В отчете первые IMPORT_MAX_ERRORS ошибок, failed - все"""
+        monkeypatch.setitem(app.config, "IMPORT_MAX_ERRORS", 2)
+        report = post_import(client, "name,surname\n" + "Ефим,\n" * 5).get_json()
+        assert report["failed"] == 5
+        assert [error["line"] for error in report["errors"]] == [2, 3]
+
+    def test_long_ndjson_line(self, client, monkeypatch):
+        monkeypatch.setattr(client_import, "MAX_LINE_LENGTH", 60)
+        body = ndjson(
+            {"name": "Ефим", "surname": "Ершов" * 10},
+            {"name": "Ефим", "surname": "Ершов"},
+        )
+        report = post_import(client, body, "application/x-ndjson").get_json()
+        assert report["imported"] == 1
+        assert report["errors"] == [{"line": 1, "error": "Строка длиннее 60 байт"}]
+
+    @pytest.mark.parametrize(
+        "body",
+        [
+            "",
+            "name;surname\n",
+            "name,surname,name\n",
+            "name,surname,phone\n",
+            "name,surname\n" + "Ефим," + "Ершов" * 20000 + "\n",
+        ],
+    )
+    def test_bad_csv(self, client, body):
+        response = post_import(client, body)
+        assert response.status_code == 400
+        assert response.get_json()["imported"] == 0
+
+    def test_stops_on_bad_encoding(self, client):
+        """Ошибка кодировки останавливает чтение, загруженное до нее остается"""
+        body = "name,surname\nЕфим,Ершов\n".encode() + b"\xff\xfe,x\n"
+        response = client.post("/clients/import", data=body, content_type="text/csv")
+        assert response.status_code == 400
+        assert response.get_json()["imported"] == 1
+
+    def test_unsupported_type(self, client):
+        response = post_import(client, "{}", "application/json")
+        assert response.status_code == 415
+
+    def test_streams_body(self, app, client, monkeypatch):
+        """Порции вставляются, пока тело еще читается"""
+        monkeypatch.setitem(app.config, "IMPORT_BATCH_SIZE", 10)
+        versions = app.extensions["table_versions"]
+        before = versions.get("client")
+        lines = ["name,surname\n"] + [f"Ефим,Ершов{i}\n" for i in range(50)]
+        seen_before_last = []
+
+        def body():
+            yield from lines[:-1]
+            seen_before_last.append(versions.get("client"))
+            yield lines[-1]
+
+        # Тестовый клиент перематывает input_stream, чтобы узнать длину,
+        # поэтому поток подставляется в готовое окружение WSGI
+        environ = EnvironBuilder(
+            "/clients/import", method="POST", content_type="text/csv"
+        ).get_environ()
+        environ["wsgi.input"] = LinesStream(body())
+        environ["CONTENT_LENGTH"] = str(sum(len(line.encode()) for line in lines))
+
+        response = client.open(Request(environ))
+
+        assert response.get_json()["imported"] == 50
+        # Четыре порции из пяти вставлены до последней строки тела
+        assert seen_before_last == [before + 4]
+        assert versions.get("client") == before + 5
@@ -0,0 +1,93 @@
+import pytest
+
+from parking_app.metrics import Histogram, MetricsRegistry, RequestStats
+
+
+def metric_value(text, prefix):
+    """Значение первой строки метрик, начинающейся с prefix; 0 - строки нет"""
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def scrape(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    return response.get_data(as_text=True)
+
+
+class TestRegistry:
+    """Тесты гистограммы и вывода в формате Prometheus"""
+
+    def test_histogram_buckets(self):
+        """Значение попадает в первую корзину с границей не меньше него"""
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value)
+        assert histogram.counts == [2, 1, 1]
+        assert histogram.sum == pytest.approx(3.65)
+
+    def test_render(self):
+        """Корзины выводятся накопленными, счетчики - с метками маршрута"""
+        registry = MetricsRegistry((0.1, 1.0))
+        stats = RequestStats()
+        stats.queries, stats.rows_read, stats.rows_written = 3, 10, 2
+        registry.record(("/clients", "GET"), 200, 0.05, stats)
+        registry.record(("/clients", "GET"), 404, 0.5, RequestStats())
+
+        text = registry.render()
+
+        labels = 'route="/clients",method="GET"'
+        bucket = "parking_http_request_duration_seconds_bucket"
+        assert f'{bucket}{{{labels},le="0.1"}} 1' in text
+        assert f'{bucket}{{{labels},le="1.0"}} 2' in text
+        assert f'{bucket}{{{labels},le="+Inf"}} 2' in text
+        assert f'parking_http_requests_total{{{labels},status="404"}} 1' in text
+        assert f"parking_sql_queries_total{{{labels}}} 3" in text
+        assert f"parking_db_rows_read_total{{{labels}}} 10" in text
+        assert f"parking_db_rows_written_total{{{labels}}} 2" in text
+        assert "# TYPE parking_http_request_duration_seconds histogram" in text
+
+
+class TestMetricsEndpoint:
+    """Тесты сбора метрик запросов приложения"""
+
+    def test_read_request(self, client, sample_client):
+        """Страница клиентов: запрос, SQL-запрос и прочитанная строка"""
+        labels = 'route="/clients",method="GET"'
+        before = scrape(client)
+
+        response = client.get(
+            "/clients", query_string={"after_id": sample_client.id - 1, "limit": 1}
+        )
+        assert response.status_code == 200
+
+        after = scrape(client)
+        requests = f'parking_http_requests_total{{{labels},status="200"}}'
+        assert metric_value(after, requests) - metric_value(before, requests) == 1
+        for name in ("parking_sql_queries_total", "parking_db_rows_read_total"):
+            prefix = f"{name}{{{labels}}}"
+            assert metric_value(after, prefix) - metric_value(before, prefix) == 1
+
+    @pytest.mark.parking
+    def test_write_request(self, client, sample_client, sample_parking):
+        """Заезд: новая сессия, свободные места и итоги часа"""
+        labels = 'route="/client_parkings",method="POST"'
+        prefix = f"parking_db_rows_written_total{{{labels}}}"
+        before = metric_value(scrape(client), prefix)
+
+        response = client.post(
+            "/client_parkings",
+            data={"client_id": sample_client.id, "parking_id": sample_parking.id},
+        )
+        assert response.status_code == 201
+
+        assert metric_value(scrape(client), prefix) - before == 3
+
+    def test_unmatched_route(self, client):
+        """Запросы к несуществующим адресам собираются под одной меткой"""
+        client.get("/no-such-page")
+        text = scrape(client)
+        assert 'route="<unmatched>",method="GET",status="404"' in text
@@ -0,0 +1,184 @@
+import sys
+
+import pytest
+from sqlalchemy import create_engine, inspect, select, text
+
+from parking_app import migrations
+from parking_app.app import create_app, db
+from parking_app.config import PROFILES, HighThroughputConfig
+from parking_app.models import ClientParking, PaymentIntent
+
+
+@pytest.fixture
+def profile(tmp_path, monkeypatch):
+    """Профиль high-throughput на пустой файловой базе, под именем test"""
+
+    class Profile(HighThroughputConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'parking.db'}"
+        START_BACKGROUND_JOBS = False
+
+    monkeypatch.setitem(PROFILES, "test", Profile)
+    return Profile
+
+
+def user_version(uri):
+    engine = create_engine(uri)
+    with engine.connect() as connection:
+        version = connection.exec_driver_sql("PRAGMA user_version").scalar_one()
+    engine.dispose()
+    return version
+
+
+def dispose(app):
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+class TestMigrations:
+    """Тесты версионной схемы БД"""
+
+    def test_schema_matches_models(self, app):
+        """Миграции создают ровно таблицы, колонки и индексы моделей"""
+        inspector = inspect(db.engine)
+        # Полнотекстовый индекс и его служебные таблицы - не модели
+        tables = {
+            name
+            for name in inspector.get_table_names()
+            if not name.startswith("client_fts")
+        }
+        assert tables == set(db.metadata.tables)
+        for name, table in db.metadata.tables.items():
+            columns = {
+                column["name"]: (str(column["type"]), column["nullable"])
+                for column in inspector.get_columns(name)
+            }
+            assert columns == {
+                column.name: (str(column.type), column.nullable)
+                for column in table.columns
+            }, name
+            indexes = {index["name"] for index in inspector.get_indexes(name)}
+            assert indexes == {index.name for index in table.indexes}, name
+
+    def test_version_recorded(self, db_session):
+        version = db_session.session.execute(text("PRAGMA user_version")).scalar_one()
+        assert version == migrations.SCHEMA_VERSION
+
+    def test_outdated_schema_without_auto_migrate(self, profile, monkeypatch):
+        """Без SCHEMA_AUTO_MIGRATE запуск на старой схеме - ошибка, CLI ее чинит"""
+        with pytest.raises(
+            migrations.SchemaVersionError, match="parking_app.migrations"
+        ):
+            create_app(profile)
+
+        monkeypatch.setattr(sys, "argv", ["migrations", "--profile", "test"])
+        migrations.main()
+
+        assert user_version(profile.SQLALCHEMY_DATABASE_URI) == (
+            migrations.SCHEMA_VERSION
+        )
+        dispose(create_app(profile))
+
+    def test_adopts_create_all_database(self, profile):
+        """База, созданная db.create_all(), принимается с данными"""
+        engine = create_engine(profile.SQLALCHEMY_DATABASE_URI)
+        db.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(
+                text("INSERT INTO client (name, surname) VALUES ('Иван', 'Иванов')")
+            )
+        engine.dispose()
+
+        app = create_app(profile, {"SCHEMA_AUTO_MIGRATE": True})
+
+        with app.app_context():
+            assert (
+                db.session.execute(text("SELECT name FROM client")).scalar() == "Иван"
+            )
+        # Существующие клиенты попадают в индекс поиска
+        response = app.test_client().get("/clients/search?q=иванов")
+        assert [row["name"] for row in response.get_json()] == ["Иван"]
+        dispose(app)
+        assert user_version(profile.SQLALCHEMY_DATABASE_URI) == (
+            migrations.SCHEMA_VERSION
+        )
+
+    def test_session_ids_after_payments(self, profile):
+        """Третья миграция: новые сессии не получают id из платежей"""
+        engine = create_engine(profile.SQLALCHEMY_DATABASE_URI)
+        with engine.begin() as connection:
+            for migration in migrations.MIGRATIONS[:2]:
+                for statement in migration.statements:
+                    connection.exec_driver_sql(statement)
+            connection.exec_driver_sql("PRAGMA user_version = 2")
+            connection.execute(
+                text(
+                    "INSERT INTO client (id, name, surname) VALUES (1, 'Иван', 'Иванов')"
+                )
+            )
+            connection.execute(
+                text(
+                    "INSERT INTO parking (id, address, count_places, "
+                    "count_available_places) VALUES (1, 'Адрес', 1, 1)"
+                )
+            )
+            # Платеж за сессию 7, которую уже удалили
+            connection.execute(
+                text(
+                    "INSERT INTO payment_intent (client_parking_id, client_id, "
+                    "amount, status, attempts, next_attempt_at, created_at) "
+                    "VALUES (7, 1, 50, 'succeeded', 1, '2024-05-01', '2024-05-01')"
+                )
+            )
+        engine.dispose()
+
+        app = create_app(profile, {"SCHEMA_AUTO_MIGRATE": True})
+
+        with app.app_context():
+            session = ClientParking(client_id=1, parking_id=1)
+            db.session.add(session)
+            db.session.commit()
+            assert session.id == 8
+        dispose(app)
+
+    def test_amount_in_kopecks(self, profile):
+        """Пятая миграция: сумма платежа в рублях FLOAT - целые копейки"""
+        engine = create_engine(profile.SQLALCHEMY_DATABASE_URI)
+        with engine.begin() as connection:
+            for migration in migrations.MIGRATIONS[:4]:
+                for statement in migration.statements:
+                    connection.exec_driver_sql(statement)
+            connection.exec_driver_sql("PRAGMA user_version = 4")
+            connection.execute(
+                text(
+                    "INSERT INTO client (id, name, surname) VALUES (1, 'Иван', 'Иванов')"
+                )
+            )
+            connection.execute(
+                text(
+                    "INSERT INTO payment_intent (client_parking_id, client_id, "
+                    "amount, status, attempts, next_attempt_at, created_at) "
+                    "VALUES (7, 1, 19.99, 'pending', 0, '2024-05-01', '2024-05-01')"
+                )
+            )
+        engine.dispose()
+
+        app = create_app(profile, {"SCHEMA_AUTO_MIGRATE": True})
+
+        with app.app_context():
+            amount = db.session.scalar(select(PaymentIntent.amount))
+            assert amount == 1999
+            assert isinstance(amount, int)
+        dispose(app)
+
+    def test_newer_schema(self, profile):
+        """База новее приложения не запускается даже с автомиграцией"""
+        engine = create_engine(profile.SQLALCHEMY_DATABASE_URI)
+        with engine.begin() as connection:
+            connection.exec_driver_sql(
+                f"PRAGMA user_version = {migrations.SCHEMA_VERSION + 1}"
+            )
+        engine.dispose()
+
+        with pytest.raises(migrations.SchemaVersionError, match="новее"):
+            create_app(profile, {"SCHEMA_AUTO_MIGRATE": True})
@@ -0,0 +1,218 @@
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from parking_app import payments
+from parking_app.app import db
+from parking_app.models import Client, PaymentIntent
+
+
+@pytest.fixture
+def processor(app, monkeypatch):
+    """Свой процессор-заглушка на время теста"""
+    stub = payments.StubProcessor()
+    monkeypatch.setitem(app.extensions, "payment_processor", stub)
+    return stub
+
+
+@pytest.fixture
+def intent_id(client, sample_client_parking, processor):
+    """Платеж, созданный выездом клиента с картой"""
+    response = client.delete(
+        "/client_parkings",
+        data={
+            "client_id": sample_client_parking.client_id,
+            "parking_id": sample_client_parking.parking_id,
+        },
+    )
+    assert response.status_code == 200
+    return response.get_json()["payment"]["id"]
+
+
+def get_intent(db_session, intent_id):
+    db_session.session.expire_all()
+    return db_session.session.get(PaymentIntent, intent_id)
+
+
+class SlowProcessor(payments.StubProcessor):
+    """Процессор, на каждое списание которого уходит delay секунд"""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+        self.calls = []
+
+    def charge(self, idempotency_key, card, amount):
+        self.calls.append(idempotency_key)
+        time.sleep(self.delay)
+        return super().charge(idempotency_key, card, amount)
+
+
+class TestPaymentOutbox:
+    """Тесты очереди платежей"""
+
+    @pytest.mark.parking
+    def test_exit_writes_intent(self, client, db_session, processor, intent_id):
+        """Выезд записывает платеж и не обращается к процессору"""
+        intent = get_intent(db_session, intent_id)
+        assert intent.status == "pending"
+        assert intent.attempts == 0
+        # 50 рублей в копейках
+        assert intent.amount == 5000
+        assert processor.charges == []
+
+    @pytest.mark.parking
+    def test_failed_exit_writes_nothing(
+        self, client, db_session, client_without_card, sample_parking
+    ):
+        """Отказ в выезде не оставляет платеж"""
+        data = {"client_id": client_without_card.id, "parking_id": sample_parking.id}
+        client.post("/client_parkings", data=data)
+        response = client.delete("/client_parkings", data=data)
+        assert response.status_code == 400
+        assert db_session.session.scalars(select(PaymentIntent)).all() == []
+
+    @pytest.mark.parking
+    def test_deleted_session_id_not_reused(
+        self, client, db_session, sample_client_parking, intent_id
+    ):
+        """Id удаленной сессии с платежом не достается следующей сессии"""
+        data = {
+            "client_id": sample_client_parking.client_id,
+            "parking_id": sample_client_parking.parking_id,
+        }
+        db_session.session.delete(sample_client_parking)
+        db_session.session.commit()
+
+        assert client.post("/client_parkings", data=data).status_code == 201
+        response = client.delete("/client_parkings", data=data)
+
+        assert response.status_code == 200
+        assert response.get_json()["client_parking"]["id"] > sample_client_parking.id
+
+    def test_charge_succeeds(self, db_session, processor, intent_id):
+        """Воркер списывает платеж и записывает id операции"""
+        counts = payments.process_payments()
+
+        assert counts == {"claimed": 1, "succeeded": 1, "retried": 0, "failed": 0}
+        intent = get_intent(db_session, intent_id)
+        assert intent.status == "succeeded"
+        assert intent.charge_id == "stub-1"
+        assert intent.completed_at is not None
+        assert intent.locked_until is None
+        assert [charge[0] for charge in processor.charges] == [
+            payments.idempotency_key(intent_id)
+        ]
+
+    def test_retry_with_backoff(self, db_session, processor, intent_id):
+        """Временные отказы откладывают платеж с растущей задержкой"""
+        processor.failures = [payments.PaymentUnavailable("timeout")] * 2
+
+        started = datetime.now()
+        assert payments.process_payments()["retried"] == 1
+        first = get_intent(db_session, intent_id)
+        assert first.status == "pending"
+        assert first.last_error == "timeout"
+        first_delay = first.next_attempt_at - started
+        assert timedelta(seconds=5) <= first_delay < timedelta(seconds=6)
+        # Раньше срока платеж не берется
+        assert payments.process_payments()["claimed"] == 0
+
+        started = datetime.now()
+        assert payments.process_payments(now=first.next_attempt_at)["retried"] == 1
+        second = get_intent(db_session, intent_id)
+        second_delay = second.next_attempt_at - started
+        assert timedelta(seconds=10) <= second_delay < timedelta(seconds=11)
+
+        assert payments.process_payments(now=second.next_attempt_at)["succeeded"] == 1
+        intent = get_intent(db_session, intent_id)
+        assert intent.status == "succeeded"
+        assert intent.attempts == 3
+        assert intent.last_error is None
+
+    def test_declined_fails_at_once(self, db_session, processor, intent_id):
+        """Отклоненный платеж не повторяется"""
+        processor.failures = [payments.PaymentDeclined("Недостаточно средств")]
+
+        assert payments.process_payments()["failed"] == 1
+        intent = get_intent(db_session, intent_id)
+        assert intent.status == "failed"
+        assert intent.last_error == "Недостаточно средств"
+
+    def test_max_attempts(self, app, db_session, processor, intent_id, monkeypatch):
+        """После PAYMENT_MAX_ATTEMPTS временных отказов платеж - failed"""
+        monkeypatch.setitem(app.config, "PAYMENT_MAX_ATTEMPTS", 2)
+        processor.failures = [payments.PaymentUnavailable("timeout")] * 2
+        far_future = datetime.now() + timedelta(days=1)
+
+        assert payments.process_payments()["retried"] == 1
+        assert payments.process_payments(now=far_future)["failed"] == 1
+        assert get_intent(db_session, intent_id).status == "failed"
+
+    def test_expired_lease_reclaimed(self, app, db_session, processor, intent_id):
+        """Платеж упавшего воркера берется снова после окончания аренды"""
+        now = datetime.now()
+        assert len(payments.claim_payments(10, now)) == 1
+        assert payments.process_payments(now=now)["claimed"] == 0
+
+        lease = timedelta(seconds=app.config["PAYMENT_LEASE"] + 1)
+        assert payments.process_payments(now=now + lease)["succeeded"] == 1
+        assert get_intent(db_session, intent_id).attempts == 2
+
+    def test_processor_idempotency_key(self):
+        """Повторное списание с тем же ключом не списывает деньги"""
+        processor = payments.StubProcessor()
+        first = processor.charge("payment-intent-1", "4000000000000002", 50)
+        again = processor.charge("payment-intent-1", "4000000000000002", 50)
+        assert again == first
+        assert len(processor.charges) == 1
+
+    def test_slow_processor_two_workers(self, file_app, monkeypatch):
+        """Порция дольше аренды: каждый платеж списывается один раз
+
+        Аренда продлевается перед каждым списанием, итог фиксируется сразу,
+        поэтому второй воркер берет только платежи, до которых первый еще
+        не дошел, и первый их пропускает.
+        """
+        processor = SlowProcessor(delay=0.2)
+        monkeypatch.setitem(file_app.extensions, "payment_processor", processor)
+        monkeypatch.setitem(file_app.config, "PAYMENT_LEASE", 0.5)
+        client = Client(name="Ефим", surname="Ершов", credit_card="4000000000000002")
+        db.session.add(client)
+        db.session.commit()
+        now = datetime.now()
+        intent_ids = [
+            payments.create_payment_intent(session_id, client.id, 50, now)
+            for session_id in range(1, 5)
+        ]
+        db.session.commit()
+        deadline = time.monotonic() + 3
+
+        def worker():
+            with file_app.app_context():
+                while time.monotonic() < deadline:
+                    # Порция из четырех платежей идет 0.8 с при аренде 0.5 с
+                    payments.process_payments(batch_size=4)
+                    time.sleep(0.02)
+
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        keys = [payments.idempotency_key(intent_id) for intent_id in intent_ids]
+        assert Counter(processor.calls) == Counter(keys)
+        assert sorted(charge[0] for charge in processor.charges) == sorted(keys)
+        statuses = db.session.scalars(select(PaymentIntent.status)).all()
+        assert statuses == ["succeeded"] * 4
+
+    def test_process_payments_command(self, app, processor, intent_id):
+        """Команда flask process-payments"""
+        result = app.test_cli_runner().invoke(args=["process-payments"])
+        assert result.exit_code == 0, result.output
+        assert "Списано: 1" in result.output
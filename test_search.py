@@ -0,0 +1,131 @@
+import pytest
+
+from parking_app.models import Client
+
+
+@pytest.fixture
+def clients(db_session):
+    """Клиенты с редкими фамилиями, чтобы не пересекаться с другими данными"""
+    rows = [
+        Client(name="Ждан", surname="Шиповникова", car_number="Ш001ПН77"),
+        Client(name="Шиповник", surname="Ждановская", car_number="Ш002ПН77"),
+        Client(name="Ждан", surname="Шиповников", car_number="Ш003ПН77"),
+        Client(name="Агафон", surname="Шиповникова", car_number="Ш004ПН77"),
+        Client(name="Агафон", surname="Ждановская", car_number="Ш005ПН77"),
+    ]
+    db_session.session.add_all(rows)
+    db_session.session.commit()
+    return rows
+
+
+def search(client, q, **params):
+    response = client.get("/clients/search", query_string={"q": q, **params})
+    assert response.status_code == 200
+    return response
+
+
+def found_ids(response):
+    return [row["id"] for row in response.get_json()]
+
+
+class TestClientSearch:
+    """Тесты GET /clients/search"""
+
+    def test_prefix_any_case(self, client, clients):
+        """Начало фамилии в любом регистре находит всех, у кого оно есть"""
+        response = search(client, "шИпОвн")
+        assert set(found_ids(response)) == {row.id for row in clients[:4]}
+        assert response.get_json()[0].keys() == clients[0].to_json().keys()
+
+    def test_all_words_match(self, client, clients):
+        response = search(client, "Агафон Жданов")
+        assert found_ids(response) == [clients[4].id]
+
+    def test_plate_prefix(self, client, clients):
+        assert found_ids(search(client, "ш003")) == [clients[2].id]
+
+    def test_exact_word_first(self, client, clients):
+        """Точное совпадение слова выше совпадения его начала"""
+        ids = found_ids(search(client, "Шиповников"))
+        assert ids[0] == clients[2].id
+        assert set(ids[1:]) == {clients[0].id, clients[3].id}
+
+    def test_pages(self, client, clients):
+        """Курсор проходит все совпадения без повторов и в порядке выдачи"""
+        expected = found_ids(search(client, "шиповн"))
+        pages = []
+        params = {"limit": 2}
+        while True:
+            response = search(client, "шиповн", **params)
+            pages.append(found_ids(response))
+            if "X-Next-Cursor" not in response.headers:
+                break
+            params["cursor"] = response.headers["X-Next-Cursor"]
+
+        assert [len(page) for page in pages] == [2, 2]
+        assert sum(pages, []) == expected
+
+    def test_index_follows_changes(self, client, db_session, clients):
+        """Триггеры обновляют индекс при изменении и удалении клиента"""
+        clients[0].surname = "Репейникова"
+        db_session.session.delete(clients[3])
+        db_session.session.commit()
+
+        assert set(found_ids(search(client, "шиповникова"))) == set()
+        assert found_ids(search(client, "Репейн")) == [clients[0].id]
+
+    def test_new_client_found(self, client, clients):
+        """Созданный через API клиент виден и в закэшированном поиске"""
+        search(client, "Шиповн")
+        created = client.post(
+            "/clients", data={"name": "Ефрем", "surname": "Шиповников"}
+        ).get_json()
+
+        assert created["id"] in found_ids(search(client, "Шиповн"))
+
+    def test_query_syntax_is_text(self, client, clients):
+        """Синтаксис FTS5 в строке поиска не ломает запрос"""
+        response = search(client, 'NEAR("шиповн" OR ждан*')
+        assert found_ids(response) == []
+
+    def test_rank_window(self, app, client, monkeypatch, clients):
+        """Ранжируются только первые SEARCH_RANK_WINDOW совпадений, и каждая
+        страница неполной выдачи помечена заголовком"""
+        monkeypatch.setitem(app.config, "SEARCH_RANK_WINDOW", 3)
+        first = search(client, "шиповн", limit=2)
+        last = search(client, "шиповн", limit=2, cursor=first.headers["X-Next-Cursor"])
+
+        assert len(found_ids(first) + found_ids(last)) == 3
+        assert "X-Next-Cursor" not in last.headers
+        assert first.headers["X-Search-Truncated"] == "1"
+        assert last.headers["X-Search-Truncated"] == "1"
+
+    def test_relevant_match_outside_window(self, app, client, monkeypatch, clients):
+        """Точное совпадение за окном не попадает в выдачу, но выдача помечена
+        неполной; в пределах окна оно первое и пометки нет"""
+        exact = clients[2].id
+        monkeypatch.setitem(app.config, "SEARCH_RANK_WINDOW", 1)
+        response = search(client, "Шиповников")
+        assert exact not in found_ids(response)
+        assert response.headers["X-Search-Truncated"] == "1"
+
+        # Другой limit - другой ключ кэша ответов
+        monkeypatch.setitem(app.config, "SEARCH_RANK_WINDOW", 3)
+        response = search(client, "Шиповников", limit=10)
+        assert found_ids(response)[0] == exact
+        assert "X-Search-Truncated" not in response.headers
+
+    @pytest.mark.parametrize(
+        "params",
+        [
+            {},
+            {"q": " !? "},
+            {"q": "Ждан", "limit": 0},
+            {"q": "Ждан", "cursor": "abc"},
+            {"q": "Ждан", "cursor": "nan:1"},
+        ],
+    )
+    def test_bad_request(self, client, params):
+        response = client.get("/clients/search", query_string=params)
+        assert response.status_code == 400
+        assert "error" in response.get_json()
@@ -0,0 +1,48 @@
+import json
+from datetime import datetime
+
+from sqlalchemy import select
+
+from parking_app import serializers
+from parking_app.models import ClientParking
+
+
+class TestSerializers:
+    """Тесты собранных сериализаторов моделей"""
+
+    def test_object_serializer_matches_columns(self, sample_client):
+        """Сериализатор объекта возвращает все колонки таблицы"""
+        serialize = serializers.compile_object_serializer(sample_client.__table__)
+        assert serialize(sample_client) == {
+            c.name: getattr(sample_client, c.name)
+            for c in sample_client.__table__.columns
+        }
+        assert sample_client.to_json() == serialize(sample_client)
+
+    def test_row_serializer_formats_dates_like_jsonify(
+        self, app, db_session, sample_client_parking
+    ):
+        """Строка Core-запроса сериализуется так же, как объект через jsonify"""
+        table = ClientParking.__table__
+        row = db_session.session.execute(
+            select(*table.columns).where(table.c.id == sample_client_parking.id)
+        ).one()
+
+        serialized = serializers.compile_row_serializer(table)(row)
+
+        assert serialized == json.loads(app.json.dumps(sample_client_parking.to_json()))
+        assert serialized["time_out"] is None
+
+    def test_row_serializer_keeps_column_order(self):
+        """Значения берутся по позиции колонки в таблице"""
+        serialize = serializers.compile_row_serializer(ClientParking.__table__)
+        time_in = datetime(2024, 5, 1, 10, 30)
+        row = (1, 2, 3, time_in, None)
+
+        assert serialize(row) == {
+            "id": 1,
+            "client_id": 2,
+            "parking_id": 3,
+            "time_in": "Wed, 01 May 2024 10:30:00 GMT",
+            "time_out": None,
+        }
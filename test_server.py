@@ -0,0 +1,99 @@
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+from urllib.request import Request, urlopen
+
+from parking_app.server import PreforkServer, WorkerServer
+
+
+def call(address, path, data=None):
+    host, port = address
+    request = Request(
+        f"http://{host}:{port}{path}",
+        data=json.dumps(data).encode() if data is not None else None,
+        headers={"Content-Type": "application/json"},
+    )
+    with urlopen(request, timeout=10) as response:
+        body = response.read()
+        if response.headers.get_content_type() != "application/json":
+            return response.status, body
+        return response.status, json.loads(body)
+
+
+class TestWorkerServer:
+    """Тесты WSGI-сервера воркера"""
+
+    def test_stops_after_max_requests(self, app):
+        """После max_requests запросов воркер перестает принимать соединения"""
+        listener = socket.create_server(("127.0.0.1", 0))
+        listener.setblocking(False)
+        server = WorkerServer(listener, app, max_requests=3)
+        thread = threading.Thread(
+            target=server.serve_forever, args=(0.05,), daemon=True
+        )
+        thread.start()
+
+        for _ in range(3):
+            assert call(listener.getsockname(), "/metrics")[0] == 200
+        thread.join(timeout=5)
+
+        assert not thread.is_alive()
+        assert server.wait_idle(5)
+        assert server.handled == 3
+        listener.close()
+
+
+class TestPreforkServer:
+    """Тесты многопроцессного сервера"""
+
+    def test_recycles_workers_and_stops(self, file_app):
+        """Воркеры перезапускаются по числу запросов, SIGTERM останавливает все"""
+        server = PreforkServer(file_app, port=0, workers=2, max_requests=3)
+        server.max_requests_jitter = 0
+        server.run_jobs = False
+        server.bind()
+        master = multiprocessing.get_context("fork").Process(target=server.run)
+        master.start()
+        try:
+            statuses = [
+                call(server.address, "/clients", {"name": f"Имя{i}", "surname": "Ф"})[0]
+                for i in range(10)
+            ]
+            status, clients = call(server.address, "/clients")
+        finally:
+            os.kill(master.pid, signal.SIGTERM)
+            master.join(timeout=15)
+
+        assert statuses == [201] * 10
+        assert status == 200
+        assert len(clients) == 10
+        assert master.exitcode == 0
+
+    def test_availability_shared_between_workers(self, file_app):
+        """Парковка, созданная через один воркер, видна во всех"""
+        server = PreforkServer(file_app, port=0, workers=2)
+        server.run_jobs = False
+        server.bind()
+        master = multiprocessing.get_context("fork").Process(target=server.run)
+        master.start()
+        try:
+            status, parking = call(
+                server.address,
+                "/parkings",
+                {"address": "ул. Общая, д. 1", "count_places": 3},
+            )
+            results = [
+                call(server.address, f"/parkings/{parking['id']}/availability")
+                for _ in range(20)
+            ]
+        finally:
+            os.kill(master.pid, signal.SIGTERM)
+            master.join(timeout=15)
+
+        assert status == 201
+        expected = {"parking_id": parking["id"], "count_available_places": 3}
+        assert results == [(200, expected)] * 20
+        assert master.exitcode == 0
@@ -0,0 +1,167 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, select
+
+from parking_app.models import ClientParking, ParkingHourlyStats
+from parking_app.stats import occupancy_by_hour, rebuild_stats, record_entry
+
+
+def stats_rows(db_session, parking_id):
+    """Итоги парковки по часам, секунды округлены до миллисекунд"""
+    rows = db_session.session.execute(
+        select(
+            ParkingHourlyStats.bucket,
+            ParkingHourlyStats.entries,
+            ParkingHourlyStats.exits,
+            ParkingHourlyStats.occupied_seconds,
+        )
+        .where(ParkingHourlyStats.parking_id == parking_id)
+        .order_by(ParkingHourlyStats.bucket)
+    )
+    return [
+        (bucket, entries, exits, round(seconds, 3))
+        for bucket, entries, exits, seconds in rows
+    ]
+
+
+class TestOccupancyByHour:
+    """Тесты разбиения времени стоянки по часам"""
+
+    def test_split_across_hours(self):
+        """Сессия делится по границам часов"""
+        parts = list(
+            occupancy_by_hour(datetime(2024, 3, 1, 8, 45), datetime(2024, 3, 1, 10, 15))
+        )
+        assert parts == [
+            (datetime(2024, 3, 1, 8), 15 * 60),
+            (datetime(2024, 3, 1, 9), 60 * 60),
+            (datetime(2024, 3, 1, 10), 15 * 60),
+        ]
+
+    def test_within_one_hour(self):
+        parts = list(
+            occupancy_by_hour(datetime(2024, 3, 1, 8, 10), datetime(2024, 3, 1, 8, 40))
+        )
+        assert parts == [(datetime(2024, 3, 1, 8), 30 * 60)]
+
+
+class TestParkingStats:
+    """Тесты почасовых итогов и статистики загрузки"""
+
+    @pytest.fixture
+    def history(self, db_session, sample_client, sample_parking):
+        """Две закрытые сессии 1 марта и одна открытая"""
+        rows = [
+            (datetime(2024, 3, 1, 8, 30), datetime(2024, 3, 1, 10, 0)),
+            (datetime(2024, 3, 1, 9, 15), datetime(2024, 3, 1, 9, 45)),
+            (datetime(2024, 3, 1, 11, 0), None),
+        ]
+        db_session.session.execute(
+            insert(ClientParking),
+            [
+                {
+                    "client_id": sample_client.id,
+                    "parking_id": sample_parking.id,
+                    "time_in": time_in,
+                    "time_out": time_out,
+                }
+                for time_in, time_out in rows
+            ],
+        )
+        db_session.session.commit()
+        return sample_parking
+
+    @pytest.mark.parking
+    def test_enter_and_exit_update_rollups(
+        self, client, db_session, sample_client, sample_parking
+    ):
+        """Заезд и выезд сразу попадают в итоги часа"""
+        data = {"client_id": sample_client.id, "parking_id": sample_parking.id}
+        client.post("/client_parkings", data=data)
+        client.delete("/client_parkings", data=data)
+
+        rows = stats_rows(db_session, sample_parking.id)
+        assert sum(row[1] for row in rows) == 1
+        assert sum(row[2] for row in rows) == 1
+
+        response = client.get(f"/parkings/{sample_parking.id}/stats")
+        assert response.status_code == 200
+        stats = response.get_json()
+        assert len(stats["buckets"]) in (24, 25)
+        assert stats["totals"]["entries"] == 1
+        assert stats["totals"]["exits"] == 1
+
+    def test_rebuild_from_history(self, client, db_session, history):
+        """Пересчет заполняет итоги из истории сессий"""
+        counts = rebuild_stats()
+        assert counts["sessions"] == 3
+
+        response = client.get(
+            f"/parkings/{history.id}/stats",
+            query_string={"from": "2024-03-01T08:00:00", "to": "2024-03-01T12:00:00"},
+        )
+        assert response.status_code == 200
+        buckets = response.get_json()["buckets"]
+        assert [b["entries"] for b in buckets] == [1, 1, 0, 1]
+        assert [b["exits"] for b in buckets] == [0, 1, 1, 0]
+        # 8:30-10:00 и 9:15-9:45: полчаса в 8-м часу, полтора часа в 9-м
+        assert [b["average_occupied_places"] for b in buckets] == [0.5, 1.5, 0, 0]
+        assert buckets[1]["occupancy"] == 0.15
+
+    def test_rebuild_matches_incremental(
+        self, client, db_session, sample_client, sample_parking
+    ):
+        """Пересчет дает те же итоги, что и обновления при заезде и выезде"""
+        data = {"client_id": sample_client.id, "parking_id": sample_parking.id}
+        for _ in range(3):
+            client.post("/client_parkings", data=data)
+            client.delete("/client_parkings", data=data)
+        incremental = stats_rows(db_session, sample_parking.id)
+
+        rebuild_stats(sample_parking.id)
+
+        assert stats_rows(db_session, sample_parking.id) == incremental
+
+    def test_upsert_adds_to_rebuilt_rows(self, db_session, history):
+        """UPSERT заезда прибавляется к строке часа, записанной пересчетом"""
+        rebuild_stats(history.id)
+        record_entry(history.id, datetime(2024, 3, 1, 8, 50))
+        db_session.session.commit()
+
+        rows = stats_rows(db_session, history.id)
+        assert [row[:2] for row in rows if row[0].hour == 8] == [
+            (datetime(2024, 3, 1, 8), 2)
+        ]
+
+    def test_rollback_discards_increments(self, db_session, sample_parking):
+        """Приращения откаченной транзакции не попадают в итоги"""
+        record_entry(sample_parking.id, datetime(2024, 3, 1, 8, 50))
+        db_session.session.rollback()
+        db_session.session.commit()
+
+        assert stats_rows(db_session, sample_parking.id) == []
+
+    def test_rebuild_command(self, app, history):
+        """Команда flask rebuild-stats"""
+        result = app.test_cli_runner().invoke(
+            args=["rebuild-stats", "--parking-id", str(history.id)]
+        )
+        assert result.exit_code == 0, result.output
+        assert "Сессий: 3" in result.output
+
+    def test_stats_validation(self, app, client, sample_parking):
+        """Проверка параметров from и to"""
+        url = f"/parkings/{sample_parking.id}/stats"
+        assert client.get(url, query_string={"from": "вчера"}).status_code == 400
+        reversed_range = {"from": "2024-03-02T00:00", "to": "2024-03-01T00:00"}
+        assert client.get(url, query_string=reversed_range).status_code == 400
+        too_long = {
+            "from": "2024-01-01T00:00",
+            "to": (
+                datetime(2024, 1, 1)
+                + timedelta(hours=app.config["STATS_MAX_HOURS"] + 1)
+            ).isoformat(),
+        }
+        assert client.get(url, query_string=too_long).status_code == 400
+        assert client.get("/parkings/99999/stats").status_code == 404
@@ -0,0 +1,215 @@
+import json
+from datetime import datetime, timedelta
+from random import Random
+
+import numpy as np
+import pytest
+from sqlalchemy import insert
+
+from parking_app import tariffs
+from parking_app.models import ClientParking
+from parking_app.tariffs import EPOCH, Tariff, TariffBook, rebill
+
+# Ночь с 22 до 6 часов по 10, день по 60
+NIGHT_AND_DAY = [10] * 6 + [60] * 16 + [10] * 2
+
+
+def random_sessions(rnd, count):
+    """Сессии со случайным началом в 2024 году и длительностью до трех суток"""
+    sessions = []
+    for _ in range(count):
+        time_in = datetime(2024, 1, 1) + timedelta(seconds=rnd.uniform(0, 365 * 86400))
+        time_out = time_in + timedelta(seconds=rnd.uniform(1, 3 * 86400))
+        sessions.append((time_in, time_out))
+    return sessions
+
+
+class TestTariff:
+    """Тесты расчета стоимости по тарифу"""
+
+    def test_default_tariff_matches_flat_rate(self):
+        """Тариф по умолчанию считает как прежняя формула: 50 в час, минимум 1"""
+        tariff = Tariff.from_config({"rate": 50, "minimum": 1})
+        for time_in, time_out in random_sessions(Random(1), 2000):
+            hours = (time_out - time_in).total_seconds() / 3600
+            cost = tariff.price(time_in, time_out)
+            assert isinstance(cost, int)
+            assert cost == max(1, round(hours * 50)) * 100
+
+    def test_time_of_day_rates(self):
+        """Ставка зависит от часа суток, полные сутки стоят сумму ставок"""
+        tariff = Tariff(NIGHT_AND_DAY)
+        night = tariff.price(datetime(2024, 3, 1, 22), datetime(2024, 3, 2, 2))
+        assert night == 4 * 10 * 100
+        evening = tariff.price(datetime(2024, 3, 1, 21, 30), datetime(2024, 3, 1, 23))
+        assert evening == (30 + 10) * 100
+        two_days = tariff.price(datetime(2024, 3, 1, 12), datetime(2024, 3, 3, 12))
+        assert two_days == 2 * sum(NIGHT_AND_DAY) * 100
+
+    def test_minimum_and_cap(self):
+        """Стоимость не меньше минимума и не больше потолка"""
+        tariff = Tariff.from_config({"rate": 60, "minimum": 20, "cap": 500})
+        time_in = datetime(2024, 3, 1, 12)
+        assert tariff.price(time_in, time_in + timedelta(minutes=5)) == 2000
+        assert tariff.price(time_in, time_in + timedelta(hours=2)) == 12000
+        assert tariff.price(time_in, time_in + timedelta(days=1)) == 50000
+
+    def test_kopecks(self):
+        """Суммы в рублях из настроек переводятся в копейки без ошибок float"""
+        assert tariffs.to_kopecks(0.1) == 10
+        assert tariffs.to_kopecks("19.99") == 1999
+        assert tariffs.to_kopecks(1.005) == 101
+        tariff = Tariff.from_config({"rate": 0.1, "minimum": 0.3})
+        time_in = datetime(2024, 3, 1, 12)
+        # 30 минут по 0.1 - 0.05 рубля, до целых рублей - 0, минимум 0.30
+        assert tariff.price(time_in, time_in + timedelta(minutes=30)) == 30
+        assert tariffs.to_rubles(30) == 0.3
+        assert tariffs.to_rubles(4000) == 40
+        assert isinstance(tariffs.to_rubles(4000), int)
+
+    def test_invalid_tariff(self):
+        """Ставок должно быть 24, и они не отрицательны"""
+        with pytest.raises(ValueError):
+            Tariff([50] * 23)
+        with pytest.raises(ValueError):
+            Tariff([-1] * 24)
+
+
+class TestTariffBook:
+    """Тесты тарифов парковок и векторного расчета"""
+
+    book = TariffBook.from_config(
+        {
+            "default": {"rate": 50, "minimum": 1},
+            "2": {"hourly_rates": NIGHT_AND_DAY, "cap": 700},
+            5: {"rate": 30, "minimum": 10},
+        }
+    )
+
+    def test_for_parking(self):
+        """Парковка без своего тарифа получает тариф по умолчанию"""
+        assert self.book.for_parking(2).cap == 70000
+        assert self.book.for_parking(5).minimum == 1000
+        assert self.book.for_parking(3) is self.book.default
+
+    def test_vectorized_matches_scalar(self):
+        """Векторный расчет совпадает с расчетом по одной сессии"""
+        rnd = Random(2)
+        sessions = random_sessions(rnd, 5000)
+        parking_ids = np.array([rnd.randint(1, 6) for _ in sessions])
+        starts = np.array([(t - EPOCH).total_seconds() for t, _ in sessions])
+        ends = np.array([(t - EPOCH).total_seconds() for _, t in sessions])
+
+        costs = self.book.price_sessions(parking_ids, starts, ends)
+
+        expected = [
+            self.book.for_parking(int(parking_id)).price(time_in, time_out)
+            for parking_id, (time_in, time_out) in zip(parking_ids, sessions)
+        ]
+        assert costs.tolist() == expected
+
+
+class TestRebill:
+    """Тесты пересчета истории сессий"""
+
+    @pytest.fixture
+    def history(self, db_session, client_factory, parking_factory):
+        """Закрытые сессии двух клиентов на двух парковках и одна открытая"""
+        clients = client_factory.create_batch(2)
+        parkings = parking_factory.create_batch(2)
+        rnd = Random(3)
+        rows = [
+            {
+                "client_id": clients[i % 2].id,
+                "parking_id": parkings[i % 3 % 2].id,
+                "time_in": time_in,
+                "time_out": time_out,
+            }
+            for i, (time_in, time_out) in enumerate(random_sessions(rnd, 300))
+        ]
+        rows.append(
+            {
+                "client_id": clients[0].id,
+                "parking_id": parkings[0].id,
+                "time_in": datetime.now(),
+                "time_out": None,
+            }
+        )
+        db_session.session.execute(insert(ClientParking), rows)
+        db_session.session.commit()
+        return rows
+
+    def test_summary_by_client_and_parking(self, history):
+        """Итоги совпадают с суммой цен отдельных сессий"""
+        book = TariffBook.from_config(
+            {
+                "default": {"rate": 50, "minimum": 1},
+                history[1]["parking_id"]: {"hourly_rates": NIGHT_AND_DAY},
+            }
+        )
+        closed = [row for row in history if row["time_out"] is not None]
+
+        summary = rebill(book, chunk_size=64)
+
+        expected_costs = {}
+        for row in closed:
+            cost = book.for_parking(row["parking_id"]).price(
+                row["time_in"], row["time_out"]
+            )
+            client_id = row["client_id"]
+            expected_costs[client_id] = expected_costs.get(client_id, 0) + cost
+        assert summary["sessions"] == len(closed)
+        assert {item["id"]: item["cost"] for item in summary["clients"]} == {
+            client_id: tariffs.to_rubles(cost)
+            for client_id, cost in expected_costs.items()
+        }
+        assert summary["cost"] == tariffs.to_rubles(sum(expected_costs.values()))
+        assert sum(item["sessions"] for item in summary["clients"]) == len(closed)
+
+    def test_since_until(self, history):
+        """since и until ограничивают время заезда"""
+        since, until = datetime(2024, 3, 1), datetime(2024, 6, 1)
+        summary = rebill(
+            TariffBook.from_config({"default": {"rate": 50}}), since, until
+        )
+        assert summary["sessions"] == sum(
+            1
+            for row in history
+            if row["time_out"] is not None and since <= row["time_in"] < until
+        )
+
+    def test_rebill_command(self, app, history, tmp_path):
+        """Команда flask rebill печатает итоги и пишет JSON"""
+        output = tmp_path / "rebill.json"
+        result = app.test_cli_runner().invoke(args=["rebill", "--output", output])
+        assert result.exit_code == 0, result.output
+        assert "Сессий: 300" in result.output
+        summary = json.loads(output.read_text())
+        assert len(summary["parkings"]) == 2
+
+
+class TestExitTariff:
+    """Тесты тарифа при выезде"""
+
+    @pytest.mark.parking
+    def test_exit_uses_parking_tariff(
+        self, app, client, sample_client_parking, monkeypatch
+    ):
+        """Выезд считает стоимость по тарифу своей парковки"""
+        book = TariffBook.from_config(
+            {
+                "default": {"rate": 50, "minimum": 1},
+                sample_client_parking.parking_id: {"rate": 50, "minimum": 400},
+            }
+        )
+        monkeypatch.setitem(app.extensions, "tariffs", book)
+
+        response = client.delete(
+            "/client_parkings",
+            data={
+                "client_id": sample_client_parking.client_id,
+                "parking_id": sample_client_parking.parking_id,
+            },
+        )
+        assert response.status_code == 200
+        assert response.get_json()["cost"] == 400
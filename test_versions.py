@@ -0,0 +1,152 @@
+import multiprocessing
+
+import pytest
+from sqlalchemy import insert
+
+from parking_app.models import Client
+from parking_app.versions import TableVersions, bump_version
+
+
+def versions(app):
+    return app.extensions["table_versions"]
+
+
+class TestTableVersions:
+    """Тесты счетчиков версий"""
+
+    def test_etag_has_nonce(self):
+        """ETag разных запусков с одной версией различаются"""
+        first = TableVersions(["client"], ttl=5)
+        second = TableVersions(["client"], ttl=5)
+        assert first.etag("client", 0, 0) != second.etag("client", 0, 0)
+
+    def test_epoch(self):
+        """Эпоха меняется раз в ttl секунд"""
+        now = [100.0]
+        table_versions = TableVersions(["client"], ttl=5, timer=lambda: now[0])
+        epoch = table_versions.epoch()
+        now[0] = 104.9
+        assert table_versions.epoch() == epoch
+        now[0] = 105.0
+        assert table_versions.epoch() == epoch + 1
+
+    def test_shared_with_forked_process(self):
+        """Версию, поднятую воркером после fork, видит родитель"""
+        table_versions = TableVersions(["client"], ttl=5)
+        context = multiprocessing.get_context("fork")
+        process = context.Process(target=table_versions.bump, args=("client",))
+        process.start()
+        process.join()
+        assert process.exitcode == 0
+        assert table_versions.get("client") == 1
+
+
+class TestConditionalGet:
+    """Тесты ETag и кэша ответов GET /clients и /clients/<id>"""
+
+    def test_not_modified(self, client, query_budget, sample_client):
+        """If-None-Match с текущим ETag - 304 без запросов к БД"""
+        first = client.get(f"/clients/{sample_client.id}")
+        assert first.status_code == 200
+        etag = first.headers["ETag"]
+
+        with query_budget(0):
+            response = client.get(
+                f"/clients/{sample_client.id}", headers={"If-None-Match": etag}
+            )
+
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.get_data() == b""
+
+    def test_cached_body(
+        self, client, query_budget, sample_client, client_without_card
+    ):
+        """Повторный запрос без ETag отдает тело из кэша вместе с заголовками"""
+        query = {"after_id": sample_client.id - 1, "limit": 1}
+        first = client.get("/clients", query_string=query)
+
+        with query_budget(0):
+            second = client.get("/clients", query_string=query)
+
+        assert second.get_data() == first.get_data()
+        assert second.headers["ETag"] == first.headers["ETag"]
+        assert second.headers["X-Next-After-Id"] == first.headers["X-Next-After-Id"]
+
+    def test_create_changes_etag(self, client, sample_client):
+        """Новый клиент - новая версия, старый ETag больше не подходит"""
+        first = client.get("/clients")
+        created = client.post("/clients", data={"name": "Анна", "surname": "Котова"})
+        assert created.status_code == 201
+
+        response = client.get(
+            "/clients", headers={"If-None-Match": first.headers["ETag"]}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["ETag"] != first.headers["ETag"]
+        assert created.get_json() in response.get_json()
+
+    def test_orm_update(self, app, client, db_session, sample_client):
+        """Изменение клиента через ORM поднимает версию после коммита"""
+        before = versions(app).get("client")
+        sample_client.name = "Петр"
+        db_session.session.flush()
+        assert versions(app).get("client") == before
+
+        db_session.session.commit()
+
+        assert versions(app).get("client") == before + 1
+        response = client.get(f"/clients/{sample_client.id}")
+        assert response.get_json()["name"] == "Петр"
+
+    def test_rollback_keeps_version(self, app, db_session, sample_client):
+        """Откаченное изменение версию не меняет"""
+        before = versions(app).get("client")
+        sample_client.name = "Петр"
+        db_session.session.flush()
+        db_session.session.rollback()
+        assert versions(app).get("client") == before
+
+    def test_core_insert_with_bump(self, app, client, db_session, sample_client):
+        """Запись в обход ORM видна после bump_version"""
+        first = client.get("/clients")
+        db_session.session.execute(
+            insert(Client).values(name="Олег", surname="Смирнов")
+        )
+        db_session.session.commit()
+        assert client.get("/clients").get_data() == first.get_data()
+
+        bump_version("client")
+
+        assert len(client.get("/clients").get_json()) == len(first.get_json()) + 1
+
+    def test_outside_write_expires(
+        self, app, client, db_session, monkeypatch, sample_client
+    ):
+        """Запись мимо счетчиков видна через RESPONSE_CACHE_TTL секунд"""
+        table_versions = versions(app)
+        now = [1000 * table_versions.ttl]
+        monkeypatch.setattr(table_versions, "_timer", lambda: now[0])
+        first = client.get("/clients")
+        db_session.session.execute(
+            insert(Client).values(name="Олег", surname="Смирнов")
+        )
+        db_session.session.commit()
+        assert client.get("/clients").get_data() == first.get_data()
+
+        now[0] += table_versions.ttl
+        response = client.get(
+            "/clients", headers={"If-None-Match": first.headers["ETag"]}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["ETag"] != first.headers["ETag"]
+        assert len(response.get_json()) == len(first.get_json()) + 1
+
+    @pytest.mark.parametrize("path", ["/clients/0", "/clients?limit=0"])
+    def test_errors_not_cached(self, client, path):
+        """Ответы с ошибкой не получают ETag"""
+        response = client.get(path)
+        assert response.status_code in (400, 404)
+        assert "ETag" not in response.headers